@@ -6,7 +6,7 @@ import json
 import argparse
 from datetime import datetime, timedelta, timezone, date
 from pathlib import Path
-from monarchmoney import MonarchMoney, RequireMFAException
+from monarchmoney import Cassette, JSONLSink, LatencyHistogram, MonarchMoney, RequireMFAException
 from google.oauth2.service_account import Credentials
 from gql.transport.exceptions import TransportServerError
 import gspread
@@ -40,9 +40,18 @@ FORCE_START_DATE: Optional[str] = None
 #   Optional ISO date string "YYYY-MM-DD". If set, the load window always starts at this date,
 #   ignoring Control!B2 for the first day of the window. Set to None to disable.
 TXN_PAGE_LIMIT = 500          # Page size used for get_transactions(limit=..., offset=...)
+TXN_PAGE_CONCURRENCY = 4      # Max transaction pages fetched at once after the first page
+TXN_PAGINATION = "keyset"     # "keyset" walks date windows (consistent while Monarch syncs), "offset" fetches pages concurrently
 REQUEST_TIMEOUT = 30         # MonarchMoney client timeout (seconds)
 ENABLE_BUDGETS = True         # If True, fetch and sync budget data to Google Sheets 
 BUDGET_MONTHS = 6             # Number of months of budget data to fetch (past/future)
+BUDGET_MONTHS_PER_SHARD = 3   # Budget months fetched per request; shards are fetched concurrently and retried on their own
+API_STATS = True              # If True, print per-operation API call counts and latencies at the end of the run
+API_CALL_LOG = False          # If True, append every API call to .mm/api_calls.jsonl
+CASSETTE_MODE: Optional[str] = None
+#   "record" to capture every API response to CASSETTE_PATH, or "replay" to run offline from it
+#   (no login; calls are matched by operation, in recorded order). None to call the API normally.
+CASSETTE_PATH = SESSION_DIR / "cassette.jsonl.gz"
 # -----------------------------------------------
 
 # Ensure the .mm directory exists
@@ -343,51 +352,27 @@ def _extract_connection(d: dict):
 
 async def _fetch_all_transactions(mm: MonarchMoney, accounts_list: list[dict], start_dt: datetime, end_dt: datetime):
     """
-    Production: call the concrete method available in your client:
-    get_transactions(limit, offset, start_date, end_date, ...), paginate by offset.
+    Production: walk the window newest first in date-bounded pages (keyset), or
+    read totalCount from the first page and fetch the remaining offsets
+    concurrently (offset), per TXN_PAGINATION.
     """
     start_s = start_dt.date().isoformat()
     end_s = end_dt.date().isoformat()
 
-    all_items: list = []
-    limit = TXN_PAGE_LIMIT
-    offset = 0
-    page = 0
+    res = await mm.fetch_all_transactions(
+        limit=TXN_PAGE_LIMIT,
+        max_concurrency=TXN_PAGE_CONCURRENCY,
+        pagination=TXN_PAGINATION,
+        start_date=start_s,
+        end_date=end_s,
+    )
 
-    while True:
-        page += 1
-        try:
-            res = await mm.get_transactions(limit=limit, offset=offset, start_date=start_s, end_date=end_s)
-        except TypeError:
-            # Some versions may not accept offset when 0; retry without offset only on first page.
-            if offset == 0:
-                res = await mm.get_transactions(limit=limit, start_date=start_s, end_date=end_s)
-            else:
-                raise
-
-        # Save the first page (opt-in) for troubleshooting
-        if page == 1:
-            _save_debug("tx_first_page", _as_dict(res) or res)
-
-        items = _unwrap_transactions(res)
-        # Fallback for { transactions: [...] } or { data: { transactions: [...] } }
-        if not items and isinstance(res, dict):
-            maybe = res.get("transactions") or (res.get("data") or {}).get("transactions")
-            if isinstance(maybe, list):
-                items = maybe
-
-        count = len(items or [])
-        if count:
-            all_items.extend(items)
-            print(f"Fetched page {page}: {count} transactions (offset {offset}).")
-        else:
-            print(f"Fetched page {page}: 0 transactions; stopping.")
-            break
-
-        if count < limit:
-            break
-        offset += limit
+    # Save the combined result (opt-in) for troubleshooting
+    _save_debug("tx_first_page", _as_dict(res) or res)
 
+    all_items = _unwrap_transactions(res)
+    pages = -(-len(all_items) // TXN_PAGE_LIMIT)
+    print(f"Fetched {len(all_items)} transactions in {pages} page(s) of {TXN_PAGE_LIMIT}.")
     return all_items
 
 def _format_timestamp(ts_str: str) -> str:
@@ -939,6 +924,10 @@ def parse_arguments():
                        help="Disable budget data sync")
     parser.add_argument("--budget-months", type=int, metavar="N",
                        help="Number of months of budget data to fetch (default: 3)")
+    parser.add_argument("--record", type=str, metavar="PATH", nargs="?", const=str(CASSETTE_PATH),
+                       help="Record every API response to a cassette file")
+    parser.add_argument("--replay", type=str, metavar="PATH", nargs="?", const=str(CASSETTE_PATH),
+                       help="Replay API responses from a cassette file instead of calling the API")
     
     return parser.parse_args()
 
@@ -946,7 +935,7 @@ def apply_arguments(args):
     """Apply command line arguments to global configuration variables."""
     global DEBUG, FORCE_FULL_REFRESH, FORCE_START_DATE, BACKFILL_DAYS
     global TXN_PAGE_LIMIT, ADVANCE_ON_EMPTY, REQUEST_TIMEOUT, SPREADSHEET_ID
-    global ENABLE_BUDGETS, BUDGET_MONTHS
+    global ENABLE_BUDGETS, BUDGET_MONTHS, CASSETTE_MODE, CASSETTE_PATH
     
     if args.debug:
         DEBUG = True
@@ -991,6 +980,14 @@ def apply_arguments(args):
     if args.budget_months:
         BUDGET_MONTHS = args.budget_months
         print(f"Budget months set to: {BUDGET_MONTHS}")
+    
+    if args.record:
+        CASSETTE_MODE, CASSETTE_PATH = "record", Path(args.record)
+        print(f"Recording API responses to: {CASSETTE_PATH}")
+    
+    if args.replay:
+        CASSETTE_MODE, CASSETTE_PATH = "replay", Path(args.replay)
+        print(f"Replaying API responses from: {CASSETTE_PATH}")
 
 def _process_accounts(accounts_list: list) -> list:
     """
@@ -1050,13 +1047,34 @@ def _process_accounts(accounts_list: list) -> list:
     
     return processed
 
+def _print_api_stats(api_stats: LatencyHistogram) -> None:
+    """Print API calls per operation, slowest total first."""
+    summary = api_stats.summary()
+    if not summary:
+        return
+    print("API calls (seconds):")
+    print(f"  {'operation':<40}{'calls':>6}{'errors':>7}{'retries':>8}{'total':>8}{'p50':>7}{'p95':>7}{'max':>7}")
+    for operation, stats in summary.items():
+        print(
+            f"  {operation:<40}{stats['count']:>6}{stats['errors']:>7}{stats['retries']:>8}"
+            f"{stats['total']:>8.2f}{stats['p50']:>7.2f}{stats['p95']:>7.2f}{stats['max']:>7.2f}"
+        )
+
 async def main():
     gc = gspread.authorize(creds)
-    mm = MonarchMoney(timeout=REQUEST_TIMEOUT)
+    api_stats = LatencyHistogram()
+    hooks = [api_stats] if API_STATS else []
+    if API_CALL_LOG:
+        hooks.append(JSONLSink(str(SESSION_DIR / "api_calls.jsonl")))
+    cassette = None
+    if CASSETTE_MODE:
+        # The load window moves with the clock, so replayed calls are matched by operation only
+        cassette = Cassette(str(CASSETTE_PATH), mode=CASSETTE_MODE, match_variables=False)
+    mm = MonarchMoney(timeout=REQUEST_TIMEOUT, hooks=hooks, cassette=cassette)
     
     try:
         # Retry logic for Transport Error 525 (CloudFlare SSL issues)
-        max_retries = 3
+        max_retries = 0 if CASSETTE_MODE == "replay" else 3  # Replaying needs no login
         for attempt in range(max_retries):
             try:
                 # Session
@@ -1141,9 +1159,10 @@ async def main():
                 
                 print(f"Requesting budget data from {start_date_str} to {end_date_str}")
                 
-                budget_response = await mm.get_budgets(
+                budget_response = await mm.get_budgets_sharded(
                     start_date=start_date_str,
-                    end_date=end_date_str
+                    end_date=end_date_str,
+                    months_per_shard=BUDGET_MONTHS_PER_SHARD,
                     # No longer passing use_legacy_goals or use_v2_goals parameters
                     # as they were removed in the fix
                 )
@@ -1353,6 +1372,10 @@ async def main():
         print("MFA required:", e)
     except Exception as e:
         print("Error:", e)
+    finally:
+        await mm.close()
+        if API_STATS:
+            _print_api_stats(api_stats)
 
 try:
     loop = asyncio.get_running_loop()
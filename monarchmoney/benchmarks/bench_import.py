@@ -0,0 +1,58 @@
+"""
+Benchmark of the time taken to import the package, in a fresh interpreter.
+
+gql, graphql, aiohttp and oathtool are only imported on first network use,
+so this reports the import time of the package alone, and of the package with
+the transport (i.e. what the first API call adds).
+
+Usage:
+    python benchmarks/bench_import.py [runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The statement run, and the modules whose cumulative import times are summed
+STATEMENTS = {
+    "monarchmoney": ("import monarchmoney", ["monarchmoney"]),
+    "monarchmoney + transport": (
+        "import monarchmoney.transport",
+        ["monarchmoney", "monarchmoney.transport"],
+    ),
+}
+
+
+def get_import_times(statement: str) -> dict:
+    """Returns the cumulative import time, in seconds, of each module imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def main(runs: int) -> None:
+    print(f"Import time, median of {runs} runs (milliseconds)")
+    for label, (statement, modules) in STATEMENTS.items():
+        samples = []
+        for _ in range(runs):
+            times = get_import_times(statement)
+            samples.append(sum(times[name] for name in modules))
+        print(f"{label:<28}{statistics.median(samples) * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,67 @@
+"""
+Benchmark of the memory held by a transaction history as the API's dicts, and
+as Transaction models (get_transactions(as_models=True)).
+
+Synthetic transactions from the mock server are round-tripped through JSON, so
+that, as with real responses, no strings are shared between them.
+
+Usage:
+    python benchmarks/bench_models.py [transactions]
+"""
+
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+from mock_server import make_accounts, make_transactions  # noqa: E402
+from monarchmoney.models import Transaction, to_models  # noqa: E402
+
+
+def decode(body: str, as_models: bool):
+    transactions = json.loads(body)
+    if as_models:
+        transactions = to_models(Transaction, transactions)
+    return transactions
+
+
+def measure(body: str, as_models: bool):
+    """
+    Returns the memory held by the decoded transactions, and the time taken to
+    decode them (measured separately, as tracing memory slows decoding down).
+    """
+    gc.collect()
+    start = time.perf_counter()
+    decode(body, as_models)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    transactions = decode(body, as_models)
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del transactions
+    return size, elapsed
+
+
+def main(count: int) -> None:
+    body = json.dumps(make_transactions(count, make_accounts(10)))
+    dicts = measure(body, as_models=False)
+    models = measure(body, as_models=True)
+
+    print(f"Memory held by {count} transactions")
+    print(f"{'representation':<16}{'MB':>10}{'bytes/txn':>12}{'decode (s)':>12}")
+    for label, (size, elapsed) in (("dicts", dicts), ("models", models)):
+        print(f"{label:<16}{size / 1e6:>10.1f}{size / count:>12.0f}{elapsed:>12.2f}")
+    print(f"models use {models[0] / dicts[0]:.0%} of the memory of dicts")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
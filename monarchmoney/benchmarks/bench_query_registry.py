@@ -0,0 +1,124 @@
+"""
+Micro-benchmark of the per-call CPU overhead of building GraphQL requests.
+
+Each API method is run against its tests/*.json fixture through the real
+transport, with a stub HTTP session in place of the network: first re-parsing
+and re-printing the query on every call (as before the query registry), then
+with the registry warm.
+
+Usage:
+    python benchmarks/bench_query_registry.py [iterations]
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from monarchmoney import MonarchMoney  # noqa: E402
+from monarchmoney import monarchmoney as mm_module  # noqa: E402
+
+FIXTURES = {
+    "GetAccounts": ("get_accounts.json", "get_accounts", {}),
+    "Web_GetHoldings": (
+        "get_account_holdings.json",
+        "get_account_holdings",
+        {"account_id": 1234},
+    ),
+    "GetAccountTypeOptions": (
+        "get_account_type_options.json",
+        "get_account_type_options",
+        {},
+    ),
+    "GetTransactionsPage": (
+        "get_transactions_summary.json",
+        "get_transactions_summary",
+        {},
+    ),
+}
+
+
+class StubResponse(object):
+    status = 200
+    headers = {}
+
+    def __init__(self, body: str) -> None:
+        self._body = body
+
+    async def json(self, content_type=None):
+        return json.loads(self._body)
+
+    async def read(self) -> bytes:
+        return self._body.encode()
+
+    async def text(self) -> str:
+        return self._body
+
+    def raise_for_status(self) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class StubSession(object):
+    """Answers every GraphQL request with the fixture for its operation."""
+
+    closed = False
+
+    def __init__(self, bodies) -> None:
+        self._bodies = bodies
+
+    def post(self, url, json=None, **kwargs):
+        return StubResponse(self._bodies[json["operationName"]])
+
+
+def load_bodies():
+    bodies = {}
+    for operation, (filename, _, _) in FIXTURES.items():
+        with open(os.path.join(ROOT, "tests", filename)) as fh:
+            bodies[operation] = json.dumps({"data": json.load(fh)})
+    return bodies
+
+
+async def measure(mm: MonarchMoney, iterations: int, cold: bool):
+    results = {}
+    for operation, (_, method, kwargs) in FIXTURES.items():
+        call = getattr(mm, method)
+        await call(**kwargs)
+        start = time.process_time()
+        for _ in range(iterations):
+            if cold:
+                mm_module._PARSED_QUERIES.clear()
+                mm_module._QUERY_STRINGS.clear()
+            await call(**kwargs)
+        results[operation] = (time.process_time() - start) / iterations * 1e6
+    return results
+
+
+async def main(iterations: int) -> None:
+    mm = MonarchMoney(token="benchmark")
+    session = StubSession(load_bodies())
+    mm._get_http_session = lambda: session
+
+    before = await measure(mm, iterations, cold=True)
+    after = await measure(mm, iterations, cold=False)
+
+    print(f"CPU time per call, {iterations} iterations (microseconds)")
+    print(f"{'operation':<24}{'re-parsed':>12}{'registry':>12}{'speedup':>10}")
+    for operation in FIXTURES:
+        print(
+            f"{operation:<24}{before[operation]:>12.1f}{after[operation]:>12.1f}"
+            f"{before[operation] / after[operation]:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,163 @@
+"""
+Benchmarks full-history transaction pulls through the real transport against
+the local mock server (tests/mock_server.py), run in its own process so
+that the client's CPU time and memory are measured on their own.
+
+For each pagination strategy it reports pages per second, the p50 and p99
+latency of GetTransactionsList calls, and the peak memory allocated by Python
+while pulling the history.
+
+Usage:
+    python benchmarks/bench_transport.py [--transactions N] [--page-size N]
+        [--latency SECONDS] [--error-rate FRACTION] [--concurrency 1,4,8]
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Awaitable, Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from monarchmoney import MonarchMoney, MonarchMoneyEndpoints, RetryPolicy  # noqa: E402
+
+
+def percentile(values: List[float], quantile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+
+
+async def serial_pages(mm: MonarchMoney, page_size: int, concurrency: int) -> int:
+    count = 0
+    async for page in mm.iter_transactions(
+        limit=page_size, by_page=True, prefetch=False
+    ):
+        count += len(page)
+    return count
+
+
+async def prefetched_pages(mm: MonarchMoney, page_size: int, concurrency: int) -> int:
+    count = 0
+    async for page in mm.iter_transactions(limit=page_size, by_page=True):
+        count += len(page)
+    return count
+
+
+async def concurrent_pages(mm: MonarchMoney, page_size: int, concurrency: int) -> int:
+    result = await mm.fetch_all_transactions(
+        limit=page_size, max_concurrency=concurrency
+    )
+    return len(result["allTransactions"]["results"])
+
+
+async def run(
+    strategy: Callable[[MonarchMoney, int, int], Awaitable[int]],
+    page_size: int,
+    concurrency: int,
+    trace_memory: bool,
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+
+    def record_latency(record) -> None:
+        if record.operation == "GetTransactionsList":
+            latencies.append(record.duration)
+
+    async with MonarchMoney(
+        token="benchmark",
+        retry_policy=RetryPolicy(backoff_base=0.05, backoff_max=1),
+        hooks=[record_latency],
+    ) as mm:
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        count = await strategy(mm, page_size, concurrency)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else 0
+        if trace_memory:
+            tracemalloc.stop()
+    return {
+        "transactions": count,
+        "pages": len(latencies),
+        "elapsed": elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "peak": peak,
+    }
+
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(ROOT, "tests", "mock_server.py"),
+            f"--transactions={args.transactions}",
+            f"--latency={args.latency}",
+            f"--latency-per-row={args.latency_per_row}",
+            f"--jitter={args.jitter}",
+            f"--error-rate={args.error_rate}",
+        ],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    MonarchMoneyEndpoints.BASE_URL = process.stdout.readline().strip()
+    return process
+
+
+async def main(args: argparse.Namespace) -> None:
+    strategies = [("serial", serial_pages, 1), ("prefetch", prefetched_pages, 1)]
+    strategies.extend(
+        (f"concurrent x{n}", concurrent_pages, n) for n in args.concurrency
+    )
+
+    print(
+        f"{args.transactions} transactions, {args.page_size} per page, "
+        f"{args.latency * 1000:.0f}ms latency, {args.error_rate:.0%} errors"
+    )
+    print(
+        f"{'strategy':<16}{'pages/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'total s':>10}{'peak MiB':>10}"
+    )
+    for name, strategy, concurrency in strategies:
+        timing = await run(strategy, args.page_size, concurrency, trace_memory=False)
+        memory = await run(strategy, args.page_size, concurrency, trace_memory=True)
+        if timing["transactions"] != args.transactions:
+            raise RuntimeError(
+                f"{name} returned {timing['transactions']} of {args.transactions} transactions"
+            )
+        print(
+            f"{name:<16}{timing['pages'] / timing['elapsed']:>10.1f}"
+            f"{timing['p50'] * 1000:>10.1f}{timing['p99'] * 1000:>10.1f}"
+            f"{timing['elapsed']:>10.2f}{memory['peak'] / 2**20:>10.1f}"
+        )
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--transactions", type=int, default=20000)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--latency-per-row", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(n) for n in value.split(",")],
+        default=[4, 8],
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    server = start_server(args)
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.terminate()
+        server.wait()
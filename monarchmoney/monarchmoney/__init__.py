@@ -11,6 +11,15 @@ from .monarchmoney import (
     RequireMFAException,
     RequestFailedException,
 )
+from .bulk import BulkOperation, BulkOutcome, BulkProgress
+from .cache import ResponseCache
+from .cassette import Cassette, CassetteMissError
+from .hedging import HedgePolicy
+from .importer import ImportResult
+from .instrumentation import CallRecord, JSONLSink, LatencyHistogram, RingBuffer
+from .models import Account, Category, Merchant, Tag, Transaction
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
 
 __version__ = "0.1.13"
 __author__ = "hammem"
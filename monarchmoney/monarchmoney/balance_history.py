@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import IO, Dict, Iterator, List, Optional, Tuple, Union
+
+# The number of rows uploaded per request
+DEFAULT_BALANCE_HISTORY_CHUNK_SIZE = 1000
+
+# Next to the saved session, in the ".mm" session directory
+DEFAULT_BALANCE_HISTORY_STATE_FILE = os.path.join(".mm", "balance_history_uploads.json")
+
+# The date formats accepted in balance history files
+BALANCE_HISTORY_DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y")
+
+BalanceHistorySource = Union[str, "os.PathLike[str]", IO[str]]
+
+
+def parse_balance_date(value: str) -> str:
+    """Returns a balance history date in "yyyy-mm-dd" format."""
+    for date_format in BALANCE_HISTORY_DATE_FORMATS:
+        try:
+            return datetime.strptime(value.strip(), date_format).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f'Unknown balance history date "{value}"')
+
+
+def get_date_column(header: List[str]) -> int:
+    """Returns the index of the column named "date", or 0 for the first column."""
+    names = [name.strip().lower() for name in header]
+    return names.index("date") if "date" in names else 0
+
+
+def read_balance_history(
+    source: BalanceHistorySource, since: Optional[str] = None
+) -> Tuple[List[str], List[List[str]], Optional[str]]:
+    """
+    Reads a balance history CSV file, given as a path or a file object, keeping
+    only the rows dated after `since` ("yyyy-mm-dd"). The date is taken from the
+    column named "date", or from the first column.
+
+    Returns the header, the rows kept and the latest date among them.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, newline="") as fh:
+            return read_balance_history(fh, since)
+
+    reader = csv.reader(source)
+    header = next(reader, [])
+    date_column = get_date_column(header)
+    rows = []
+    last_date = None
+    for row in reader:
+        if not row:
+            continue
+        row_date = parse_balance_date(row[date_column])
+        if since is not None and row_date <= since:
+            continue
+        rows.append(row)
+        last_date = max(last_date or row_date, row_date)
+    return header, rows, last_date
+
+
+def chunk_balance_history(
+    header: List[str], rows: List[List[str]], chunk_size: int
+) -> Iterator[Tuple[str, int, str, str]]:
+    """
+    Splits balance history rows into CSV files of at most `chunk_size` rows, each
+    with the header, and yields each file's content, number of rows, and first
+    and last dates ("yyyy-mm-dd").
+    """
+    date_column = get_date_column(header)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+        dates = [parse_balance_date(row[date_column]) for row in chunk]
+        content = io.StringIO()
+        writer = csv.writer(content)
+        writer.writerow(header)
+        writer.writerows(chunk)
+        yield content.getvalue(), len(chunk), min(dates), max(dates)
+
+
+class BalanceHistoryState(object):
+    """
+    Remembers the latest balance history date uploaded for each account, in a
+    JSON file, so that later uploads only send newer rows.
+
+    :param path: the JSON file the dates are kept in.
+    """
+
+    def __init__(self, path: str = DEFAULT_BALANCE_HISTORY_STATE_FILE) -> None:
+        self.path = path
+        self._last_dates: Dict[str, str] = {}
+        if os.path.exists(path):
+            with open(path) as fh:
+                self._last_dates = json.load(fh)
+
+    def get(self, account_id: str) -> Optional[str]:
+        """Returns the latest date uploaded for the account, if any."""
+        return self._last_dates.get(str(account_id))
+
+    def set(self, account_id: str, last_date: str) -> None:
+        """Records the latest date uploaded for the account and saves the file."""
+        self._last_dates[str(account_id)] = last_date
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as fh:
+            json.dump(self._last_dates, fh, indent=2, sort_keys=True)
+        os.replace(temporary_path, self.path)
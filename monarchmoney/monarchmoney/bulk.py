@@ -0,0 +1,205 @@
+import asyncio
+import json
+import os
+import warnings
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    NamedTuple,
+    Optional,
+    TypeVar,
+)
+
+from .retry import RetryPolicy
+
+DEFAULT_BULK_CONCURRENCY = 4
+
+Item = TypeVar("Item")
+
+
+class BulkOutcome(NamedTuple):
+    """
+    The outcome of one item of a bulk operation.
+
+    :param key: the item's key.
+    :param ok: True if the item succeeded.
+    :param result: what the call returned for the item, if it succeeded.
+    :param error: the exception the item failed with, if it failed.
+    :param attempts: the number of attempts made.
+    """
+
+    key: str
+    ok: bool
+    result: Any = None
+    error: Any = None
+    attempts: int = 1
+
+
+class BulkProgress(NamedTuple):
+    """
+    The progress of a bulk operation, passed to its progress callback.
+
+    :param total: the number of items.
+    :param done: the number of items finished, including those resumed.
+    :param succeeded: the number of items that succeeded.
+    :param failed: the number of items that failed.
+    """
+
+    total: int
+    done: int
+    succeeded: int
+    failed: int
+
+
+ProgressCallback = Callable[[BulkProgress], None]
+
+
+class BulkOperation(object):
+    """
+    Runs one call per item with at most `max_concurrency` in flight, so that
+    provisioning hundreds of items neither floods the API nor stops at the first
+    failure: each item is retried on its own, and its outcome is recorded.
+
+    Items are retried when `retry_policy` considers their error transient. Since a
+    mutation that failed may still have been applied, items are treated as mutations
+    (and only retried if the policy retries mutations) unless `idempotent` is set,
+    which should only be done for calls that are safe to repeat, such as setting a
+    budget amount. With a `results_path`,
+    each outcome is appended to that JSON lines file as it finishes, and items that
+    already succeeded there are skipped when the operation is run again, so an
+    interrupted operation resumes where it stopped.
+
+    :param max_concurrency: the maximum number of items in flight.
+    :param retry_policy: decides which errors are retried per item, and the waits.
+    :param progress: called with a BulkProgress after each item finishes.
+    :param results_path: the JSON lines file outcomes are recorded to and resumed from.
+    :param idempotent: the calls are safe to repeat, so transient errors are retried.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_BULK_CONCURRENCY,
+        retry_policy: Optional[RetryPolicy] = None,
+        progress: Optional[ProgressCallback] = None,
+        results_path: Optional[str] = None,
+        idempotent: bool = False,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.progress = progress
+        self.results_path = results_path
+        self.idempotent = idempotent
+        self._cancelled = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        """
+        Stops the operation from starting more items. Items in flight finish,
+        and run() returns the outcomes so far.
+        """
+        self._cancelled = True
+
+    async def run(
+        self,
+        call: Callable[[Item], Awaitable[Any]],
+        items: Iterable[Item],
+        key: Callable[[Item], str] = str,
+    ) -> Dict[str, BulkOutcome]:
+        """
+        Calls `call(item)` for each item, and returns a dict of each item's key to
+        its BulkOutcome, in the order of `items`. Items not started because the
+        operation was cancelled have no outcome.
+
+        :param call: the coroutine function run for each item.
+        :param items: the items.
+        :param key: returns an item's key, which identifies it in the results file.
+        """
+        self._cancelled = False
+        items = list(items)
+        keys = [key(item) for item in items]
+        resumed = self.load_results()
+        outcomes: Dict[str, BulkOutcome] = {}
+        for item_key in keys:
+            if item_key in resumed:
+                outcomes[item_key] = resumed[item_key]
+
+        pending = iter([(k, item) for k, item in zip(keys, items) if k not in outcomes])
+        counts = {"succeeded": len(outcomes), "failed": 0}
+
+        async def worker() -> None:
+            for item_key, item in pending:
+                if self._cancelled:
+                    return
+                outcome = await self._run_item(call, item_key, item)
+                outcomes[item_key] = outcome
+                counts["succeeded" if outcome.ok else "failed"] += 1
+                self._record(outcome)
+                self._report(
+                    BulkProgress(
+                        total=len(keys),
+                        done=counts["succeeded"] + counts["failed"],
+                        succeeded=counts["succeeded"],
+                        failed=counts["failed"],
+                    )
+                )
+
+        await asyncio.gather(*[worker() for _ in range(self.max_concurrency)])
+        return {k: outcomes[k] for k in keys if k in outcomes}
+
+    async def _run_item(
+        self, call: Callable[[Item], Awaitable[Any]], item_key: str, item: Item
+    ) -> BulkOutcome:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await call(item)
+            except Exception as e:
+                if attempt > self.retry_policy.max_retries or not (
+                    self.retry_policy.is_retryable(e, is_mutation=not self.idempotent)
+                ):
+                    return BulkOutcome(item_key, False, error=e, attempts=attempt)
+                await asyncio.sleep(self.retry_policy.get_delay(attempt - 1, e))
+                continue
+            return BulkOutcome(item_key, True, result=result, attempts=attempt)
+
+    def _report(self, progress: BulkProgress) -> None:
+        if self.progress is None:
+            return
+        try:
+            self.progress(progress)
+        except Exception as e:
+            # A broken progress callback must not stop the operation
+            warnings.warn(f"Bulk progress callback {self.progress!r} failed: {e!r}")
+
+    def load_results(self) -> Dict[str, BulkOutcome]:
+        """Returns the outcomes of the items that succeeded in the results file."""
+        if not self.results_path or not os.path.exists(self.results_path):
+            return {}
+        outcomes = {}
+        with open(self.results_path) as fh:
+            for line in fh:
+                if line.strip():
+                    # Failed items are run again, so only successes are kept
+                    outcome = BulkOutcome(**json.loads(line))
+                    if outcome.ok:
+                        outcomes[outcome.key] = outcome
+        return outcomes
+
+    def _record(self, outcome: BulkOutcome) -> None:
+        if not self.results_path:
+            return
+        directory = os.path.dirname(self.results_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        record = outcome._asdict()
+        if record["error"] is not None:
+            record["error"] = repr(record["error"])
+        with open(self.results_path, "a") as fh:
+            fh.write(json.dumps(record, default=str) + "\n")
@@ -0,0 +1,149 @@
+import copy
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+from .instrumentation import get_variables_digest
+
+# Next to the saved session, in the ".mm" session directory
+DEFAULT_CACHE_FILE = os.path.join(".mm", "cache.json")
+DEFAULT_CACHE_MAX_ENTRIES = 256
+
+# Reference data that rarely changes, and how many seconds it is cached for
+DEFAULT_CACHE_TTLS = {
+    "GetAccountTypeOptions": 7 * 24 * 3600,
+    "GetCategories": 3600,
+    "GetHouseholdTransactionTags": 3600,
+    "ManageGetCategoryGroups": 3600,
+    "Web_GetInstitutionSettings": 3600,
+}
+
+# The cached operations made stale by each mutation
+CACHE_INVALIDATIONS = {
+    "Common_CreateTransactionTag": ("GetHouseholdTransactionTags",),
+    # Tags are cached with their transactionCount
+    "Web_SetTransactionTags": ("GetHouseholdTransactionTags",),
+    "Web_SetTransactionTagsBatch": ("GetHouseholdTransactionTags",),
+    "Common_CreateTransactionMutation": ("GetHouseholdTransactionTags",),
+    "Common_DeleteTransactionMutation": ("GetHouseholdTransactionTags",),
+    "Common_DeleteTransactionMutationBatch": ("GetHouseholdTransactionTags",),
+    "Common_SplitTransactionMutation": ("GetHouseholdTransactionTags",),
+    "Web_CreateCategory": ("GetCategories", "ManageGetCategoryGroups"),
+    "Web_DeleteCategory": ("GetCategories", "ManageGetCategoryGroups"),
+    "Web_CreateManualAccount": ("Web_GetInstitutionSettings",),
+    "Common_UpdateAccount": ("Web_GetInstitutionSettings",),
+    "Common_DeleteAccount": ("Web_GetInstitutionSettings",),
+}
+
+
+class ResponseCache(object):
+    """
+    A cache of GraphQL results for reference data, persisted to a JSON file so
+    that it is shared between script runs.
+
+    Results are keyed by operation and variables, and expire after the TTL of
+    their operation; operations without a TTL are never cached. When more than
+    `max_entries` results are cached, the least recently used are evicted.
+
+    :param path: the file the cache is stored in.
+    :param ttls: the number of seconds each operation's results are kept for,
+      defaults to DEFAULT_CACHE_TTLS.
+    :param max_entries: the maximum number of results kept.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_FILE,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.path = path
+        self.ttls = dict(DEFAULT_CACHE_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self._entries: Optional["OrderedDict[str, Dict[str, Any]]"] = None
+
+    def is_cached(self, operation: str) -> bool:
+        """Returns True if results of `operation` are cached."""
+        return operation in self.ttls
+
+    def get(self, operation: str, variables: Dict[str, Any]) -> Optional[Any]:
+        """Returns a copy of the cached result, or None if it is missing or expired."""
+        if not self.is_cached(operation):
+            return None
+        entries = self._load()
+        key = self._get_key(operation, variables)
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] > self.ttls[operation]:
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return copy.deepcopy(entry["data"])
+
+    def set(self, operation: str, variables: Dict[str, Any], data: Any) -> None:
+        """Caches the result of `operation`, if it is cached at all."""
+        if not self.is_cached(operation):
+            return
+        entries = self._load()
+        key = self._get_key(operation, variables)
+        entries[key] = {
+            "operation": operation,
+            "stored_at": time.time(),
+            "data": copy.deepcopy(data),
+        }
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        self._save()
+
+    def invalidate(self, operations: Optional[Iterable[str]] = None) -> None:
+        """
+        Drops the cached results of `operations`, or of every operation if None.
+        """
+        entries = self._load()
+        if operations is None:
+            entries.clear()
+        else:
+            operations = set(operations)
+            for key in [
+                key
+                for key, entry in entries.items()
+                if entry["operation"] in operations
+            ]:
+                del entries[key]
+        self._save()
+
+    def invalidate_for_mutation(self, operation: str) -> None:
+        """Drops the cached results made stale by the mutation `operation`."""
+        stale = CACHE_INVALIDATIONS.get(operation)
+        if stale:
+            self.invalidate(stale)
+
+    @staticmethod
+    def _get_key(operation: str, variables: Dict[str, Any]) -> str:
+        return f"{operation}:{get_variables_digest(variables)}"
+
+    def _load(self) -> "OrderedDict[str, Dict[str, Any]]":
+        if self._entries is None:
+            self._entries = OrderedDict()
+            try:
+                with open(self.path, "r") as fh:
+                    # Entries are stored from least to most recently used
+                    for key, entry in json.load(fh):
+                        self._entries[key] = entry
+            except (OSError, ValueError, TypeError):
+                # A missing or corrupt cache is treated as empty
+                pass
+        return self._entries
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as fh:
+            json.dump(list(self._load().items()), fh)
+        os.replace(temporary_path, self.path)
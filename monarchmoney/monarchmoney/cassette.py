@@ -0,0 +1,170 @@
+import copy
+import gzip
+import json
+import os
+from collections import defaultdict, deque
+from typing import IO, TYPE_CHECKING, Any, Deque, Dict, Optional
+
+from .instrumentation import get_variables_digest
+
+if TYPE_CHECKING:
+    from gql.transport.exceptions import TransportQueryError
+
+# Next to the saved session, in the ".mm" session directory
+DEFAULT_CASSETTE_FILE = os.path.join(".mm", "cassette.jsonl.gz")
+
+CASSETTE_RECORD = "record"
+CASSETTE_REPLAY = "replay"
+
+
+class CassetteMissError(Exception):
+    """Raised when replaying a call that is not on the cassette."""
+
+
+class Cassette(object):
+    """
+    Records GraphQL calls and their responses to a gzipped JSON lines file, or
+    replays them offline, e.g. to profile or regression-test a script against a
+    captured day without calling the live API.
+
+    When replaying, calls are matched by operation name and variables (or by
+    operation name alone if `match_variables` is False, e.g. when the dates a
+    script asks for move from day to day). Calls made several times are replayed
+    in the order they were made, repeating the last response once exhausted, so
+    concurrent calls are recorded in the order they started (see start()), not
+    the order they finished.
+
+    :param path: the cassette file.
+    :param mode: "record" to (over)write the cassette, or "replay" to serve from it.
+    :param match_variables: match replayed calls by their variables as well.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CASSETTE_FILE,
+        mode: str = CASSETTE_REPLAY,
+        match_variables: bool = True,
+    ) -> None:
+        if mode not in (CASSETTE_RECORD, CASSETTE_REPLAY):
+            raise ValueError(f'Unknown cassette mode "{mode}"')
+        self.path = path
+        self.mode = mode
+        self.match_variables = match_variables
+        self._file: Optional[IO[str]] = None
+        self._recorded = False
+        # Episodes started but not yet written, in the order the calls were made
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._episodes: Optional[Dict[str, Deque[Dict[str, Any]]]] = None
+
+    @property
+    def is_recording(self) -> bool:
+        return self.mode == CASSETTE_RECORD
+
+    @property
+    def is_replaying(self) -> bool:
+        return self.mode == CASSETTE_REPLAY
+
+    def start(self, operation: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Reserves the place of a call that is starting, and returns its episode to
+        pass to record(), or to discard() if the call fails without a response.
+        Episodes are written in the order their calls started.
+        """
+        episode = {"operation": operation, "variables": variables, "line": None}
+        self._pending.append(episode)
+        return episode
+
+    def record(
+        self,
+        operation: str,
+        variables: Dict[str, Any],
+        response: Optional[Dict[str, Any]] = None,
+        error: Optional["TransportQueryError"] = None,
+        episode: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Records a call and its response, or the GraphQL errors it failed with, in
+        the place reserved by start() if `episode` is given, or else last.
+        """
+        if episode is None:
+            episode = self.start(operation, variables)
+        recorded: Dict[str, Any] = {"operation": operation, "variables": variables}
+        if error is not None:
+            recorded["error"] = {
+                "message": str(error),
+                "errors": error.errors,
+                "data": error.data,
+            }
+        else:
+            recorded["response"] = response
+        # Serialized now, as the caller may go on to modify the response
+        episode["line"] = json.dumps(recorded, default=str) + "\n"
+        self._write_pending()
+
+    def discard(self, episode: Dict[str, Any]) -> None:
+        """Gives up the place reserved by start() for a call that failed."""
+        self._pending.remove(episode)
+        self._write_pending()
+
+    def _write_pending(self) -> None:
+        while self._pending and self._pending[0]["line"] is not None:
+            self._write(self._pending.popleft()["line"])
+
+    def _write(self, line: str) -> None:
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # The cassette is overwritten when recording starts, and appended to
+            # (as another gzip member) if recording resumes after close()
+            self._file = gzip.open(
+                self.path, "at" if self._recorded else "wt", encoding="utf-8"
+            )
+            self._recorded = True
+        self._file.write(line)
+
+    def play(self, operation: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Returns a copy of the recorded response, or raises the recorded
+        TransportQueryError. Raises CassetteMissError if the call was not recorded.
+        """
+        episodes = self._load().get(self._get_key(operation, variables))
+        if not episodes:
+            raise CassetteMissError(
+                f"{operation} with variables {variables} is not on the cassette {self.path}"
+            )
+        episode = episodes.popleft() if len(episodes) > 1 else episodes[0]
+        if "error" in episode:
+            from gql.transport.exceptions import TransportQueryError
+
+            raise TransportQueryError(
+                episode["error"]["message"],
+                errors=episode["error"]["errors"],
+                data=episode["error"]["data"],
+            )
+        return copy.deepcopy(episode["response"])
+
+    def close(self) -> None:
+        """Finishes writing the cassette, leaving out calls still in flight."""
+        for episode in self._pending:
+            if episode["line"] is not None:
+                self._write(episode["line"])
+        self._pending.clear()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _get_key(self, operation: str, variables: Dict[str, Any]) -> str:
+        if not self.match_variables:
+            return operation
+        return f"{operation}:{get_variables_digest(variables)}"
+
+    def _load(self) -> Dict[str, Deque[Dict[str, Any]]]:
+        if self._episodes is None:
+            self._episodes = defaultdict(deque)
+            with gzip.open(self.path, "rt", encoding="utf-8") as fh:
+                for line in fh:
+                    episode = json.loads(line)
+                    key = self._get_key(episode["operation"], episode["variables"])
+                    self._episodes[key].append(episode)
+        return self._episodes
@@ -0,0 +1,61 @@
+from collections import defaultdict, deque
+from typing import Deque, Dict, Iterable, Optional
+
+# The number of recent latencies per operation the hedge delay is estimated from
+HEDGE_LATENCY_WINDOW = 100
+
+
+class HedgePolicy(object):
+    """
+    Decides when a slow query is hedged: if no response has arrived once the
+    `quantile` of the operation's recent latencies has passed, a duplicate
+    request is sent and whichever answers first is used.
+
+    Only queries are hedged, never mutations. Operations are not hedged until
+    `min_samples` latencies have been seen, so the delay means something.
+
+    :param quantile: the quantile of recent latencies to wait for before hedging.
+    :param min_samples: the number of latencies needed before an operation is hedged.
+    :param min_delay: the shortest wait, in seconds, before hedging.
+    :param max_hedges: the number of duplicate requests sent per attempt.
+    :param operations: the operations to hedge, or None for all queries.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        min_samples: int = 20,
+        min_delay: float = 0.01,
+        max_hedges: int = 1,
+        operations: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_hedges = max_hedges
+        self.operations = None if operations is None else frozenset(operations)
+        self._latencies: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=HEDGE_LATENCY_WINDOW)
+        )
+
+    def is_hedged(self, operation: str) -> bool:
+        """Returns True if queries of `operation` may be hedged."""
+        return self.operations is None or operation in self.operations
+
+    def observe(self, operation: str, latency: float) -> None:
+        """Records the latency, in seconds, of a successful request."""
+        self._latencies[operation].append(latency)
+
+    def get_delay(self, operation: str) -> Optional[float]:
+        """
+        Returns the number of seconds to wait before hedging a request of
+        `operation`, or None if it is not hedged (yet).
+        """
+        if not self.is_hedged(operation):
+            return None
+        latencies = self._latencies[operation]
+        if len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, int(self.quantile * len(ordered)))
+        return max(self.min_delay, ordered[index])
@@ -0,0 +1,74 @@
+import csv
+import hashlib
+import json
+import os
+from typing import Any, Dict, Iterator, NamedTuple
+
+from .bulk import BulkOutcome
+
+# Next to the saved session, in the ".mm" session directory
+DEFAULT_IMPORT_CHECKPOINT_DIR = os.path.join(".mm", "imports")
+
+# The page size of the scan for the transactions already in Monarch Money
+DEFAULT_IMPORT_SCAN_LIMIT = 500
+
+IMPORT_COLUMNS = (
+    "date",
+    "account_id",
+    "amount",
+    "merchant_name",
+    "category_id",
+    "notes",
+)
+
+
+class ImportResult(NamedTuple):
+    """
+    The result of a transaction import.
+
+    :param outcomes: the BulkOutcome of each row created (or resumed), keyed by
+      the row's hash and its occurrence among identical rows.
+    :param duplicates: the number of rows skipped because they already exist.
+    """
+
+    outcomes: Dict[str, BulkOutcome]
+    duplicates: int
+
+
+def get_transaction_hash(
+    account_id: str, date: str, amount: Any, merchant_name: str
+) -> str:
+    """
+    Returns the hash a transaction is de-duplicated by, from its account, date,
+    amount (to the cent) and merchant name (ignoring case and surrounding spaces).
+    """
+    key = "|".join(
+        [
+            str(account_id),
+            str(date),
+            f"{float(amount):.2f}",
+            (merchant_name or "").strip().lower(),
+        ]
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def read_transaction_rows(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the rows of a CSV file, or of a JSON lines file if `path` ends with
+    .jsonl or .ndjson. Columns are named after create_transaction's arguments
+    (IMPORT_COLUMNS); other columns are ignored.
+    """
+    with open(path, newline="") as fh:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows: Iterator[Dict[str, Any]] = (
+                json.loads(line) for line in fh if line.strip()
+            )
+        else:
+            rows = csv.DictReader(fh)
+        for row in rows:
+            yield {
+                name: row[name]
+                for name in IMPORT_COLUMNS
+                if row.get(name) not in (None, "")
+            }
@@ -0,0 +1,202 @@
+import contextvars
+import hashlib
+import json
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+# Next to the saved session, in the ".mm" session directory
+DEFAULT_CALL_LOG_FILE = os.path.join(".mm", "api_calls.jsonl")
+DEFAULT_RING_BUFFER_SIZE = 100
+
+# Upper bounds, in seconds, of the latency histogram's buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Filled in by the transport with the HTTP details of the current attempt
+CALL_METRICS: "contextvars.ContextVar[Optional[Dict[str, Any]]]" = (
+    contextvars.ContextVar("monarchmoney_call_metrics", default=None)
+)
+
+
+def get_variables_digest(variables: Optional[Dict[str, Any]]) -> str:
+    """Returns a stable digest of a call's variables, without exposing their values."""
+    return hashlib.sha1(
+        json.dumps(variables or {}, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+class CallRecord(NamedTuple):
+    """
+    One call to Monarch Money, as passed to instrumentation hooks.
+
+    :param operation: the GraphQL operation name, or the REST endpoint called.
+    :param variables_digest: the digest of the variables, see get_variables_digest().
+    :param started_at: the wall-clock time the call started, as a UNIX timestamp.
+    :param duration: the seconds spent in the call, including retries and waits
+      for the rate limiter.
+    :param ttfb: the seconds from sending the last attempt to receiving its response headers.
+    :param response_bytes: the size of the last attempt's response body.
+    :param status: the HTTP status of the last attempt.
+    :param retries: the number of retries made.
+    :param error: the type of the exception the call failed with, if it failed.
+    """
+
+    operation: str
+    variables_digest: str
+    started_at: float
+    duration: float
+    ttfb: Optional[float] = None
+    response_bytes: Optional[int] = None
+    status: Optional[int] = None
+    retries: int = 0
+    error: Optional[str] = None
+
+
+CallHook = Callable[[CallRecord], None]
+
+
+class LatencyHistogram(object):
+    """
+    Collects a histogram of call latencies per operation, to find hot operations
+    and tail latency. Percentiles are estimated from LATENCY_BUCKETS.
+    """
+
+    def __init__(self) -> None:
+        self._operations: Dict[str, Dict[str, Any]] = defaultdict(
+            lambda: {
+                "count": 0,
+                "errors": 0,
+                "retries": 0,
+                "total_duration": 0.0,
+                "max_duration": 0.0,
+                "total_bytes": 0,
+                "buckets": [0] * (len(LATENCY_BUCKETS) + 1),
+            }
+        )
+
+    def __call__(self, record: CallRecord) -> None:
+        stats = self._operations[record.operation]
+        stats["count"] += 1
+        stats["errors"] += record.error is not None
+        stats["retries"] += record.retries
+        stats["total_duration"] += record.duration
+        stats["max_duration"] = max(stats["max_duration"], record.duration)
+        stats["total_bytes"] += record.response_bytes or 0
+        stats["buckets"][bisect_left(LATENCY_BUCKETS, record.duration)] += 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns the count, errors, retries, bytes and latencies (mean, p50, p95,
+        p99 and max, in seconds) of each operation, slowest total first.
+        """
+        summary = {}
+        for operation, stats in sorted(
+            self._operations.items(), key=lambda item: -item[1]["total_duration"]
+        ):
+            summary[operation] = {
+                "count": stats["count"],
+                "errors": stats["errors"],
+                "retries": stats["retries"],
+                "total_bytes": stats["total_bytes"],
+                "total": stats["total_duration"],
+                "mean": stats["total_duration"] / stats["count"],
+                "p50": self._get_percentile(stats, 0.5),
+                "p95": self._get_percentile(stats, 0.95),
+                "p99": self._get_percentile(stats, 0.99),
+                "max": stats["max_duration"],
+            }
+        return summary
+
+    def clear(self) -> None:
+        self._operations.clear()
+
+    @staticmethod
+    def _get_percentile(stats: Dict[str, Any], quantile: float) -> float:
+        rank = quantile * stats["count"]
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, stats["buckets"]):
+            seen += count
+            if seen >= rank:
+                return min(bound, stats["max_duration"])
+        return stats["max_duration"]
+
+
+class JSONLSink(object):
+    """
+    Appends every call, as one JSON object per line, to a file.
+
+    :param path: the file calls are appended to.
+    """
+
+    def __init__(self, path: str = DEFAULT_CALL_LOG_FILE) -> None:
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, record: CallRecord) -> None:
+        with open(self.path, "a") as fh:
+            fh.write(json.dumps(record._asdict()) + "\n")
+
+
+class RingBuffer(object):
+    """
+    Keeps the last `size` calls in memory, e.g. to inspect what led up to a failure.
+
+    :param size: the number of calls kept.
+    """
+
+    def __init__(self, size: int = DEFAULT_RING_BUFFER_SIZE) -> None:
+        self._records: Deque[CallRecord] = deque(maxlen=size)
+
+    def __call__(self, record: CallRecord) -> None:
+        self._records.append(record)
+
+    @property
+    def records(self) -> List[CallRecord]:
+        """The calls kept, oldest first."""
+        return list(self._records)
+
+    def clear(self) -> None:
+        self._records.clear()
+
+
+class CallTimer(object):
+    """
+    Measures one call for a CallRecord: install() makes the transport report
+    the HTTP details of each attempt, and get_record() builds the record.
+    """
+
+    def __init__(self, operation: str, variables: Optional[Dict[str, Any]]) -> None:
+        self.operation = operation
+        self.variables = variables
+        self.metrics: Dict[str, Any] = {}
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+
+    def elapsed(self) -> float:
+        """Returns the seconds since the call started."""
+        return time.perf_counter() - self._start
+
+    def install(self) -> contextvars.Token:
+        return CALL_METRICS.set(self.metrics)
+
+    def get_record(
+        self, retries: int = 0, error: Optional[BaseException] = None
+    ) -> CallRecord:
+        status = self.metrics.get("status")
+        if error is not None:
+            status = getattr(error, "code", None) or status
+        return CallRecord(
+            operation=self.operation,
+            variables_digest=get_variables_digest(self.variables),
+            started_at=self.started_at,
+            duration=self.elapsed(),
+            ttfb=self.metrics.get("ttfb"),
+            response_bytes=self.metrics.get("response_bytes"),
+            status=status,
+            retries=retries,
+            error=None if error is None else type(error).__name__,
+        )
@@ -0,0 +1,316 @@
+import re
+import sys
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+M = TypeVar("M", bound="Model")
+
+
+def get_attribute_name(key: str) -> str:
+    """Returns the snake_case attribute name of an API field, e.g. "displayName"."""
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", key).lower()
+
+
+def get_slots(fields: Iterable[str], members: Iterable[str]) -> Tuple[str, ...]:
+    """
+    Returns the __slots__ of a model: one per field, and one per nested member,
+    which holds the member as returned by the API until it is decoded.
+    """
+    return tuple(get_attribute_name(key) for key in fields) + tuple(
+        f"_{get_attribute_name(key)}" for key in members
+    )
+
+
+class ModelCache(object):
+    """
+    Shares nested members between the models decoded from one API result, by
+    model class and id: each category, merchant, account or tag is held once,
+    first as returned by the API, then as its model once decoded.
+    """
+
+    def __init__(self) -> None:
+        self._entities: Dict[Tuple[type, Any], Any] = {}
+
+    def share(self, model: Type["Model"], value: Any) -> Any:
+        """Returns the shared copy of a nested member's value."""
+        if isinstance(value, list):
+            return [self.share(model, item) for item in value]
+        if not isinstance(value, dict) or value.get("id") is None:
+            return value
+        return self._entities.setdefault((model, value["id"]), value)
+
+    def decode(self, model: Type["Model"], value: Any) -> Any:
+        """Returns the model of a nested member (a tuple of models for a list)."""
+        if isinstance(value, list):
+            return tuple(self.decode(model, item) for item in value)
+        if not isinstance(value, dict):
+            return value
+        if value.get("id") is None:
+            return model.from_dict(value, self)
+        key = (model, value["id"])
+        shared = self._entities.get(key)
+        if not isinstance(shared, Model):
+            shared = self._entities[key] = model.from_dict(value, self)
+        return shared
+
+
+class LazyMember(object):
+    """
+    A nested member of a model, kept as returned by the API until first accessed,
+    then decoded to its model (or a tuple of models) if it has one.
+    """
+
+    def __init__(self, slot: str, model: Optional[Type["Model"]]) -> None:
+        self.slot = slot
+        self.model = model
+
+    def __get__(self, instance: Optional["Model"], owner: type) -> Any:
+        if instance is None:
+            return self
+        value = getattr(instance, self.slot)
+        if self.model is not None and isinstance(value, (dict, list)):
+            value = instance._cache.decode(self.model, value)
+            setattr(instance, self.slot, value)
+        return value
+
+
+class Model(object):
+    """
+    A compact, read-only view of an object returned by the API, for results too
+    large to keep as dicts (e.g. a full transaction history).
+
+    Fields are stored in __slots__ under their snake_case names, with strings that
+    repeat across results (names, dates, __typename, ...) interned. Nested members are shared
+    between the models of one result and only decoded when accessed. Fields that
+    were not returned (e.g. with the "ids" fields profile) are not set, and fields
+    the model does not know of are kept in a dict, only read with model["field"].
+
+    Models can also be read like the API's dicts, e.g. transaction["date"], and
+    to_dict() returns the dict they were decoded from.
+    """
+
+    __slots__ = ("_cache", "_extra", "_typename")
+
+    # The API fields stored on the model
+    FIELDS: Tuple[str, ...] = ()
+    # The API fields whose strings are interned
+    INTERNED: FrozenSet[str] = frozenset()
+    # The nested members, and the model they are decoded to (None to keep them as is)
+    MEMBERS: Dict[str, Optional[Type["Model"]]] = {}
+
+    _attributes: Dict[str, str] = {}
+    _known_keys: FrozenSet[str] = frozenset()
+    _field_slots: Tuple[Tuple[str, str, bool], ...] = ()
+    _member_slots: Tuple[Tuple[str, str, Optional[Type["Model"]]], ...] = ()
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._attributes = {
+            key: get_attribute_name(key) for key in cls.FIELDS + tuple(cls.MEMBERS)
+        }
+        cls._known_keys = frozenset(cls._attributes) | {"__typename"}
+        # Worked out once per class, as from_dict is called for every result
+        cls._field_slots = tuple(
+            (key, cls._attributes[key], key in cls.INTERNED) for key in cls.FIELDS
+        )
+        cls._member_slots = tuple(
+            (key, f"_{cls._attributes[key]}", model)
+            for key, model in cls.MEMBERS.items()
+        )
+        for key, model in cls.MEMBERS.items():
+            name = cls._attributes[key]
+            setattr(cls, name, LazyMember(f"_{name}", model))
+
+    @classmethod
+    def from_dict(
+        cls: Type[M], data: Dict[str, Any], cache: Optional[ModelCache] = None
+    ) -> M:
+        """
+        Returns the model of an object returned by the API.
+
+        :param data: the object, as returned by the API.
+        :param cache: shares nested members with the other models of the result.
+        """
+        model = cls.__new__(cls)
+        model._cache = cache = cache if cache is not None else ModelCache()
+        model._extra = None
+        typename = data.get("__typename")
+        model._typename = sys.intern(typename) if typename.__class__ is str else None
+        for key, slot, interned in cls._field_slots:
+            if key in data:
+                value = data[key]
+                if interned and value.__class__ is str:
+                    value = sys.intern(value)
+                setattr(model, slot, value)
+        for key, slot, member_model in cls._member_slots:
+            if key in data:
+                value = data[key]
+                if member_model is not None:
+                    value = cache.share(member_model, value)
+                setattr(model, slot, value)
+        if not cls._known_keys.issuperset(data):
+            model._extra = {
+                key: value for key, value in data.items() if key not in cls._known_keys
+            }
+        if model._typename is None and "__typename" in data:
+            # Kept as is, to return the same dict from to_dict()
+            model._extra = {**(model._extra or {}), "__typename": data["__typename"]}
+        return model
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "__typename" and self._typename is not None:
+            return self._typename
+        if key not in self._attributes:
+            if self._extra is None:
+                raise KeyError(key)
+            return self._extra[key]
+        try:
+            return getattr(self, self._attributes[key])
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Returns an API field, or `default` if it was not returned."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the model as the API's dict, with nested models converted too."""
+        data: Dict[str, Any] = {}
+        for key in self._attributes:
+            try:
+                value = self[key]
+            except KeyError:
+                continue
+            if isinstance(value, Model):
+                value = value.to_dict()
+            elif isinstance(value, tuple):
+                value = [
+                    item.to_dict() if isinstance(item, Model) else item
+                    for item in value
+                ]
+            data[key] = value
+        if self._extra is not None:
+            data.update(self._extra)
+        if self._typename is not None:
+            data["__typename"] = self._typename
+        return data
+
+    def __repr__(self) -> str:
+        fields = ", ".join(
+            f"{self._attributes[key]}={self[key]!r}"
+            for key in self.FIELDS
+            if hasattr(self, self._attributes[key])
+        )
+        return f"{type(self).__name__}({fields})"
+
+
+class Category(Model):
+    FIELDS = (
+        "id",
+        "name",
+        "icon",
+        "order",
+        "systemCategory",
+        "isSystemCategory",
+        "isDisabled",
+        "createdAt",
+        "updatedAt",
+    )
+    INTERNED = frozenset(("name", "icon", "systemCategory"))
+    MEMBERS: Dict[str, Optional[Type[Model]]] = {"group": None}
+    __slots__ = get_slots(FIELDS, MEMBERS)
+
+
+class Merchant(Model):
+    FIELDS = ("id", "name", "transactionsCount", "logoUrl")
+    INTERNED = frozenset(("name",))
+    __slots__ = get_slots(FIELDS, ())
+
+
+class Tag(Model):
+    FIELDS = ("id", "name", "color", "order")
+    INTERNED = frozenset(("name", "color"))
+    __slots__ = get_slots(FIELDS, ())
+
+
+class Account(Model):
+    FIELDS = (
+        "id",
+        "displayName",
+        "syncDisabled",
+        "deactivatedAt",
+        "isHidden",
+        "isAsset",
+        "mask",
+        "createdAt",
+        "updatedAt",
+        "displayLastUpdatedAt",
+        "currentBalance",
+        "displayBalance",
+        "includeInNetWorth",
+        "hideFromList",
+        "hideTransactionsFromReports",
+        "includeBalanceInNetWorth",
+        "includeInGoalBalance",
+        "dataProvider",
+        "dataProviderAccountId",
+        "isManual",
+        "transactionsCount",
+        "holdingsCount",
+        "manualInvestmentsTrackingMethod",
+        "order",
+        "logoUrl",
+    )
+    INTERNED = frozenset(("displayName", "dataProvider"))
+    MEMBERS: Dict[str, Optional[Type[Model]]] = {
+        "type": None,
+        "subtype": None,
+        "credential": None,
+        "institution": None,
+    }
+    __slots__ = get_slots(FIELDS, MEMBERS)
+
+
+class Transaction(Model):
+    FIELDS = (
+        "id",
+        "amount",
+        "pending",
+        "date",
+        "hideFromReports",
+        "plaidName",
+        "notes",
+        "isRecurring",
+        "reviewStatus",
+        "needsReview",
+        "isSplitTransaction",
+        "createdAt",
+        "updatedAt",
+    )
+    INTERNED = frozenset(("date", "plaidName", "reviewStatus"))
+    MEMBERS: Dict[str, Optional[Type[Model]]] = {
+        "attachments": None,
+        "category": Category,
+        "merchant": Merchant,
+        "account": Account,
+        "tags": Tag,
+    }
+    __slots__ = get_slots(FIELDS, MEMBERS)
+
+
+def to_models(model: Type[M], items: Iterable[Dict[str, Any]]) -> List[M]:
+    """Returns the models of a list of objects returned by the API."""
+    cache = ModelCache()
+    return [model.from_dict(item, cache) for item in items]
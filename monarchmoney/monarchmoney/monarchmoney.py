@@ -1,24 +1,92 @@
+from __future__ import annotations
+
 import asyncio
 import calendar
+import copy
 import getpass
+import importlib
 import json
 import os
 import pickle
-import time
+import warnings
+from collections import Counter
+from contextlib import asynccontextmanager
+from functools import partial
 from datetime import datetime, date, timedelta
-from typing import Any, Dict, List, Optional, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlparse
+
+from .balance_history import (
+    DEFAULT_BALANCE_HISTORY_CHUNK_SIZE,
+    DEFAULT_BALANCE_HISTORY_STATE_FILE,
+    BalanceHistorySource,
+    BalanceHistoryState,
+    chunk_balance_history,
+    read_balance_history,
+)
+from .bulk import BulkOperation, BulkOutcome
+from .cache import ResponseCache
+from .cassette import Cassette
+from .hedging import HedgePolicy
+from .importer import (
+    DEFAULT_IMPORT_CHECKPOINT_DIR,
+    DEFAULT_IMPORT_SCAN_LIMIT,
+    ImportResult,
+    get_transaction_hash,
+    read_transaction_rows,
+)
+from .instrumentation import (
+    CALL_METRICS,
+    CallHook,
+    CallRecord,
+    CallTimer,
+    get_variables_digest,
+)
+from .models import Account, Transaction, to_models
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy, parse_retry_after
+
+if TYPE_CHECKING:
+    from aiohttp import ClientResponse, ClientSession, FormData
+    from gql import Client
+    from graphql import DocumentNode
+
+# gql, graphql, aiohttp and oathtool are imported on first use, so that the
+# package loads quickly for work that does not call the API (e.g. sessions)
+_LAZY_NAMES = {
+    "HTTPResponseError": "transport",
+    "PooledAIOHTTPTransport": "transport",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _LAZY_NAMES:
+        module = importlib.import_module(f".{_LAZY_NAMES[name]}", __package__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-import oathtool
-from aiohttp import ClientSession, FormData
-from aiohttp.client import DEFAULT_TIMEOUT
-from gql import Client, gql
-from gql.transport.aiohttp import AIOHTTPTransport
-from graphql import DocumentNode
 
 AUTH_HEADER_KEY = "authorization"
 CSRF_KEY = "csrftoken"
+BATCH_ALIAS_PREFIX = "t"
+DEFAULT_BATCH_SIZE = 25
+DEFAULT_KEEPALIVE_TIMEOUT = 30
+DEFAULT_PAGE_CONCURRENCY = 4
+DEFAULT_POOL_SIZE = 10
 DEFAULT_RECORD_LIMIT = 100
 ERRORS_KEY = "error_code"
+KEYSET_START_DATE = "1970-01-01"
 SESSION_DIR = ".mm"
 SESSION_FILE = f"{SESSION_DIR}/mm_session.pickle"
 
@@ -51,13 +119,389 @@ class RequestFailedException(Exception):
     pass
 
 
+# Parsed documents keyed by their query source, and the query strings sent on
+# the wire keyed by document, so each API query is parsed and printed only once.
+_PARSED_QUERIES: Dict[str, DocumentNode] = {}
+_QUERY_STRINGS: Dict[int, str] = {}
+
+
+def parse_query(source: str) -> DocumentNode:
+    """
+    Parses a GraphQL query on first use and returns the cached document afterwards.
+
+    Documents are keyed by their source rather than by operation name, as some
+    operations (e.g. Web_GetCashFlowPage) are sent with more than one selection set.
+    """
+    document = _PARSED_QUERIES.get(source)
+    if document is None:
+        from gql import gql
+        from graphql import print_ast
+
+        document = gql(source)
+        _QUERY_STRINGS[id(document)] = print_ast(document)
+        _PARSED_QUERIES[source] = document
+    return document
+
+
+def get_query_string(document: DocumentNode) -> str:
+    """
+    Returns the query string to send for `document`, printing it only if it
+    was not created by parse_query().
+    """
+    query_string = _QUERY_STRINGS.get(id(document))
+    if query_string is None:
+        from graphql import print_ast
+
+        query_string = print_ast(document)
+    return query_string
+
+
+def is_mutation(document: DocumentNode) -> bool:
+    """Returns True if `document` contains a mutation."""
+    from graphql import OperationType
+
+    return any(
+        getattr(definition, "operation", None) == OperationType.MUTATION
+        for definition in document.definitions
+    )
+
+
+def build_batch_query(
+    operation_type: str,
+    operation: str,
+    field: str,
+    item_arguments: Dict[str, str],
+    selection: str,
+    count: int,
+    shared_arguments: Dict[str, str] = {},
+    fragments: str = "",
+) -> str:
+    """
+    Builds a query or mutation that selects `field` `count` times under the
+    aliases t0, t1, ..., so that many items are fetched or changed in one request.
+
+    :param operation_type: "query" or "mutation".
+    :param operation: the name of the operation.
+    :param field: the field selected for each item, e.g. getTransaction.
+    :param item_arguments: the arguments that differ per item and their GraphQL
+      types, e.g. {"id": "UUID!"}. Item i's are passed as variables $id0, $id1, ...
+    :param selection: the selection set for `field`, including its braces.
+    :param count: the number of items.
+    :param shared_arguments: the arguments passed unchanged to every item.
+    :param fragments: the fragment definitions used by `selection`.
+    """
+    definitions = [f"${name}: {type_}" for name, type_ in shared_arguments.items()]
+    fields = []
+    for i in range(count):
+        definitions.extend(
+            f"${name}{i}: {type_}" for name, type_ in item_arguments.items()
+        )
+        arguments = [f"{name}: ${name}{i}" for name in item_arguments]
+        arguments.extend(f"{name}: ${name}" for name in shared_arguments)
+        fields.append(
+            f"  {BATCH_ALIAS_PREFIX}{i}: {field}({', '.join(arguments)}) {selection}"
+        )
+    return (
+        f"{operation_type} {operation}({', '.join(definitions)}) {{\n"
+        + "\n".join(fields)
+        + f"\n}}\n{fragments}"
+    )
+
+
+def get_month_ranges(
+    start_date: str, end_date: str, months: int = 1
+) -> List[Tuple[str, str]]:
+    """
+    Splits the dates from `start_date` to `end_date` (in "yyyy-mm-dd" format) into
+    consecutive ranges of `months` calendar months, the first and last trimmed to
+    the given dates.
+    """
+    if months < 1:
+        raise Exception("months must be at least 1")
+    end = date.fromisoformat(end_date)
+    range_start = date.fromisoformat(start_date)
+    ranges = []
+    while range_start <= end:
+        month = range_start.month - 1 + months
+        next_start = date(range_start.year + month // 12, month % 12 + 1, 1)
+        range_end = min(end, next_start - timedelta(days=1))
+        ranges.append((range_start.isoformat(), range_end.isoformat()))
+        range_start = next_start
+    return ranges
+
+
+# Field profiles select how much of each object is requested:
+#   "ids"  - just enough to identify records and detect changes,
+#   "sync" - the fields needed to mirror records elsewhere, without the
+#            nested details the Monarch Money web app shows alongside them,
+#   "full" - everything, as returned before profiles existed.
+FIELD_PROFILES = ("ids", "sync", "full")
+
+TRANSACTION_FIELDS = {
+    "ids": """
+          fragment TransactionOverviewFields on Transaction {
+            id
+            date
+            updatedAt
+            __typename
+          }
+        """,
+    "sync": """
+          fragment TransactionOverviewFields on Transaction {
+            id
+            amount
+            pending
+            date
+            hideFromReports
+            plaidName
+            notes
+            isRecurring
+            reviewStatus
+            needsReview
+            attachments {
+              id
+              __typename
+            }
+            isSplitTransaction
+            createdAt
+            updatedAt
+            category {
+              id
+              name
+              __typename
+            }
+            merchant {
+              name
+              id
+              __typename
+            }
+            account {
+              id
+              displayName
+              __typename
+            }
+            tags {
+              id
+              name
+              __typename
+            }
+            __typename
+          }
+        """,
+    "full": """
+          fragment TransactionOverviewFields on Transaction {
+            id
+            amount
+            pending
+            date
+            hideFromReports
+            plaidName
+            notes
+            isRecurring
+            reviewStatus
+            needsReview
+            attachments {
+              id
+              extension
+              filename
+              originalAssetUrl
+              publicId
+              sizeBytes
+              __typename
+            }
+            isSplitTransaction
+            createdAt
+            updatedAt
+            category {
+              id
+              name
+              __typename
+            }
+            merchant {
+              name
+              id
+              transactionsCount
+              __typename
+            }
+            account {
+              id
+              displayName
+              __typename
+            }
+            tags {
+              id
+              name
+              color
+              order
+              __typename
+            }
+            __typename
+          }
+        """,
+}
+
+ACCOUNT_FIELDS = {
+    "ids": """
+          fragment AccountFields on Account {
+            id
+            displayName
+            updatedAt
+            __typename
+          }
+        """,
+    "sync": """
+          fragment AccountFields on Account {
+            id
+            displayName
+            syncDisabled
+            deactivatedAt
+            isHidden
+            isAsset
+            mask
+            createdAt
+            updatedAt
+            displayLastUpdatedAt
+            currentBalance
+            displayBalance
+            includeInNetWorth
+            hideFromList
+            hideTransactionsFromReports
+            includeBalanceInNetWorth
+            includeInGoalBalance
+            dataProvider
+            dataProviderAccountId
+            isManual
+            transactionsCount
+            holdingsCount
+            manualInvestmentsTrackingMethod
+            order
+            type {
+              name
+              display
+              __typename
+            }
+            subtype {
+              name
+              display
+              __typename
+            }
+            institution {
+              id
+              name
+              __typename
+            }
+            __typename
+          }
+        """,
+    "full": """
+          fragment AccountFields on Account {
+            id
+            displayName
+            syncDisabled
+            deactivatedAt
+            isHidden
+            isAsset
+            mask
+            createdAt
+            updatedAt
+            displayLastUpdatedAt
+            currentBalance
+            displayBalance
+            includeInNetWorth
+            hideFromList
+            hideTransactionsFromReports
+            includeBalanceInNetWorth
+            includeInGoalBalance
+            dataProvider
+            dataProviderAccountId
+            isManual
+            transactionsCount
+            holdingsCount
+            manualInvestmentsTrackingMethod
+            order
+            logoUrl
+            type {
+              name
+              display
+              __typename
+            }
+            subtype {
+              name
+              display
+              __typename
+            }
+            credential {
+              id
+              updateRequired
+              disconnectedFromDataProviderAt
+              dataProvider
+              institution {
+                id
+                plaidInstitutionId
+                name
+                status
+                __typename
+              }
+              __typename
+            }
+            institution {
+              id
+              name
+              primaryColor
+              url
+              __typename
+            }
+            __typename
+          }
+        """,
+}
+
+
+def check_field_profile(fields: str) -> None:
+    """Raises an exception if `fields` is not one of FIELD_PROFILES."""
+    if fields not in FIELD_PROFILES:
+        raise Exception(
+            f'Unknown fields profile "{fields}", expected one of {", ".join(FIELD_PROFILES)}'
+        )
+
+
 class MonarchMoney(object):
     def __init__(
         self,
         session_file: str = SESSION_FILE,
         timeout: int = 10,
         token: Optional[str] = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+        retry_policy: Optional[RetryPolicy] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        cache: Optional[ResponseCache] = None,
+        hooks: Optional[List[CallHook]] = None,
+        coalesce_queries: bool = True,
+        cassette: Optional[Cassette] = None,
+        hedge_policy: Optional[HedgePolicy] = None,
     ) -> None:
+        """
+        :param session_file: the file used to save and load the session.
+        :param timeout: the timeout, in seconds, for GraphQL calls.
+        :param token: an auth token to use instead of logging in.
+        :param pool_size: the maximum number of open connections to Monarch Money.
+        :param keepalive_timeout: the number of seconds an idle connection is kept for reuse.
+        :param retry_policy: how transient errors in GraphQL calls are retried;
+          defaults to RetryPolicy(). Use RetryPolicy(max_retries=0) to disable retries.
+        :param rate_limiter: limits the rate and concurrency of GraphQL calls;
+          defaults to RateLimiter(), which adapts the concurrency to the server's responses.
+        :param cache: caches reference data (categories, tags, institutions, ...)
+          between calls and runs, e.g. ResponseCache(); nothing is cached by default.
+        :param hooks: callables passed a CallRecord after every API call, e.g. a
+          LatencyHistogram, JSONLSink or RingBuffer.
+        :param coalesce_queries: let concurrent calls of the same query with the
+          same variables share one request. Mutations are never coalesced.
+        :param cassette: records every GraphQL call and response to a file, or
+          replays them from it without calling the API, e.g. Cassette(mode="replay").
+        :param hedge_policy: duplicates queries that are slower than usual, e.g.
+          HedgePolicy(quantile=0.95); nothing is hedged by default.
+        """
         self._headers = {
             "Client-Platform": "web",
         }
@@ -67,6 +511,46 @@ class MonarchMoney(object):
         self._session_file = session_file
         self._token = token
         self._timeout = timeout
+        self._pool_size = pool_size
+        self._keepalive_timeout = keepalive_timeout
+        self._http_session: Optional[ClientSession] = None
+        self._http_session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._graphql_client: Optional[Client] = None
+        self._retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self._retry_counts: Counter = Counter()
+        self._rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self._cache = cache
+        self._hooks: List[CallHook] = list(hooks or [])
+        self._coalesce_queries = coalesce_queries
+        self._in_flight_queries: Dict[Tuple[str, int, str], asyncio.Future] = {}
+        self._in_flight_waiters: Counter = Counter()
+        self._coalesced_counts: Counter = Counter()
+        self._cassette = cassette
+        self._hedge_policy = hedge_policy
+        self._hedge_counts: Counter = Counter()
+
+    async def __aenter__(self) -> "MonarchMoney":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        Closes the pooled HTTP connections held by this instance, and finishes
+        writing the cassette if one is being recorded.
+
+        The pool is re-created on the next API call, so calling this is only
+        required to release connections promptly (or use `async with MonarchMoney() as mm`).
+        """
+        if self._cassette is not None:
+            self._cassette.close()
+        session = self._http_session
+        self._http_session = None
+        self._http_session_loop = None
+        self._graphql_client = None
+        if session is not None and not session.closed:
+            await session.close()
 
     @property
     def timeout(self) -> int:
@@ -76,6 +560,63 @@ class MonarchMoney(object):
     def set_timeout(self, timeout_secs: int) -> None:
         """Sets the default timeout on GraphQL API calls, in seconds."""
         self._timeout = timeout_secs
+        self._graphql_client = None
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        """The policy used to retry transient errors in GraphQL calls."""
+        return self._retry_policy
+
+    def set_retry_policy(self, retry_policy: RetryPolicy) -> None:
+        """Sets the policy used to retry transient errors in GraphQL calls."""
+        self._retry_policy = retry_policy
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """The limiter shared by all GraphQL calls made by this instance."""
+        return self._rate_limiter
+
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        """The cache of reference data, or None if nothing is cached."""
+        return self._cache
+
+    def invalidate_cache(self, operations: Optional[List[str]] = None) -> None:
+        """
+        Drops cached results, e.g. after changing categories or tags elsewhere.
+
+        :param operations: the operations to drop, e.g. ["GetCategories"]; all if None.
+        """
+        if self._cache is not None:
+            self._cache.invalidate(operations)
+
+    def add_hook(self, hook: CallHook) -> None:
+        """Calls `hook` with a CallRecord after every API call."""
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook: CallHook) -> None:
+        """Stops calling a hook added with add_hook()."""
+        self._hooks.remove(hook)
+
+    @property
+    def retry_counts(self) -> Dict[str, int]:
+        """The number of retries made so far, by operation name."""
+        return dict(self._retry_counts)
+
+    @property
+    def hedge_policy(self) -> Optional[HedgePolicy]:
+        """When slow queries are duplicated, or None if they are not."""
+        return self._hedge_policy
+
+    @property
+    def hedged_counts(self) -> Dict[str, int]:
+        """The number of duplicate requests sent for slow queries, by operation name."""
+        return dict(self._hedge_counts)
+
+    @property
+    def coalesced_counts(self) -> Dict[str, int]:
+        """The number of calls that shared an identical query's request, by operation name."""
+        return dict(self._coalesced_counts)
 
     @property
     def token(self) -> Optional[str]:
@@ -127,11 +668,19 @@ class MonarchMoney(object):
         """Performs multi-factor authentication to access a Monarch Money account."""
         await self._multi_factor_authenticate(email, password, code)
 
-    async def get_accounts(self) -> Dict[str, Any]:
+    async def get_accounts(
+        self, fields: str = "full", as_models: bool = False
+    ) -> Dict[str, Any]:
         """
         Gets the list of accounts configured in the Monarch Money account.
+
+        :param fields: the profile of account fields to request: "ids", "sync" or "full".
+          "sync" leaves out the credential and logo details; "ids" only returns
+          each account's id, displayName and updatedAt.
+        :param as_models: return the accounts as Account models instead of dicts.
         """
-        query = gql(
+        check_field_profile(fields)
+        query = parse_query(
             """
           query GetAccounts {
             accounts {
@@ -144,78 +693,22 @@ class MonarchMoney(object):
               __typename
             }
           }
-
-          fragment AccountFields on Account {
-            id
-            displayName
-            syncDisabled
-            deactivatedAt
-            isHidden
-            isAsset
-            mask
-            createdAt
-            updatedAt
-            displayLastUpdatedAt
-            currentBalance
-            displayBalance
-            includeInNetWorth
-            hideFromList
-            hideTransactionsFromReports
-            includeBalanceInNetWorth
-            includeInGoalBalance
-            dataProvider
-            dataProviderAccountId
-            isManual
-            transactionsCount
-            holdingsCount
-            manualInvestmentsTrackingMethod
-            order
-            logoUrl
-            type {
-              name
-              display
-              __typename
-            }
-            subtype {
-              name
-              display
-              __typename
-            }
-            credential {
-              id
-              updateRequired
-              disconnectedFromDataProviderAt
-              dataProvider
-              institution {
-                id
-                plaidInstitutionId
-                name
-                status
-                __typename
-              }
-              __typename
-            }
-            institution {
-              id
-              name
-              primaryColor
-              url
-              __typename
-            }
-            __typename
-          }
         """
+            + ACCOUNT_FIELDS[fields]
         )
-        return await self.gql_call(
+        response = await self.gql_call(
             operation="GetAccounts",
             graphql_query=query,
         )
+        if as_models:
+            response["accounts"] = to_models(Account, response["accounts"])
+        return response
 
     async def get_account_type_options(self) -> Dict[str, Any]:
         """
         Retrieves a list of available account types and their subtypes.
         """
-        query = gql(
+        query = parse_query(
             """
             query GetAccountTypeOptions {
                 accountTypeOptions {
@@ -256,7 +749,7 @@ class MonarchMoney(object):
         if start_date is None:
             start_date = (date.today() - timedelta(days=31)).isoformat()
 
-        query = gql(
+        query = parse_query(
             """
             query GetAccountRecentBalances($startDate: Date!) {
                 accounts {
@@ -287,7 +780,7 @@ class MonarchMoney(object):
         if timeframe not in ("year", "month"):
             raise Exception(f'Unknown timeframe "{timeframe}"')
 
-        query = gql(
+        query = parse_query(
             """
             query GetSnapshotsByAccountType($startDate: Date!, $timeframe: Timeframe!) {
                 snapshotsByAccountType(startDate: $startDate, timeframe: $timeframe) {
@@ -321,7 +814,7 @@ class MonarchMoney(object):
         and optionally only for accounts of type `account_type`.
         Both `start_date` and `end_date` are ISO datestrings, formatted as YYYY-MM-DD
         """
-        query = gql(
+        query = parse_query(
             """
             query GetAggregateSnapshots($filters: AggregateSnapshotFilters) {
                 aggregateSnapshots(filters: $filters) {
@@ -370,7 +863,7 @@ class MonarchMoney(object):
         :param account_name: The string of the account name
         :param display_balance: a float of the amount of the account balance when the account is created
         """
-        query = gql(
+        query = parse_query(
             """
             mutation Web_CreateManualAccount($input: CreateManualAccountMutationInput!) {
                 createManualAccount(input: $input) {
@@ -440,7 +933,7 @@ class MonarchMoney(object):
         :param hide_from_summary_list: A boolean if the account should be hidden in the "Accounts" view
         :param hide_transactions_from_reports: A boolean if the account should be excluded from budgets and reports
         """
-        query = gql(
+        query = parse_query(
             """
             mutation Common_UpdateAccount($input: UpdateAccountMutationInput!) {
                 updateAccount(input: $input) {
@@ -564,7 +1057,7 @@ class MonarchMoney(object):
         """
         Deletes an account
         """
-        query = gql(
+        query = parse_query(
             """
             mutation Common_DeleteAccount($id: UUID!) {
                 deleteAccount(id: $id) {
@@ -604,7 +1097,7 @@ class MonarchMoney(object):
 
         Otherwise, throws a `RequestFailedException`.
         """
-        query = gql(
+        query = parse_query(
             """
           mutation Common_ForceRefreshAccountsMutation($input: ForceRefreshAccountsInput!) {
             forceRefreshAccounts(input: $input) {
@@ -662,37 +1155,60 @@ class MonarchMoney(object):
         :param account_ids: The list of accounts IDs to check on the status of.
           If set to None, all account IDs will be checked.
         """
-        query = gql(
-            """
-          query ForceRefreshAccountsQuery {
-            accounts {
-              id
-              hasSyncInProgress
-              __typename
-            }
-          }
-          """
-        )
-
-        response = await self.gql_call(
-            operation="ForceRefreshAccountsQuery",
-            graphql_query=query,
-            variables={},
-        )
-
-        if "accounts" not in response:
-            raise RequestFailedException("Unable to request status of refresh")
+        in_progress = await self._get_accounts_sync_in_progress()
 
         if account_ids:
             return all(
                 [
-                    not x["hasSyncInProgress"]
-                    for x in response["accounts"]
-                    if x["id"] in account_ids
+                    not syncing
+                    for account_id, syncing in in_progress.items()
+                    if account_id in account_ids
                 ]
             )
         else:
-            return all([not x["hasSyncInProgress"] for x in response["accounts"]])
+            return all([not syncing for syncing in in_progress.values()])
+
+    async def iter_accounts_refresh(
+        self,
+        account_ids: Optional[List[str]] = None,
+        timeout: float = 300,
+        initial_delay: float = 1,
+        max_delay: float = 30,
+        backoff_factor: float = 2,
+    ) -> AsyncIterator[str]:
+        """
+        Forces an accounts refresh on Monarch, and yields the id of each account
+        as soon as its refresh completes, so that its data can be fetched while
+        slower institutions are still syncing.
+
+        The status is polled with exponential backoff, from `initial_delay` up to
+        `max_delay` seconds between polls. Accounts still syncing when `timeout`
+        runs out are not yielded.
+
+        :param account_ids: The list of accounts IDs to refresh.
+          If set to None, all account IDs will be implicitly fetched.
+        :param timeout: The number of seconds to wait for the refresh to complete
+        :param initial_delay: The number of seconds to wait before the first check
+        :param max_delay: The longest number of seconds to wait between two checks
+        :param backoff_factor: The factor the wait grows by after each check
+        """
+        if account_ids is None:
+            account_ids = list(await self._get_accounts_sync_in_progress())
+        await self.request_accounts_refresh(account_ids)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        pending = list(account_ids)
+        delay = initial_delay
+        while pending and loop.time() < deadline:
+            await asyncio.sleep(min(delay, max(0, deadline - loop.time())))
+            delay = min(max_delay, delay * backoff_factor)
+            in_progress = await self._get_accounts_sync_in_progress()
+            # Accounts missing from the response (e.g. deleted) have nothing left to sync
+            completed = [x for x in pending if not in_progress.get(x, False)]
+            for account_id in completed:
+                pending.remove(account_id)
+                yield account_id
 
     async def request_accounts_refresh_and_wait(
         self,
@@ -707,26 +1223,69 @@ class MonarchMoney(object):
         Returns True if all accounts are refreshed within the timeout specified, False otherwise.
 
         :param account_ids: The list of accounts IDs to refresh.
-          If set to None, all account IDs will be implicitly fetched.
+          If set to None, all account IDs will be implicitly fetched. An empty list
+          is sent as is, and waits for every account to finish syncing, as with
+          is_accounts_refresh_complete.
         :param timeout: The number of seconds to wait for the refresh to complete
         :param delay: The number of seconds to wait for each check on the refresh request
         """
+        if account_ids is not None and not account_ids:
+            await self.request_accounts_refresh(account_ids)
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            refreshed = False
+            while not refreshed and loop.time() <= deadline:
+                await asyncio.sleep(delay)
+                refreshed = await self.is_accounts_refresh_complete(account_ids)
+            return refreshed
+
         if account_ids is None:
-            account_data = await self.get_accounts()
-            account_ids = [x["id"] for x in account_data["accounts"]]
-        await self.request_accounts_refresh(account_ids)
-        start = time.time()
-        refreshed = False
-        while not refreshed and (time.time() <= (start + timeout)):
-            await asyncio.sleep(delay)
-            refreshed = await self.is_accounts_refresh_complete(account_ids)
-        return refreshed
+            account_ids = list(await self._get_accounts_sync_in_progress())
+        refreshed = [
+            account_id
+            async for account_id in self.iter_accounts_refresh(
+                account_ids,
+                timeout=timeout,
+                initial_delay=delay,
+                max_delay=delay,
+                backoff_factor=1,
+            )
+        ]
+        return len(refreshed) == len(account_ids)
+
+    async def _get_accounts_sync_in_progress(self) -> Dict[str, bool]:
+        """
+        Returns whether a sync is in progress for each account, by account id,
+        with a query light enough to poll.
+        """
+        query = parse_query(
+            """
+          query ForceRefreshAccountsQuery {
+            accounts {
+              id
+              hasSyncInProgress
+              __typename
+            }
+          }
+          """
+        )
+
+        response = await self.gql_call(
+            operation="ForceRefreshAccountsQuery",
+            graphql_query=query,
+            variables={},
+        )
+
+        if "accounts" not in response:
+            raise RequestFailedException("Unable to request status of refresh")
+
+        return {x["id"]: x["hasSyncInProgress"] for x in response["accounts"]}
 
     async def get_account_holdings(self, account_id: int) -> Dict[str, Any]:
         """
         Get the holdings information for a brokerage or similar type of account.
         """
-        query = gql(
+        query = parse_query(
             """
           query Web_GetHoldings($input: PortfolioInput) {
             portfolio(input: $input) {
@@ -803,7 +1362,7 @@ class MonarchMoney(object):
           json object with all historical snapshots of requested account's balances
         """
 
-        query = gql(
+        query = parse_query(
             """
             query AccountDetails_getAccount($id: UUID!, $filters: TransactionFilterInput) {
               account(id: $id) {
@@ -1021,12 +1580,174 @@ class MonarchMoney(object):
 
         return account_balance_history
 
+    async def get_account_holdings_many(
+        self,
+        account_ids: List[str],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    ) -> Dict[str, Union[Dict[str, Any], BaseException]]:
+        """
+        Gets the holdings of many brokerage or similar accounts, fetching
+        `batch_size` accounts per request. If a whole request fails, its accounts
+        are requested one at a time.
+
+        Returns a dict of account id to the holdings, as returned by
+        get_account_holdings, or to the exception raised for that account.
+
+        :param account_ids: the accounts to query.
+        :param batch_size: the number of accounts fetched per request.
+        :param max_concurrency: the maximum number of requests sent at once.
+        """
+        selection = """{
+            aggregateHoldings {
+              edges {
+                node {
+                  id
+                  quantity
+                  basis
+                  totalValue
+                  securityPriceChangeDollars
+                  securityPriceChangePercent
+                  lastSyncedAt
+                  holdings {
+                    id
+                    type
+                    typeDisplay
+                    name
+                    ticker
+                    closingPrice
+                    isManual
+                    closingPriceUpdatedAt
+                    __typename
+                  }
+                  security {
+                    id
+                    name
+                    type
+                    ticker
+                    typeDisplay
+                    currentPrice
+                    currentPriceUpdatedAt
+                    closingPrice
+                    closingPriceUpdatedAt
+                    oneDayChangePercent
+                    oneDayChangeDollars
+                    __typename
+                  }
+                  __typename
+                }
+                __typename
+              }
+              __typename
+            }
+            __typename
+          }
+        """
+        account_ids = list(dict.fromkeys(str(account_id) for account_id in account_ids))
+        today = datetime.today().strftime("%Y-%m-%d")
+        results = await self._gql_call_batched(
+            operation="Web_GetHoldingsBatch",
+            field="portfolio",
+            item_arguments={"input": "PortfolioInput"},
+            selection=selection,
+            items=[
+                {
+                    "input": {
+                        "accountIds": [account_id],
+                        "endDate": today,
+                        "includeHiddenHoldings": True,
+                        "startDate": today,
+                    }
+                }
+                for account_id in account_ids
+            ],
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+            split_failed_batches=True,
+        )
+        return {
+            account_id: (
+                result if isinstance(result, BaseException) else {"portfolio": result}
+            )
+            for account_id, result in zip(account_ids, results)
+        }
+
+    async def get_account_histories(
+        self,
+        account_ids: List[str],
+        since: Optional[str] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    ) -> Dict[str, Union[List[Dict[str, Any]], BaseException]]:
+        """
+        Gets the daily balance history of many accounts, fetching `batch_size`
+        accounts per request. If a whole request fails, its accounts are requested
+        one at a time.
+
+        Returns a dict of account id to the history, as returned by
+        get_account_history, or to the exception raised for that account.
+
+        :param account_ids: the accounts to query.
+        :param since: only return snapshots on or after this date, in "yyyy-mm-dd"
+          format, e.g. to merge them into a history kept since the last sync.
+        :param batch_size: the number of accounts fetched per request.
+        :param max_concurrency: the maximum number of requests sent at once.
+        """
+        account_ids = list(dict.fromkeys(str(account_id) for account_id in account_ids))
+        items = [{"id": account_id} for account_id in account_ids]
+        snapshots, accounts = await asyncio.gather(
+            self._gql_call_batched(
+                operation="AccountDetails_getSnapshotsBatch",
+                field="snapshotsForAccount",
+                item_arguments={"accountId": "UUID!"},
+                selection="{ date signedBalance __typename }",
+                items=[{"accountId": account_id} for account_id in account_ids],
+                batch_size=batch_size,
+                max_concurrency=max_concurrency,
+                split_failed_batches=True,
+            ),
+            self._gql_call_batched(
+                operation="AccountDetails_getAccountBatch",
+                field="account",
+                item_arguments={"id": "UUID!"},
+                selection="{ id displayName __typename }",
+                items=items,
+                batch_size=batch_size,
+                max_concurrency=max_concurrency,
+                split_failed_batches=True,
+            ),
+        )
+
+        histories: Dict[str, Union[List[Dict[str, Any]], BaseException]] = {}
+        for account_id, history, account in zip(account_ids, snapshots, accounts):
+            if isinstance(history, BaseException):
+                histories[account_id] = history
+                continue
+            if isinstance(account, BaseException):
+                histories[account_id] = account
+                continue
+            if account is None:
+                histories[account_id] = RequestFailedException(
+                    f"Account {account_id} not found"
+                )
+                continue
+            histories[account_id] = [
+                dict(
+                    snapshot,
+                    accountId=account_id,
+                    accountName=account["displayName"],
+                )
+                for snapshot in history or []
+                if since is None or snapshot["date"] >= since
+            ]
+        return histories
+
     async def get_institutions(self) -> Dict[str, Any]:
         """
         Gets institution data from the account.
         """
 
-        query = gql(
+        query = parse_query(
             """
             query Web_GetInstitutionSettings {
               credentials {
@@ -1112,6 +1833,7 @@ class MonarchMoney(object):
         end_date: Optional[str] = None,
         use_legacy_goals: Optional[bool] = False,
         use_v2_goals: Optional[bool] = True,
+        fields: str = "full",
     ) -> Dict[str, Any]:
         """
         Get your budgets and corresponding actual amounts from the account.
@@ -1128,8 +1850,16 @@ class MonarchMoney(object):
             Set True to return a list of monthly budget set aside for goals (default: no list)
         :param use_v2_goals:
             Set True to return a list of monthly budget set aside for version 2 goals (default list)
+        :param fields:
+            the profile of budget fields to request: "sync" leaves out all goals, whatever
+            `use_legacy_goals` and `use_v2_goals` say; "full" (default) returns everything
         """
-        query = gql(
+        if fields not in ("sync", "full"):
+            raise Exception(f'Unknown fields profile "{fields}", expected sync or full')
+        if fields == "sync":
+            use_legacy_goals = use_v2_goals = False
+
+        query = parse_query(
             """
           query GetJointPlanningData($startDate: Date!, $endDate: Date!, $useLegacyGoals: Boolean!, $useV2Goals: Boolean!) {
             budgetData(startMonth: $startDate, endMonth: $endDate) {
@@ -1306,29 +2036,9 @@ class MonarchMoney(object):
 
         if not start_date and not end_date:
             # Default start_date to last month and end_date to next month
-            today = datetime.today()
-
-            # Get the first day of last month
-            last_month = today.month - 1
-            last_month_year = today.year
-            first_day_of_last_month = 1
-            if last_month < 1:
-                last_month_year -= 1
-                last_month = 12
-            variables["startDate"] = datetime(
-                last_month_year, last_month, first_day_of_last_month
-            ).strftime("%Y-%m-%d")
-
-            # Get the last day of next month
-            next_month = today.month + 1
-            next_month_year = today.year
-            if next_month > 12:
-                next_month_year += 1
-                next_month = 1
-            last_day_of_next_month = calendar.monthrange(next_month_year, next_month)[1]
-            variables["endDate"] = datetime(
-                next_month_year, next_month, last_day_of_next_month
-            ).strftime("%Y-%m-%d")
+            variables["startDate"], variables["endDate"] = (
+                self._get_default_budget_range()
+            )
 
         elif bool(start_date) != bool(end_date):
             raise Exception(
@@ -1341,11 +2051,49 @@ class MonarchMoney(object):
             variables=variables,
         )
 
+    async def get_budgets_sharded(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        use_legacy_goals: Optional[bool] = False,
+        use_v2_goals: Optional[bool] = True,
+        fields: str = "full",
+        months_per_shard: int = 1,
+        max_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    ) -> Dict[str, Any]:
+        """
+        Same as get_budgets, but fetches the range in shards of `months_per_shard`
+        months, up to `max_concurrency` at once, and merges them back into one
+        response. Each shard is retried on its own, so a failure only repeats
+        that shard's months.
+
+        :param months_per_shard: the number of months fetched per request.
+        :param max_concurrency: the maximum number of shards requested at once.
+        """
+        if not start_date and not end_date:
+            start_date, end_date = self._get_default_budget_range()
+        elif bool(start_date) != bool(end_date):
+            raise Exception(
+                "You must specify both a startDate and endDate, not just one of them."
+            )
+
+        shards = await self._gather_shards(
+            partial(
+                self.get_budgets,
+                use_legacy_goals=use_legacy_goals,
+                use_v2_goals=use_v2_goals,
+                fields=fields,
+            ),
+            get_month_ranges(start_date, end_date, months_per_shard),
+            max_concurrency,
+        )
+        return self._merge_budget_shards(shards)
+
     async def get_subscription_details(self) -> Dict[str, Any]:
         """
         The type of subscription for the Monarch Money account.
         """
-        query = gql(
+        query = parse_query(
             """
           query GetSubscriptionDetails {
             subscription {
@@ -1369,7 +2117,7 @@ class MonarchMoney(object):
         Gets transactions summary from the account.
         """
 
-        query = gql(
+        query = parse_query(
             """
             query GetTransactionsPage($filters: TransactionFilterInput) {
               aggregates(filters: $filters) {
@@ -1417,6 +2165,11 @@ class MonarchMoney(object):
         is_recurring: Optional[bool] = None,
         imported_from_mint: Optional[bool] = None,
         synced_from_institution: Optional[bool] = None,
+        fields: str = "full",
+        include_total_count: bool = True,
+        include_rules: bool = True,
+        order_by: str = "date",
+        as_models: bool = False,
     ) -> Dict[str, Any]:
         """
         Gets transaction data from the account.
@@ -1436,13 +2189,24 @@ class MonarchMoney(object):
         :param is_recurring: a bool to filter for whether the transactions are recurring.
         :param imported_from_mint: a bool to filter for whether the transactions were imported from mint.
         :param synced_from_institution: a bool to filter for whether the transactions were synced from an institution.
+        :param fields: the profile of transaction fields to request: "ids", "sync" or "full".
+          "sync" leaves out attachment details, tag colors and merchant transaction counts;
+          "ids" only returns each transaction's id, date and updatedAt.
+        :param include_total_count: request allTransactions.totalCount, which the server
+          counts across all pages.
+        :param include_rules: request the ids of the transaction rules.
+        :param order_by: the TransactionOrdering the results are sorted by, defaults to
+          "date" (newest first).
+        :param as_models: return the results as Transaction models instead of dicts,
+          which take a fraction of the memory for large results.
         """
+        check_field_profile(fields)
 
-        query = gql(
+        query = parse_query(
             """
-          query GetTransactionsList($offset: Int, $limit: Int, $filters: TransactionFilterInput, $orderBy: TransactionOrdering) {
+          query GetTransactionsList($offset: Int, $limit: Int, $filters: TransactionFilterInput, $orderBy: TransactionOrdering, $includeTotalCount: Boolean = true, $includeRules: Boolean = true) {
             allTransactions(filters: $filters) {
-              totalCount
+              totalCount @include(if: $includeTotalCount)
               results(offset: $offset, limit: $limit, orderBy: $orderBy) {
                 id
                 ...TransactionOverviewFields
@@ -1450,67 +2214,19 @@ class MonarchMoney(object):
               }
               __typename
             }
-            transactionRules {
+            transactionRules @include(if: $includeRules) {
               id
               __typename
             }
           }
-    
-          fragment TransactionOverviewFields on Transaction {
-            id
-            amount
-            pending
-            date
-            hideFromReports
-            plaidName
-            notes
-            isRecurring
-            reviewStatus
-            needsReview
-            attachments {
-              id
-              extension
-              filename
-              originalAssetUrl
-              publicId
-              sizeBytes
-              __typename
-            }
-            isSplitTransaction
-            createdAt
-            updatedAt
-            category {
-              id
-              name
-              __typename
-            }
-            merchant {
-              name
-              id
-              transactionsCount
-              __typename
-            }
-            account {
-              id
-              displayName
-              __typename
-            }
-            tags {
-              id
-              name
-              color
-              order
-              __typename
-            }
-            __typename
-          }
         """
+            + TRANSACTION_FIELDS[fields]
         )
 
         variables = {
             "offset": offset,
             "limit": limit,
-            "orderBy": "date",
+            "orderBy": order_by,
             "filters": {
                 "search": search,
                 "categories": category_ids,
@@ -1519,6 +2235,13 @@ class MonarchMoney(object):
             },
         }
 
+        # Both default to true in the query, so the variables are only sent to skip them
+        if not include_total_count:
+            variables["includeTotalCount"] = False
+
+        if not include_rules:
+            variables["includeRules"] = False
+
         # If bool filters are not defined (i.e. None), then it should not apply the filter
         if has_attachments is not None:
             variables["filters"]["hasAttachments"] = has_attachments
@@ -1549,9 +2272,250 @@ class MonarchMoney(object):
                 "You must specify both a startDate and endDate, not just one of them."
             )
 
-        return await self.gql_call(
-            operation="GetTransactionsList", graphql_query=query, variables=variables
+        response = await self.gql_call(
+            operation="GetTransactionsList", graphql_query=query, variables=variables
+        )
+        if as_models:
+            transactions = response["allTransactions"]
+            transactions["results"] = to_models(Transaction, transactions["results"])
+        return response
+
+    async def fetch_all_transactions(
+        self,
+        limit: int = DEFAULT_RECORD_LIMIT,
+        max_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+        pagination: str = "offset",
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Gets every transaction matching the given filters, fetching pages concurrently.
+
+        The first page is requested on its own to learn `totalCount`; the remaining
+        offsets are then fetched in parallel and stitched back together in order.
+        Transactions that shift between pages while paging are returned once. Only the
+        first page requests totalCount and the transaction rules.
+
+        With "keyset" pagination, pages are instead walked one date window at a time
+        (see iter_transactions), which is consistent while Monarch is syncing but
+        sequential, and the transaction rules are not returned.
+
+        Returns the same shape as get_transactions, with all results in one list.
+
+        :param limit: the number of transactions per page.
+        :param max_concurrency: the maximum number of pages requested at once.
+        :param pagination: "offset" or "keyset".
+        :param kwargs: any filter accepted by get_transactions (start_date, end_date,
+          account_ids, ...), its fields profile or as_models.
+        """
+        if "offset" in kwargs:
+            raise TypeError("fetch_all_transactions() does not accept an offset")
+        if pagination not in ("offset", "keyset"):
+            raise Exception(
+                f'Unknown pagination "{pagination}", expected offset or keyset'
+            )
+
+        if pagination == "keyset":
+            transactions = [
+                transaction
+                async for transaction in self.iter_transactions(
+                    limit=limit, pagination=pagination, **kwargs
+                )
+            ]
+            return {
+                "allTransactions": {
+                    "totalCount": len(transactions),
+                    "results": transactions,
+                }
+            }
+
+        first_page = await self.get_transactions(limit=limit, offset=0, **kwargs)
+        total_count = first_page["allTransactions"]["totalCount"]
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        page_kwargs = {**kwargs, "include_total_count": False, "include_rules": False}
+
+        async def fetch_page(offset: int) -> List[Dict[str, Any]]:
+            async with semaphore:
+                page = await self.get_transactions(
+                    limit=limit, offset=offset, **page_kwargs
+                )
+            return page["allTransactions"]["results"]
+
+        pages = [first_page["allTransactions"]["results"]]
+        pages.extend(
+            await asyncio.gather(
+                *[fetch_page(offset) for offset in range(limit, total_count, limit)]
+            )
+        )
+
+        # Transactions created while paging push the total past the first page's
+        # count, so keep going one page at a time until a short page is returned.
+        offset = limit * len(pages)
+        while len(pages[-1]) == limit:
+            pages.append(await fetch_page(offset))
+            offset += limit
+
+        transactions = []
+        seen_ids = set()
+        for page in pages:
+            for transaction in page:
+                if transaction["id"] not in seen_ids:
+                    seen_ids.add(transaction["id"])
+                    transactions.append(transaction)
+
+        first_page["allTransactions"]["totalCount"] = max(
+            total_count, len(transactions)
+        )
+        first_page["allTransactions"]["results"] = transactions
+        return first_page
+
+    async def iter_transactions(
+        self,
+        limit: int = DEFAULT_RECORD_LIMIT,
+        by_page: bool = False,
+        prefetch: bool = True,
+        pagination: str = "offset",
+        **kwargs: Any,
+    ) -> AsyncIterator[Union[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Iterates over every transaction matching the given filters, one page at a time.
+
+        Only the current page (and the prefetched next one) is held in memory, so
+        consumers can process transactions before the last page has arrived. Pages are
+        requested without totalCount and the transaction rules, which are not yielded.
+
+        With "keyset" pagination, each page is the first page of a date window whose
+        end moves back to the last date seen, so requests stay shallow however deep
+        the history is, and transactions synced while paging (which land after the
+        window) do not shift the pages still to come. Only transactions on the window's
+        last date are paged by offset.
+
+        :param limit: the number of transactions per page.
+        :param by_page: yield each page as a list instead of one transaction at a time.
+        :param prefetch: request the next page while the current one is being consumed.
+        :param pagination: "offset" to page by offset, or "keyset" to page by date
+          window. Without start_date and end_date, keyset pagination covers every
+          transaction from KEYSET_START_DATE to a year from today.
+        :param kwargs: any filter accepted by get_transactions (start_date, end_date,
+          account_ids, ...), its fields profile or as_models.
+        """
+        if "offset" in kwargs:
+            raise TypeError("iter_transactions() does not accept an offset")
+        if pagination not in ("offset", "keyset"):
+            raise Exception(
+                f'Unknown pagination "{pagination}", expected offset or keyset'
+            )
+        if pagination == "keyset" and kwargs.get("order_by", "date") != "date":
+            raise Exception("Keyset pagination requires order_by date")
+
+        page_kwargs = {**kwargs, "include_total_count": False, "include_rules": False}
+        cursor: Optional[Dict[str, Any]] = {"offset": 0}
+        if pagination == "keyset":
+            cursor["start_date"] = page_kwargs.pop("start_date", None)
+            cursor["end_date"] = page_kwargs.pop("end_date", None)
+            if not cursor["start_date"] and not cursor["end_date"]:
+                cursor["start_date"] = KEYSET_START_DATE
+                cursor["end_date"] = (date.today() + timedelta(days=366)).isoformat()
+
+        def request_page(cursor: Dict[str, Any]) -> "asyncio.Future[Dict[str, Any]]":
+            return asyncio.ensure_future(
+                self.get_transactions(limit=limit, **cursor, **page_kwargs)
+            )
+
+        def get_next_cursor(
+            cursor: Dict[str, Any], results: List[Dict[str, Any]]
+        ) -> Optional[Dict[str, Any]]:
+            if len(results) < limit:
+                return None
+            if pagination == "offset":
+                return {**cursor, "offset": cursor["offset"] + limit}
+            last_date = results[-1]["date"]
+            if last_date == cursor["end_date"]:
+                # The whole page is on the window's last date, so page within it
+                return {**cursor, "offset": cursor["offset"] + len(results)}
+            on_last_date = sum(1 for t in results if t["date"] == last_date)
+            return {**cursor, "end_date": last_date, "offset": on_last_date}
+
+        next_page: Optional["asyncio.Future[Dict[str, Any]]"] = request_page(cursor)
+        seen_ids = set()
+        try:
+            while next_page is not None:
+                results = (await next_page)["allTransactions"]["results"]
+                next_page = None
+                window_end = cursor.get("end_date")
+                cursor = get_next_cursor(cursor, results)
+                if cursor is not None and prefetch:
+                    next_page = request_page(cursor)
+
+                # Transactions can shift across a page boundary while paging
+                page = [t for t in results if t["id"] not in seen_ids]
+                seen_ids.update(t["id"] for t in page)
+                if pagination == "keyset" and cursor is not None:
+                    if cursor["end_date"] != window_end:
+                        # Only the new window's last date can be returned again
+                        seen_ids = {
+                            t["id"] for t in results if t["date"] == cursor["end_date"]
+                        }
+
+                if by_page:
+                    if page:
+                        yield page
+                else:
+                    for transaction in page:
+                        yield transaction
+
+                if cursor is not None and not prefetch:
+                    next_page = request_page(cursor)
+        finally:
+            if next_page is not None and not next_page.done():
+                next_page.cancel()
+
+    async def iter_transactions_until(
+        self,
+        predicate: Callable[[Dict[str, Any]], bool],
+        limit: int = DEFAULT_RECORD_LIMIT,
+        by_page: bool = False,
+        pagination: str = "offset",
+        **kwargs: Any,
+    ) -> AsyncIterator[Union[Dict[str, Any], List[Dict[str, Any]]]]:
+        """
+        Iterates over transactions newest first, skipping those matching `predicate`,
+        and stops at the first page in which every transaction matches it.
+
+        For incremental syncs, `predicate` returns True for transactions already held
+        (e.g. by id and updatedAt), so a run with few new transactions costs a page or
+        two. Changes to transactions older than the first fully known page are not seen.
+        Pages are not prefetched, so no page past the stopping one is requested.
+
+        :param predicate: returns True for a transaction that is already known.
+        :param limit: the number of transactions per page.
+        :param by_page: yield the unknown transactions of each page as a list.
+        :param pagination: "offset" or "keyset", see iter_transactions.
+        :param kwargs: any filter accepted by get_transactions (start_date, end_date,
+          account_ids, ...), its fields profile or as_models.
+        """
+        if kwargs.get("order_by", "date") != "date":
+            raise Exception("iter_transactions_until() requires order_by date")
+
+        pages = self.iter_transactions(
+            limit=limit,
+            by_page=True,
+            prefetch=False,
+            pagination=pagination,
+            **kwargs,
         )
+        try:
+            async for page in pages:
+                unknown = [t for t in page if not predicate(t)]
+                if not unknown:
+                    break
+                if by_page:
+                    yield unknown
+                else:
+                    for transaction in unknown:
+                        yield transaction
+        finally:
+            await pages.aclose()
 
     async def create_transaction(
         self,
@@ -1566,7 +2530,7 @@ class MonarchMoney(object):
         """
         Creates a transaction with the given parameters
         """
-        query = gql(
+        query = parse_query(
             """
           mutation Common_CreateTransactionMutation($input: CreateTransactionMutationInput!) {
             createTransaction(input: $input) {
@@ -1612,13 +2576,156 @@ class MonarchMoney(object):
             variables=variables,
         )
 
+    async def import_transactions(
+        self,
+        path: str,
+        account_id: Optional[str] = None,
+        category_id: Optional[str] = None,
+        update_balance: bool = False,
+        checkpoint_path: Optional[str] = None,
+        bulk: Optional[BulkOperation] = None,
+    ) -> ImportResult:
+        """
+        Creates the transactions of a CSV or JSON lines file, skipping those already
+        in Monarch Money, e.g. to migrate a manual cash ledger.
+
+        Rows are matched by get_transaction_hash() against the transactions of their
+        accounts between the file's first and last dates, found with one scan, so
+        re-running an import does not create duplicates. Identical rows (e.g. two
+        coffees on the same day) are each created, less as many as already exist
+        and were not created by a previous run of the import.
+        The rest are created through a BulkOperation that records each row to a
+        checkpoint file, so an interrupted import resumes where it stopped. A create
+        that failed may still have been applied, so before a row is retried its
+        account and date are scanned again, and it is not created again if a
+        matching transaction has appeared.
+
+        :param path: the file, with the columns described in read_transaction_rows().
+        :param account_id: the account of rows without an account_id.
+        :param category_id: the category of rows without a category_id.
+        :param update_balance: update the account balances with the transactions.
+        :param checkpoint_path: the checkpoint file, defaults to one named after `path`
+          in DEFAULT_IMPORT_CHECKPOINT_DIR. Ignored if `bulk` has a results_path.
+        :param bulk: the BulkOperation that creates the transactions; defaults to
+          BulkOperation(idempotent=True), as rows are checked again before a retry.
+        """
+        defaults = {"account_id": account_id, "category_id": category_id}
+        account_ids = set()
+        start_date = end_date = None
+        for row in read_transaction_rows(path):
+            row = {**defaults, **row}
+            if not all(row.get(name) for name in defaults) or not (
+                row.get("date") and row.get("amount") is not None
+            ):
+                raise Exception(
+                    f"Row {row} needs a date, amount, account_id and category_id"
+                )
+            account_ids.add(row["account_id"])
+            start_date = min(start_date or row["date"], row["date"])
+            end_date = max(end_date or row["date"], row["date"])
+
+        existing: Counter = Counter()
+        if account_ids:
+            existing = await self._count_transaction_hashes(
+                sorted(account_ids), start_date, end_date
+            )
+
+        if bulk is None:
+            bulk = BulkOperation(idempotent=True)
+        if bulk.results_path is None:
+            bulk.results_path = checkpoint_path or os.path.join(
+                DEFAULT_IMPORT_CHECKPOINT_DIR, f"{os.path.basename(path)}.jsonl"
+            )
+
+        # Rows created by a previous run are in the scan too, so only the matches
+        # they do not account for make the other identical rows duplicates
+        resumed_keys = set(bulk.load_results())
+        unaccounted = existing.copy()
+        unaccounted.subtract(key.split(":")[0] for key in resumed_keys)
+
+        rows = []
+        seen: Counter = Counter()
+        matched: Counter = Counter()
+        duplicates = 0
+        for row in read_transaction_rows(path):
+            row = {**defaults, **row}
+            row_hash = get_transaction_hash(
+                row["account_id"], row["date"], row["amount"], row.get("merchant_name")
+            )
+            seen[row_hash] += 1
+            key = f"{row_hash}:{seen[row_hash]}"
+            if key not in resumed_keys and matched[row_hash] < unaccounted[row_hash]:
+                matched[row_hash] += 1
+                duplicates += 1
+            else:
+                rows.append((key, row))
+
+        # The rows attempted, and the transactions created by this run, by hash
+        attempted = set()
+        created: Counter = Counter()
+
+        async def create(item: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+            key, row = item
+            row_hash = key.split(":")[0]
+            if key in attempted:
+                # A failed attempt may have been applied: any match on the server not
+                # accounted for by the scan or this run's creates is taken as this row
+                found = await self._count_transaction_hashes(
+                    [row["account_id"]], row["date"], row["date"]
+                )
+                if found[row_hash] > existing[row_hash] + created[row_hash]:
+                    created[row_hash] += 1
+                    return {"errors": None, "transaction": None}
+            attempted.add(key)
+            response = await self.create_transaction(
+                date=row["date"],
+                account_id=row["account_id"],
+                amount=float(row["amount"]),
+                merchant_name=row.get("merchant_name", ""),
+                category_id=row["category_id"],
+                notes=row.get("notes", ""),
+                update_balance=update_balance,
+            )
+            payload = self._raise_for_payload(response["createTransaction"])
+            created[row_hash] += 1
+            return payload
+
+        outcomes = await bulk.run(create, rows, key=lambda item: item[0])
+        return ImportResult(outcomes=outcomes, duplicates=duplicates)
+
+    async def _count_transaction_hashes(
+        self, account_ids: List[str], start_date: str, end_date: str
+    ) -> Counter:
+        """
+        Counts the transactions of the accounts between the dates (inclusive) by
+        get_transaction_hash(), with one keyset scan.
+        """
+        hashes: Counter = Counter()
+        async for transaction in self.iter_transactions(
+            limit=DEFAULT_IMPORT_SCAN_LIMIT,
+            pagination="keyset",
+            fields="sync",
+            account_ids=account_ids,
+            start_date=start_date,
+            end_date=end_date,
+        ):
+            hashes[
+                get_transaction_hash(
+                    transaction["account"]["id"],
+                    transaction["date"],
+                    transaction["amount"],
+                    (transaction["merchant"] or {}).get("name"),
+                )
+            ] += 1
+        return hashes
+
     async def delete_transaction(self, transaction_id: str) -> bool:
         """
         Deletes the given transaction.
 
         :param transaction_id: the ID of the transaction targeted for deletion.
         """
-        query = gql(
+        query = parse_query(
             """
           mutation Common_DeleteTransactionMutation($input: DeleteTransactionMutationInput!) {
             deleteTransaction(input: $input) {
@@ -1661,11 +2768,87 @@ class MonarchMoney(object):
 
         return True
 
+    async def delete_transactions_bulk(
+        self,
+        transaction_ids: List[str],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    ) -> Dict[str, Union[bool, BaseException]]:
+        """
+        Deletes many transactions, sending `batch_size` deletes per request.
+
+        Returns a dict of transaction id to True if it was deleted, or to the
+        exception if it was not.
+
+        :param transaction_ids: the IDs of the transactions targeted for deletion.
+        :param batch_size: the number of transactions deleted per request.
+        :param max_concurrency: the maximum number of requests sent at once.
+        """
+        selection = """{
+            deleted
+            errors {
+              ...PayloadErrorFields
+              __typename
+            }
+            __typename
+          }
+        """
+        fragments = """
+          fragment PayloadErrorFields on PayloadError {
+            fieldErrors {
+              field
+              messages
+              __typename
+            }
+            message
+            code
+            __typename
+          }
+        """
+        transaction_ids = list(dict.fromkeys(transaction_ids))
+        results = await self._gql_call_batched(
+            operation="Common_DeleteTransactionMutationBatch",
+            field="deleteTransaction",
+            item_arguments={"input": "DeleteTransactionMutationInput!"},
+            selection=selection,
+            items=[
+                {"input": {"transactionId": transaction_id}}
+                for transaction_id in transaction_ids
+            ],
+            fragments=fragments,
+            operation_type="mutation",
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+        )
+        deleted: Dict[str, Union[bool, BaseException]] = {}
+        for transaction_id, result in zip(transaction_ids, results):
+            result = self._check_payload(result, "deleted")
+            deleted[transaction_id] = (
+                result if isinstance(result, BaseException) else True
+            )
+        return deleted
+
+    async def delete_transactions(
+        self, transaction_ids: List[str], bulk: Optional[BulkOperation] = None
+    ) -> Dict[str, BulkOutcome]:
+        """
+        Deletes many transactions, one request each, with per-transaction retries.
+        Unlike delete_transactions_bulk, which packs many deletes into each request,
+        an interrupted run can be resumed from the bulk operation's results file.
+
+        Returns a dict of transaction id to its BulkOutcome.
+
+        :param transaction_ids: the IDs of the transactions targeted for deletion.
+        :param bulk: the BulkOperation that runs the calls, for its concurrency, retries,
+          progress callback and results file; defaults to BulkOperation().
+        """
+        return await self._run_bulk(self.delete_transaction, transaction_ids, str, bulk)
+
     async def get_transaction_categories(self) -> Dict[str, Any]:
         """
         Gets all the categories configured in the account.
         """
-        query = gql(
+        query = parse_query(
             """
           query GetCategories {
             categories {
@@ -1696,7 +2879,7 @@ class MonarchMoney(object):
         return await self.gql_call(operation="GetCategories", graphql_query=query)
 
     async def delete_transaction_category(self, category_id: str) -> bool:
-        query = gql(
+        query = parse_query(
             """
           mutation Web_DeleteCategory($id: UUID!, $moveToCategoryId: UUID) {
             deleteCategory(id: $id, moveToCategoryId: $moveToCategoryId) {
@@ -1736,21 +2919,29 @@ class MonarchMoney(object):
         return True
 
     async def delete_transaction_categories(
-        self, category_ids: List[str]
+        self, category_ids: List[str], bulk: Optional[BulkOperation] = None
     ) -> List[Union[bool, BaseException]]:
         """
         Deletes a list of transaction categories.
+
+        Returns True or the exception raised for each category, in order.
+
+        :param bulk: the BulkOperation that runs the calls, for its concurrency, retries,
+          progress callback and results file; defaults to BulkOperation().
         """
-        return await asyncio.gather(
-            *[self.delete_transaction_category(id) for id in category_ids],
-            return_exceptions=True,
+        outcomes = await self._run_bulk(
+            self.delete_transaction_category, category_ids, str, bulk
         )
+        return [
+            self._get_outcome_result(outcomes.get(category_id))
+            for category_id in category_ids
+        ]
 
     async def get_transaction_category_groups(self) -> Dict[str, Any]:
         """
         Gets all the category groups configured in the account.
         """
-        query = gql(
+        query = parse_query(
             """
           query ManageGetCategoryGroups {
               categoryGroups {
@@ -1788,7 +2979,7 @@ class MonarchMoney(object):
         :param rollover_type: The budget roll over type
         """
 
-        query = gql(
+        query = parse_query(
             """
             mutation Web_CreateCategory($input: CreateCategoryInput!) {
                 createCategory(input: $input) {
@@ -1856,6 +3047,34 @@ class MonarchMoney(object):
             variables=variables,
         )
 
+    async def create_transaction_categories(
+        self,
+        categories: List[Dict[str, Any]],
+        bulk: Optional[BulkOperation] = None,
+    ) -> Dict[str, BulkOutcome]:
+        """
+        Creates many transaction categories.
+
+        Returns a dict of "<group_id>:<transaction_category_name>" to the BulkOutcome
+        of that category, whose result is the createCategory payload.
+
+        :param categories: the arguments of create_transaction_category for each category,
+          e.g. [{"group_id": "...", "transaction_category_name": "Coffee"}, ...].
+        :param bulk: the BulkOperation that runs the calls, for its concurrency, retries,
+          progress callback and results file; defaults to BulkOperation().
+        """
+
+        async def create(category: Dict[str, Any]) -> Dict[str, Any]:
+            response = await self.create_transaction_category(**category)
+            return self._raise_for_payload(response["createCategory"])
+
+        return await self._run_bulk(
+            create,
+            categories,
+            lambda c: f"{c['group_id']}:{c['transaction_category_name']}",
+            bulk,
+        )
+
     async def create_transaction_tag(self, name: str, color: str) -> Dict[str, Any]:
         """
         Creates a new transaction tag.
@@ -1866,7 +3085,7 @@ class MonarchMoney(object):
           More information can be found https://en.wikipedia.org/wiki/Web_colors#Hex_triplet.
           Does not appear to be limited to the color selections in the dashboard.
         """
-        mutation = gql(
+        mutation = parse_query(
             """
             mutation Common_CreateTransactionTag($input: CreateTransactionTagInput!) {
               createTransactionTag(input: $input) {
@@ -1895,11 +3114,31 @@ class MonarchMoney(object):
             variables=variables,
         )
 
+    async def create_transaction_tags(
+        self, tags: List[Dict[str, str]], bulk: Optional[BulkOperation] = None
+    ) -> Dict[str, BulkOutcome]:
+        """
+        Creates many transaction tags.
+
+        Returns a dict of tag name to the BulkOutcome of that tag, whose result is
+        the createTransactionTag payload.
+
+        :param tags: the name and color of each tag, e.g. [{"name": "Trip", "color": "#19D2A5"}].
+        :param bulk: the BulkOperation that runs the calls, for its concurrency, retries,
+          progress callback and results file; defaults to BulkOperation().
+        """
+
+        async def create(tag: Dict[str, str]) -> Dict[str, Any]:
+            response = await self.create_transaction_tag(tag["name"], tag["color"])
+            return self._raise_for_payload(response["createTransactionTag"])
+
+        return await self._run_bulk(create, tags, lambda t: t["name"], bulk)
+
     async def get_transaction_tags(self) -> Dict[str, Any]:
         """
         Gets all the tags configured in the account.
         """
-        query = gql(
+        query = parse_query(
             """
           query GetHouseholdTransactionTags($search: String, $limit: Int, $bulkParams: BulkTransactionDataParams) {
             householdTransactionTags(
@@ -1933,7 +3172,7 @@ class MonarchMoney(object):
           Overwrites existing tags. Empty list removes all tags.
         """
 
-        query = gql(
+        query = parse_query(
             """
           mutation Web_SetTransactionTags($input: SetTransactionTagsInput!) {
             setTransactionTags(input: $input) {
@@ -1976,6 +3215,76 @@ class MonarchMoney(object):
             variables=variables,
         )
 
+    async def set_transaction_tags_bulk(
+        self,
+        tags_by_transaction: Dict[str, List[str]],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    ) -> Dict[str, Union[Dict[str, Any], BaseException]]:
+        """
+        Sets the tags on many transactions, sending `batch_size` changes per request.
+
+        Returns a dict of transaction id to its `setTransactionTags` payload, or to
+        the exception if setting its tags failed.
+
+        :param tags_by_transaction: the list of tag ids to set, by transaction id.
+          Overwrites existing tags. Empty list removes all tags.
+        :param batch_size: the number of transactions changed per request.
+        :param max_concurrency: the maximum number of requests sent at once.
+        """
+        selection = """{
+            errors {
+              ...PayloadErrorFields
+              __typename
+            }
+            transaction {
+              id
+              tags {
+                id
+                __typename
+              }
+              __typename
+            }
+            __typename
+          }
+        """
+        fragments = """
+          fragment PayloadErrorFields on PayloadError {
+            fieldErrors {
+              field
+              messages
+              __typename
+            }
+            message
+            code
+            __typename
+          }
+        """
+        transaction_ids = list(tags_by_transaction)
+        results = await self._gql_call_batched(
+            operation="Web_SetTransactionTagsBatch",
+            field="setTransactionTags",
+            item_arguments={"input": "SetTransactionTagsInput!"},
+            selection=selection,
+            items=[
+                {
+                    "input": {
+                        "transactionId": transaction_id,
+                        "tagIds": tags_by_transaction[transaction_id],
+                    }
+                }
+                for transaction_id in transaction_ids
+            ],
+            fragments=fragments,
+            operation_type="mutation",
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
+        )
+        return {
+            transaction_id: self._check_payload(result)
+            for transaction_id, result in zip(transaction_ids, results)
+        }
+
     async def get_transaction_details(
         self, transaction_id: str, redirect_posted: bool = True
     ) -> Dict[str, Any]:
@@ -1985,7 +3294,7 @@ class MonarchMoney(object):
         :param transaction_id: the transaction to fetch.
         :param redirect_posted: whether to redirect posted transactions. Defaults to True.
         """
-        query = gql(
+        query = parse_query(
             """
           query GetTransactionDrawer($id: UUID!, $redirectPosted: Boolean) {
             getTransaction(id: $id, redirectPosted: $redirectPosted) {
@@ -2132,7 +3441,7 @@ class MonarchMoney(object):
 
         :param transaction_id: the transaction to query.
         """
-        query = gql(
+        query = parse_query(
             """
           query TransactionSplitQuery($id: UUID!) {
             getTransaction(id: $id) {
@@ -2169,12 +3478,222 @@ class MonarchMoney(object):
           }
         """
         )
-
-        variables = {"id": transaction_id}
-
-        return await self.gql_call(
-            operation="TransactionSplitQuery", variables=variables, graphql_query=query
-        )
+
+        variables = {"id": transaction_id}
+
+        return await self.gql_call(
+            operation="TransactionSplitQuery", variables=variables, graphql_query=query
+        )
+
+    async def get_transaction_details_many(
+        self,
+        transaction_ids: List[str],
+        redirect_posted: bool = True,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> Dict[str, Union[Dict[str, Any], BaseException]]:
+        """
+        Returns detailed information about many transactions, fetching
+        `batch_size` transactions per request.
+
+        Returns a dict of transaction id to the transaction, as returned under
+        `getTransaction` by get_transaction_details, or to the exception raised
+        for that transaction.
+
+        :param transaction_ids: the transactions to fetch.
+        :param redirect_posted: whether to redirect posted transactions. Defaults to True.
+        :param batch_size: the number of transactions fetched per request.
+        """
+        selection = """{
+            id
+            amount
+            pending
+            isRecurring
+            date
+            originalDate
+            hideFromReports
+            needsReview
+            reviewedAt
+            reviewedByUser {
+              id
+              name
+              __typename
+            }
+            plaidName
+            notes
+            hasSplitTransactions
+            isSplitTransaction
+            isManual
+            splitTransactions {
+              id
+              ...TransactionDrawerSplitMessageFields
+              __typename
+            }
+            originalTransaction {
+              id
+              ...OriginalTransactionFields
+              __typename
+            }
+            attachments {
+              id
+              publicId
+              extension
+              sizeBytes
+              filename
+              originalAssetUrl
+              __typename
+            }
+            account {
+              id
+              ...TransactionDrawerAccountSectionFields
+              __typename
+            }
+            category {
+              id
+              __typename
+            }
+            goal {
+              id
+              __typename
+            }
+            merchant {
+              id
+              name
+              transactionCount
+              logoUrl
+              recurringTransactionStream {
+                id
+                __typename
+              }
+              __typename
+            }
+            tags {
+              id
+              name
+              color
+              order
+              __typename
+            }
+            needsReviewByUser {
+              id
+              __typename
+            }
+            __typename
+          }
+        """
+        fragments = """
+          fragment TransactionDrawerSplitMessageFields on Transaction {
+            id
+            amount
+            merchant {
+              id
+              name
+              __typename
+            }
+            category {
+              id
+              name
+              __typename
+            }
+            __typename
+          }
+
+          fragment OriginalTransactionFields on Transaction {
+            id
+            date
+            amount
+            merchant {
+              id
+              name
+              __typename
+            }
+            __typename
+          }
+
+          fragment TransactionDrawerAccountSectionFields on Account {
+            id
+            displayName
+            logoUrl
+            id
+            mask
+            subtype {
+              display
+              __typename
+            }
+            __typename
+          }
+        """
+        transaction_ids = list(dict.fromkeys(transaction_ids))
+        results = await self._gql_call_batched(
+            operation="GetTransactionDrawerBatch",
+            field="getTransaction",
+            item_arguments={"id": "UUID!"},
+            selection=selection,
+            items=[{"id": transaction_id} for transaction_id in transaction_ids],
+            shared_arguments={"redirectPosted": "Boolean"},
+            shared_variables={"redirectPosted": redirect_posted},
+            fragments=fragments,
+            batch_size=batch_size,
+        )
+        return dict(zip(transaction_ids, results))
+
+    async def get_transaction_splits_many(
+        self,
+        transaction_ids: List[str],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> Dict[str, Union[Dict[str, Any], BaseException]]:
+        """
+        Returns the transaction split information for many transactions,
+        fetching `batch_size` transactions per request.
+
+        Returns a dict of transaction id to the transaction, as returned under
+        `getTransaction` by get_transaction_splits, or to the exception raised
+        for that transaction.
+
+        :param transaction_ids: the transactions to query.
+        :param batch_size: the number of transactions fetched per request.
+        """
+        selection = """{
+            id
+            amount
+            category {
+              id
+              name
+              __typename
+            }
+            merchant {
+              id
+              name
+              __typename
+            }
+            splitTransactions {
+              id
+              merchant {
+                id
+                name
+                __typename
+              }
+              category {
+                id
+                name
+                __typename
+              }
+              amount
+              notes
+              __typename
+            }
+            __typename
+          }
+        """
+        transaction_ids = list(dict.fromkeys(transaction_ids))
+        results = await self._gql_call_batched(
+            operation="TransactionSplitQueryBatch",
+            field="getTransaction",
+            item_arguments={"id": "UUID!"},
+            selection=selection,
+            items=[{"id": transaction_id} for transaction_id in transaction_ids],
+            batch_size=batch_size,
+        )
+        return dict(zip(transaction_ids, results))
 
     async def update_transaction_splits(
         self, transaction_id: str, split_data: List[Dict[str, Any]]
@@ -2191,7 +3710,7 @@ class MonarchMoney(object):
           split_data takes the shape: [{"merchantName": "...", "amount": -12.34, "categoryId": "231"}, split2, split3, ...]
           sum([split.amount for split in split_data]) must equal transaction_id.amount.
         """
-        query = gql(
+        query = parse_query(
             """
           mutation Common_SplitTransactionMutation($input: UpdateTransactionSplitMutationInput!) {
             updateTransactionSplit(input: $input) {
@@ -2250,6 +3769,32 @@ class MonarchMoney(object):
             graphql_query=query,
         )
 
+    async def update_transaction_splits_many(
+        self,
+        splits: Dict[str, List[Dict[str, Any]]],
+        bulk: Optional[BulkOperation] = None,
+    ) -> Dict[str, BulkOutcome]:
+        """
+        Replaces the splits of many transactions.
+
+        Returns a dict of transaction id to the BulkOutcome of that transaction,
+        whose result is the updateTransactionSplit payload.
+
+        :param splits: the split data of each transaction id, as taken by
+          update_transaction_splits.
+        :param bulk: the BulkOperation that runs the calls, for its concurrency, retries,
+          progress callback and results file; defaults to BulkOperation(idempotent=True),
+          as replacing splits can be repeated.
+        """
+
+        async def update(transaction_id: str) -> Dict[str, Any]:
+            response = await self.update_transaction_splits(
+                transaction_id, splits[transaction_id]
+            )
+            return self._raise_for_payload(response["updateTransactionSplit"])
+
+        return await self._run_bulk(update, list(splits), str, bulk, idempotent=True)
+
     async def get_cashflow(
         self,
         limit: int = DEFAULT_RECORD_LIMIT,
@@ -2259,7 +3804,7 @@ class MonarchMoney(object):
         """
         Gets all the categories configured in the account.
         """
-        query = gql(
+        query = parse_query(
             """
           query Web_GetCashFlowPage($filters: TransactionFilterInput) {
             byCategory: aggregates(filters: $filters, groupBy: ["category"]) {
@@ -2355,6 +3900,37 @@ class MonarchMoney(object):
             operation="Web_GetCashFlowPage", variables=variables, graphql_query=query
         )
 
+    async def get_cashflow_sharded(
+        self,
+        limit: int = DEFAULT_RECORD_LIMIT,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        months_per_shard: int = 1,
+        max_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    ) -> Dict[str, Any]:
+        """
+        Same as get_cashflow, but fetches the range in shards of `months_per_shard`
+        months, up to `max_concurrency` at once, and adds their aggregates back
+        into one response. Each shard is retried on its own.
+
+        :param months_per_shard: the number of months fetched per request.
+        :param max_concurrency: the maximum number of shards requested at once.
+        """
+        if not start_date and not end_date:
+            start_date = self._get_start_of_current_month()
+            end_date = self._get_end_of_current_month()
+        elif bool(start_date) != bool(end_date):
+            raise Exception(
+                "You must specify both a startDate and endDate, not just one of them."
+            )
+
+        shards = await self._gather_shards(
+            partial(self.get_cashflow, limit),
+            get_month_ranges(start_date, end_date, months_per_shard),
+            max_concurrency,
+        )
+        return self._merge_cashflow_shards(shards)
+
     async def get_cashflow_summary(
         self,
         limit: int = DEFAULT_RECORD_LIMIT,
@@ -2364,7 +3940,7 @@ class MonarchMoney(object):
         """
         Gets all the categories configured in the account.
         """
-        query = gql(
+        query = parse_query(
             """
           query Web_GetCashFlowPage($filters: TransactionFilterInput) {
             summary: aggregates(filters: $filters, fillEmptyValues: true) {
@@ -2473,7 +4049,7 @@ class MonarchMoney(object):
                 notes=f'Updated On: {datetime.now().strftime("%m/%d/%Y %H:%M:%S")}',
             )
         """
-        query = gql(
+        query = parse_query(
             """
         mutation Web_TransactionDrawerUpdateTransaction($input: UpdateTransactionMutationInput!) {
             updateTransaction(input: $input) {
@@ -2529,45 +4105,158 @@ class MonarchMoney(object):
         """
         )
 
-        variables: dict[str, Any] = {
-            "input": {
-                "id": transaction_id,
-            }
+        variables = {
+            "input": self._get_update_transaction_input(
+                transaction_id=transaction_id,
+                category_id=category_id,
+                merchant_name=merchant_name,
+                goal_id=goal_id,
+                amount=amount,
+                date=date,
+                hide_from_reports=hide_from_reports,
+                needs_review=needs_review,
+                notes=notes,
+            )
+        }
+
+        return await self.gql_call(
+            operation="Web_TransactionDrawerUpdateTransaction",
+            variables=variables,
+            graphql_query=query,
+        )
+
+    def _get_update_transaction_input(
+        self,
+        transaction_id: str,
+        category_id: Optional[str] = None,
+        merchant_name: Optional[str] = None,
+        goal_id: Optional[str] = None,
+        amount: Optional[float] = None,
+        date: Optional[str] = None,
+        hide_from_reports: Optional[bool] = None,
+        needs_review: Optional[bool] = None,
+        notes: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Returns the UpdateTransactionMutationInput for the parameters of update_transaction.
+        """
+        transaction_input: Dict[str, Any] = {
+            "id": transaction_id,
         }
 
         # Within Monarch, these values cannot be empty. Monarch will simply ignore updates
         # to category and merchant name that are empty strings or None.
         # As such, no need to avoid adding to variables
-        variables["input"].update({"category": category_id})
-        variables["input"].update({"name": merchant_name})
+        transaction_input.update({"category": category_id})
+        transaction_input.update({"name": merchant_name})
 
         # Monarch will not accept nulls for amount and date.
         # Don't update values if an empty string is passed or if parameter is None
         if amount:
-            variables["input"].update({"amount": amount})
+            transaction_input.update({"amount": amount})
         if date:
-            variables["input"].update({"date": date})
+            transaction_input.update({"date": date})
 
         # Don't update values if the parameter is not passed or explicitly set to None.
         # Passed values must be cast to bool to avoid API errors
         if hide_from_reports is not None:
-            variables["input"].update({"hideFromReports": bool(hide_from_reports)})
+            transaction_input.update({"hideFromReports": bool(hide_from_reports)})
         if needs_review is not None:
-            variables["input"].update({"needsReview": bool(needs_review)})
+            transaction_input.update({"needsReview": bool(needs_review)})
 
         # We want an empty string to clear the goal and notes parameters but the values should not
         # be cleared if the parameter isn't passed
         # Don't update values if the parameter is not passed or explicitly set to None.
         if goal_id is not None:
-            variables["input"].update({"goalId": goal_id})
+            transaction_input.update({"goalId": goal_id})
         if notes is not None:
-            variables["input"].update({"notes": notes})
+            transaction_input.update({"notes": notes})
 
-        return await self.gql_call(
-            operation="Web_TransactionDrawerUpdateTransaction",
-            variables=variables,
-            graphql_query=query,
+        return transaction_input
+
+    async def update_transactions_bulk(
+        self,
+        changes: List[Dict[str, Any]],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+    ) -> List[Union[Dict[str, Any], BaseException]]:
+        """
+        Updates many transactions, sending `batch_size` updates per request.
+
+        Returns, in the order of `changes`, the `updateTransaction` payload of each
+        update, or the exception for the updates that failed.
+
+        :param changes: the updates to make, each a dict of update_transaction
+          parameters, e.g. [{"transaction_id": "123", "category_id": "456"}, ...].
+        :param batch_size: the number of updates sent per request.
+        :param max_concurrency: the maximum number of requests sent at once.
+        """
+        selection = """{
+            transaction {
+              id
+              amount
+              pending
+              date
+              hideFromReports
+              needsReview
+              reviewedAt
+              reviewedByUser {
+                id
+                name
+                __typename
+              }
+              plaidName
+              notes
+              isRecurring
+              category {
+                id
+                __typename
+              }
+              goal {
+                id
+                __typename
+              }
+              merchant {
+                id
+                name
+                __typename
+              }
+              __typename
+            }
+            errors {
+              ...PayloadErrorFields
+              __typename
+            }
+            __typename
+          }
+        """
+        fragments = """
+          fragment PayloadErrorFields on PayloadError {
+            fieldErrors {
+              field
+              messages
+              __typename
+            }
+            message
+            code
+            __typename
+          }
+        """
+        results = await self._gql_call_batched(
+            operation="Web_TransactionDrawerUpdateTransactionBatch",
+            field="updateTransaction",
+            item_arguments={"input": "UpdateTransactionMutationInput!"},
+            selection=selection,
+            items=[
+                {"input": self._get_update_transaction_input(**change)}
+                for change in changes
+            ],
+            fragments=fragments,
+            operation_type="mutation",
+            batch_size=batch_size,
+            max_concurrency=max_concurrency,
         )
+        return [self._check_payload(result) for result in results]
 
     async def set_budget_amount(
         self,
@@ -2604,7 +4293,7 @@ class MonarchMoney(object):
                 "You must specify either a category_id OR category_group_id; not both"
             )
 
-        query = gql(
+        query = parse_query(
             """
           mutation Common_UpdateBudgetItem($input: UpdateOrCreateBudgetItemMutationInput!) {
             updateOrCreateBudgetItem(input: $input) {
@@ -2639,6 +4328,39 @@ class MonarchMoney(object):
             graphql_query=query,
         )
 
+    async def set_budget_amounts(
+        self,
+        budget_amounts: List[Dict[str, Any]],
+        bulk: Optional[BulkOperation] = None,
+    ) -> Dict[str, BulkOutcome]:
+        """
+        Sets many budget amounts, e.g. to provision a budget for every category and month.
+
+        Returns a dict of "<category or group id>:<start_date>" to the BulkOutcome
+        of that budget cell, whose result is the updateOrCreateBudgetItem payload.
+
+        :param budget_amounts: the arguments of set_budget_amount for each budget cell,
+          e.g. [{"amount": 100, "category_id": "...", "start_date": "2024-01-01"}, ...].
+        :param bulk: the BulkOperation that runs the calls, for its concurrency, retries,
+          progress callback and results file; defaults to BulkOperation(idempotent=True),
+          as setting an amount can be repeated.
+        """
+
+        async def update(budget_amount: Dict[str, Any]) -> Dict[str, Any]:
+            response = await self.set_budget_amount(**budget_amount)
+            return self._raise_for_payload(response["updateOrCreateBudgetItem"])
+
+        return await self._run_bulk(
+            update,
+            budget_amounts,
+            lambda b: "{}:{}".format(
+                b.get("category_id") or b.get("category_group_id"),
+                b.get("start_date") or self._get_start_of_current_month(),
+            ),
+            bulk,
+            idempotent=True,
+        )
+
     async def upload_account_balance_history(
         self, account_id: str, csv_content: str
     ) -> None:
@@ -2651,18 +4373,103 @@ class MonarchMoney(object):
         if not account_id or not csv_content:
             raise RequestFailedException("account_id and csv_content cannot be empty")
 
+        async with self._post(
+            MonarchMoneyEndpoints.getAccountBalanceHistoryUploadEndpoint(),
+            data=self._get_balance_history_form(account_id, csv_content),
+        ) as resp:
+            if resp.status != 200:
+                raise RequestFailedException(f"HTTP Code {resp.status}: {resp.reason}")
+
+    async def upload_account_balance_histories(
+        self,
+        histories: Dict[str, BalanceHistorySource],
+        chunk_size: int = DEFAULT_BALANCE_HISTORY_CHUNK_SIZE,
+        state_path: Optional[str] = DEFAULT_BALANCE_HISTORY_STATE_FILE,
+        bulk: Optional[BulkOperation] = None,
+    ) -> Dict[str, BulkOutcome]:
+        """
+        Uploads the balance history of many accounts, `chunk_size` rows per request,
+        sending the chunks concurrently (and retrying them on their own) through a
+        BulkOperation.
+
+        The latest date uploaded for each account is kept in `state_path`, and only
+        rows dated after it are sent, so keeping histories current only uploads the
+        new days. An account's date only advances once all of its chunks succeeded.
+        Chunks are keyed by their dates, so with a `bulk` results_path, a chunk is
+        only skipped if the same rows were uploaded before. Each upload goes through
+        the rate limiter, like GraphQL calls.
+
+        Returns a dict of "<account_id>:<first date>:<last date>" to the BulkOutcome
+        of that chunk, whose result is its number of rows.
+
+        :param histories: the balance history CSV of each account id, as a path or
+          a file object, with a header row and a "date" (or first) column.
+        :param chunk_size: the number of rows uploaded per request.
+        :param state_path: the JSON file the latest uploaded dates are kept in, or
+          None to upload every row.
+        :param bulk: the BulkOperation that uploads the chunks; defaults to
+          BulkOperation(idempotent=True), as a chunk's rows can be uploaded again.
+        """
+        state = BalanceHistoryState(state_path) if state_path else None
+        chunks = []
+        last_dates = {}
+        for account_id, source in histories.items():
+            header, rows, last_date = read_balance_history(
+                source, state.get(account_id) if state else None
+            )
+            for content, count, first_date, chunk_last_date in chunk_balance_history(
+                header, rows, chunk_size
+            ):
+                key = f"{account_id}:{first_date}:{chunk_last_date}"
+                chunks.append((key, str(account_id), content, count))
+            if last_date is not None:
+                last_dates[str(account_id)] = last_date
+
+        url = MonarchMoneyEndpoints.getAccountBalanceHistoryUploadEndpoint()
+        operation = urlparse(url).path
+
+        async def upload(chunk: Tuple[str, str, str, int]) -> int:
+            _, account_id, content, count = chunk
+            started_at = await self._rate_limiter.acquire()
+            try:
+                async with self._post(
+                    url, data=self._get_balance_history_form(account_id, content)
+                ) as resp:
+                    if resp.status != 200:
+                        from .transport import HTTPResponseError
+
+                        # Uploads can be repeated, so server errors may be retried
+                        raise HTTPResponseError(
+                            f"HTTP Code {resp.status}: {resp.reason}",
+                            resp.status,
+                            parse_retry_after(resp.headers.get("Retry-After")),
+                        )
+            except BaseException as e:
+                self._rate_limiter.release(started_at, operation, e)
+                raise
+            self._rate_limiter.release(started_at, operation)
+            return count
+
+        outcomes = await self._run_bulk(
+            upload, chunks, lambda chunk: chunk[0], bulk, idempotent=True
+        )
+
+        if state is not None:
+            for account_id, last_date in last_dates.items():
+                keys = [chunk[0] for chunk in chunks if chunk[1] == account_id]
+                if all(key in outcomes and outcomes[key].ok for key in keys):
+                    state.set(account_id, last_date)
+        return outcomes
+
+    @staticmethod
+    def _get_balance_history_form(account_id: str, csv_content: str) -> FormData:
+        from aiohttp import FormData
+
         filename = "upload.csv"
         form = FormData()
         form.add_field("files", csv_content, filename=filename, content_type="text/csv")
         form.add_field("account_files_mapping", json.dumps({filename: account_id}))
-
-        async with ClientSession(headers=self._headers) as session:
-            resp = await session.post(
-                MonarchMoneyEndpoints.getAccountBalanceHistoryUploadEndpoint(),
-                data=form,
-            )
-            if resp.status != 200:
-                raise RequestFailedException(f"HTTP Code {resp.status}: {resp.reason}")
+        return form
 
     async def get_recurring_transactions(
         self,
@@ -2673,7 +4480,7 @@ class MonarchMoney(object):
         Fetches upcoming recurring transactions from Monarch Money's API.  This includes
         all merchant data, as well as the accounts where the charge will take place.
         """
-        query = gql(
+        query = parse_query(
             """
             query Web_GetUpcomingRecurringTransactionItems($startDate: Date!, $endDate: Date!, $filters: RecurringTransactionFilter) {
               recurringTransactionItems(
@@ -2736,6 +4543,36 @@ class MonarchMoney(object):
         """
         return datetime.now().strftime("%Y-%m-%d")
 
+    def _get_default_budget_range(self) -> Tuple[str, str]:
+        """
+        Returns the first day of last month and the last day of next month as
+        strings formatted as %Y-%m-%d.
+        """
+        today = datetime.today()
+
+        # Get the first day of last month
+        last_month = today.month - 1
+        last_month_year = today.year
+        first_day_of_last_month = 1
+        if last_month < 1:
+            last_month_year -= 1
+            last_month = 12
+        start_date = datetime(
+            last_month_year, last_month, first_day_of_last_month
+        ).strftime("%Y-%m-%d")
+
+        # Get the last day of next month
+        next_month = today.month + 1
+        next_month_year = today.year
+        if next_month > 12:
+            next_month_year += 1
+            next_month = 1
+        last_day_of_next_month = calendar.monthrange(next_month_year, next_month)[1]
+        end_date = datetime(
+            next_month_year, next_month, last_day_of_next_month
+        ).strftime("%Y-%m-%d")
+        return start_date, end_date
+
     def _get_start_of_current_month(self) -> str:
         """
         Returns the date for the first day of the current month as a string formatted as %Y-%m-%d.
@@ -2761,10 +4598,527 @@ class MonarchMoney(object):
     ) -> Dict[str, Any]:
         """
         Makes a GraphQL call to Monarch Money's API.
+
+        Calls wait for the client's rate limiter, and transient failures are
+        retried according to the client's retry policy. If the client has a
+        cache, cached reference data is returned without a call, and mutations
+        drop the cached results they make stale. Concurrent identical queries
+        share one request, unless coalescing is disabled.
+
+        With a cassette, calls are recorded to it, or replayed from it offline.
+        """
+        cassette = self._cassette
+        if cassette is not None and cassette.is_replaying:
+            return cassette.play(operation, variables)
+        if cassette is None:
+            return await self._gql_call(operation, graphql_query, variables)
+
+        from gql.transport.exceptions import TransportQueryError
+
+        episode = cassette.start(operation, variables)
+        try:
+            result = await self._gql_call(operation, graphql_query, variables)
+        except TransportQueryError as e:
+            cassette.record(operation, variables, error=e, episode=episode)
+            raise
+        except BaseException:
+            cassette.discard(episode)
+            raise
+        cassette.record(operation, variables, result, episode=episode)
+        return result
+
+    async def _gql_call(
+        self,
+        operation: str,
+        graphql_query: DocumentNode,
+        variables: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        mutation = is_mutation(graphql_query)
+        cache = self._cache
+        if mutation:
+            try:
+                return await self._gql_call_with_retries(
+                    operation, graphql_query, variables, mutation
+                )
+            finally:
+                # A failed mutation may still have been applied
+                if cache is not None:
+                    cache.invalidate_for_mutation(operation)
+
+        if cache is not None:
+            result = cache.get(operation, variables)
+            if result is not None:
+                return result
+
+        if not self._coalesce_queries:
+            return await self._gql_query(operation, graphql_query, variables)
+
+        # Identical queries already in flight share their request. Documents are
+        # part of the key, as some operations are sent with different selections.
+        key = (operation, id(graphql_query), get_variables_digest(variables))
+        task = self._in_flight_queries.get(key)
+        leader = task is None
+        if leader:
+            task = asyncio.ensure_future(
+                self._gql_query(operation, graphql_query, variables)
+            )
+            self._in_flight_queries[key] = task
+            task.add_done_callback(partial(self._forget_in_flight_query, key))
+        else:
+            self._coalesced_counts[operation] += 1
+
+        self._in_flight_waiters[key] += 1
+        last = False
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            self._in_flight_waiters[key] -= 1
+            if not self._in_flight_waiters[key]:
+                del self._in_flight_waiters[key]
+                last = True
+                # Nobody is waiting for the request any more
+                if not task.done():
+                    task.cancel()
+        # Some callers modify their result, so each caller copies it as it resumes,
+        # before handing it over, except the last, which gets the original
+        return result if last else copy.deepcopy(result)
+
+    async def _gql_query(
+        self,
+        operation: str,
+        graphql_query: DocumentNode,
+        variables: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        result = await self._gql_call_with_retries(
+            operation, graphql_query, variables, mutation=False
+        )
+        if self._cache is not None:
+            self._cache.set(operation, variables, result)
+        return result
+
+    def _forget_in_flight_query(self, key: Tuple[str, int, str], task) -> None:
+        if self._in_flight_queries.get(key) is task:
+            del self._in_flight_queries[key]
+
+    async def _gql_call_with_retries(
+        self,
+        operation: str,
+        graphql_query: DocumentNode,
+        variables: Dict[str, Any],
+        mutation: bool,
+    ) -> Dict[str, Any]:
+        """
+        Calls Monarch Money's API through the rate limiter, retrying transient
+        failures according to the retry policy and hedging slow queries according
+        to the hedge policy, and reports the call to the instrumentation hooks.
+        """
+        policy = self._retry_policy
+        loop = asyncio.get_running_loop()
+        deadline = None if policy.deadline is None else loop.time() + policy.deadline
+        timer = CallTimer(operation, variables) if self._hooks else None
+        token = timer.install() if timer is not None else None
+        attempt = 0
+        error: Optional[BaseException] = None
+        hedged = (
+            not mutation
+            and self._hedge_policy is not None
+            and self._hedge_policy.is_hedged(operation)
+        )
+        try:
+            while True:
+                if timer is not None:
+                    timer.metrics.clear()
+                try:
+                    if hedged:
+                        return await self._gql_attempt_hedged(
+                            operation, graphql_query, variables, deadline
+                        )
+                    return await self._gql_attempt(
+                        operation, graphql_query, variables, deadline
+                    )
+                except Exception as e:
+                    if attempt >= policy.max_retries or not policy.is_retryable(
+                        e, mutation
+                    ):
+                        raise
+                    delay = policy.get_delay(attempt, e)
+                    if deadline is not None and loop.time() + delay >= deadline:
+                        raise
+                attempt += 1
+                self._retry_counts[operation] += 1
+                await asyncio.sleep(delay)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if timer is not None:
+                CALL_METRICS.reset(token)
+                self._call_hooks(timer.get_record(attempt, error))
+
+    async def _gql_attempt(
+        self,
+        operation: str,
+        graphql_query: DocumentNode,
+        variables: Dict[str, Any],
+        deadline: Optional[float],
+        sent: Optional[asyncio.Event] = None,
+    ) -> Dict[str, Any]:
+        """
+        Makes one request through the rate limiter, recording its outcome there.
+
+        :param sent: set once the request has its rate limiter slot and is sent.
         """
-        return await self._get_graphql_client().execute_async(
-            document=graphql_query, operation_name=operation, variable_values=variables
+        loop = asyncio.get_running_loop()
+        started_at = await self._rate_limiter.acquire()
+        if sent is not None:
+            sent.set()
+        call = self._get_graphql_client().execute_async(
+            document=graphql_query,
+            operation_name=operation,
+            variable_values=variables,
         )
+        try:
+            if deadline is None:
+                result = await call
+            else:
+                result = await asyncio.wait_for(call, max(0, deadline - loop.time()))
+        except BaseException as e:
+            self._rate_limiter.release(started_at, operation, e)
+            raise
+        self._rate_limiter.release(started_at, operation)
+        if self._hedge_policy is not None:
+            self._hedge_policy.observe(operation, loop.time() - started_at)
+        return result
+
+    async def _gql_attempt_hedged(
+        self,
+        operation: str,
+        graphql_query: DocumentNode,
+        variables: Dict[str, Any],
+        deadline: Optional[float],
+    ) -> Dict[str, Any]:
+        """
+        Makes one request, and duplicates it if it is slower than the hedge
+        policy's delay, returning the first successful response and cancelling
+        the other. Hedges go through the rate limiter like any other request.
+
+        The delay runs from when the first request is sent: time spent waiting
+        for the rate limiter is backpressure, not a slow response, and hedging
+        it would only add load to a saturated limiter.
+        """
+        outer_metrics = CALL_METRICS.get()
+
+        async def request(
+            sent: Optional[asyncio.Event] = None,
+        ) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+            # Each request runs in its own task, so reports to its own metrics
+            metrics = None
+            if outer_metrics is not None:
+                metrics = {}
+                CALL_METRICS.set(metrics)
+            result = await self._gql_attempt(
+                operation, graphql_query, variables, deadline, sent
+            )
+            return result, metrics
+
+        policy = self._hedge_policy
+        delay = policy.get_delay(operation)
+        sent = asyncio.Event()
+        pending = {asyncio.ensure_future(request(sent))}
+        hedges = 0
+        error: Optional[BaseException] = None
+        try:
+            if delay is not None:
+                sending = asyncio.ensure_future(sent.wait())
+                try:
+                    await asyncio.wait(
+                        pending | {sending}, return_when=asyncio.FIRST_COMPLETED
+                    )
+                finally:
+                    sending.cancel()
+            while pending:
+                timeout = delay if hedges < policy.max_hedges else None
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedges += 1
+                    self._hedge_counts[operation] += 1
+                    pending.add(asyncio.ensure_future(request()))
+                    continue
+                for task in done:
+                    if task.exception() is None:
+                        result, metrics = task.result()
+                        if metrics is not None:
+                            outer_metrics.update(metrics)
+                        return result
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _gql_call_batched(
+        self,
+        operation: str,
+        field: str,
+        item_arguments: Dict[str, str],
+        selection: str,
+        items: List[Dict[str, Any]],
+        shared_arguments: Dict[str, str] = {},
+        shared_variables: Dict[str, Any] = {},
+        fragments: str = "",
+        operation_type: str = "query",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_concurrency: int = DEFAULT_PAGE_CONCURRENCY,
+        split_failed_batches: bool = False,
+    ) -> List[Union[Any, BaseException]]:
+        """
+        Selects `field` once per item, batching `batch_size` items into each
+        request with build_batch_query(), and sending up to `max_concurrency`
+        requests at once.
+
+        Returns the result of each item in order: the data under its alias, or
+        the exception for that item if the server returned errors for it or the
+        whole request failed.
+
+        :param items: the variables of each item, keyed by the names in `item_arguments`.
+        :param split_failed_batches: if a whole batched request fails, request its
+          items one at a time instead, so one bad item only fails itself.
+        """
+        from gql.transport.exceptions import TransportQueryError
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def call_singly(batch: List[Dict[str, Any]]) -> List[Any]:
+            results = await asyncio.gather(*[call_batch([item]) for item in batch])
+            return [result for item_results in results for result in item_results]
+
+        async def call_batch(batch: List[Dict[str, Any]]) -> List[Any]:
+            query = parse_query(
+                build_batch_query(
+                    operation_type,
+                    operation,
+                    field,
+                    item_arguments,
+                    selection,
+                    len(batch),
+                    shared_arguments,
+                    fragments,
+                )
+            )
+            variables = dict(shared_variables)
+            for i, item in enumerate(batch):
+                variables.update({f"{name}{i}": value for name, value in item.items()})
+
+            errors: List[Dict[str, Any]] = []
+            try:
+                async with semaphore:
+                    data = await self.gql_call(operation, query, variables)
+            except TransportQueryError as e:
+                if split_failed_batches and not e.data and len(batch) > 1:
+                    return await call_singly(batch)
+                data, errors = e.data or {}, e.errors or []
+            except Exception as e:
+                if split_failed_batches and len(batch) > 1:
+                    return await call_singly(batch)
+                return [e] * len(batch)
+
+            errors_by_alias: Dict[str, List[Dict[str, Any]]] = {}
+            for error in errors:
+                path = error.get("path") or [None]
+                errors_by_alias.setdefault(path[0], []).append(error)
+
+            results: List[Any] = []
+            for i in range(len(batch)):
+                alias = f"{BATCH_ALIAS_PREFIX}{i}"
+                if alias in errors_by_alias:
+                    results.append(RequestFailedException(errors_by_alias[alias]))
+                elif data.get(alias) is None and errors:
+                    results.append(RequestFailedException(errors))
+                else:
+                    results.append(data.get(alias))
+            return results
+
+        batches = [items[i : i + batch_size] for i in range(0, len(items), batch_size)]
+        results = await asyncio.gather(*[call_batch(batch) for batch in batches])
+        return [result for batch_results in results for result in batch_results]
+
+    async def _gather_shards(
+        self,
+        call: Callable[[str, str], Awaitable[Dict[str, Any]]],
+        ranges: List[Tuple[str, str]],
+        max_concurrency: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        Calls `call(start_date, end_date)` for each range, up to `max_concurrency`
+        at once, and returns the responses in order. If a shard fails (after its
+        retries), the shards still pending are cancelled and the error is raised.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def call_shard(start_date: str, end_date: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await call(start_date, end_date)
+
+        tasks = [asyncio.ensure_future(call_shard(*dates)) for dates in ranges]
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _merge_budget_shards(shards: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merges the get_budgets responses of consecutive date ranges into one, by
+        appending each shard's months to the matching category, group, total or goal.
+        """
+
+        def get_key(item: Dict[str, Any], key: str) -> Any:
+            value = item.get(key)
+            return value.get("id") if isinstance(value, dict) else value
+
+        def merge_into(
+            merged: List[Dict[str, Any]],
+            items: List[Dict[str, Any]],
+            key: str,
+            lists: Tuple[str, ...],
+        ) -> None:
+            index = {get_key(item, key): item for item in merged}
+            for item in items:
+                existing = index.get(get_key(item, key))
+                if existing is None:
+                    merged.append(item)
+                    index[get_key(item, key)] = item
+                    continue
+                for name in lists:
+                    existing[name] = (existing.get(name) or []) + (item.get(name) or [])
+
+        merged = shards[0]
+        budget_data = merged["budgetData"]
+        for shard in shards[1:]:
+            data = shard["budgetData"]
+            for name, key in (
+                ("monthlyAmountsByCategory", "category"),
+                ("monthlyAmountsByCategoryGroup", "categoryGroup"),
+            ):
+                merge_into(budget_data[name], data[name], key, ("monthlyAmounts",))
+
+            flex_expense = data.get("monthlyAmountsForFlexExpense")
+            if isinstance(flex_expense, list):
+                merge_into(
+                    budget_data["monthlyAmountsForFlexExpense"],
+                    flex_expense,
+                    "budgetVariability",
+                    ("monthlyAmounts",),
+                )
+            elif flex_expense:
+                budget_data["monthlyAmountsForFlexExpense"]["monthlyAmounts"].extend(
+                    flex_expense["monthlyAmounts"]
+                )
+
+            budget_data["totalsByMonth"].extend(data["totalsByMonth"])
+
+            for name in ("goalMonthlyContributions", "goalPlannedContributions"):
+                if name in shard:
+                    merged[name].extend(shard[name])
+            if "goalsV2" in shard:
+                merge_into(
+                    merged["goalsV2"],
+                    shard["goalsV2"],
+                    "id",
+                    ("plannedContributions", "monthlyContributionSummaries"),
+                )
+        return merged
+
+    @staticmethod
+    def _merge_cashflow_shards(shards: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merges the get_cashflow responses of consecutive date ranges into one, by
+        adding up the sums of each category, group and merchant, and the summary.
+        """
+
+        def add_summary(merged: Dict[str, Any], summary: Dict[str, Any]) -> None:
+            for name, value in summary.items():
+                if name != "__typename" and isinstance(value, (int, float)):
+                    merged[name] = (merged.get(name) or 0) + value
+
+        merged = shards[0]
+        for name, key in (
+            ("byCategory", "category"),
+            ("byCategoryGroup", "categoryGroup"),
+            ("byMerchant", "merchant"),
+        ):
+            index = {(row["groupBy"][key] or {}).get("id"): row for row in merged[name]}
+            for shard in shards[1:]:
+                for row in shard[name]:
+                    group_id = (row["groupBy"][key] or {}).get("id")
+                    if group_id in index:
+                        add_summary(index[group_id]["summary"], row["summary"])
+                    else:
+                        merged[name].append(row)
+                        index[group_id] = row
+
+        summary = merged["summary"]["summary"]
+        for shard in shards[1:]:
+            shard_summary = dict(shard["summary"]["summary"])
+            shard_summary.pop("savingsRate", None)
+            add_summary(summary, shard_summary)
+        if len(shards) > 1 and "savingsRate" in summary:
+            income = summary.get("sumIncome") or 0
+            summary["savingsRate"] = summary["savings"] / income if income else 0
+        return merged
+
+    async def _run_bulk(
+        self,
+        call: Callable[[Any], Awaitable[Any]],
+        items: List[Any],
+        key: Callable[[Any], str],
+        bulk: Optional[BulkOperation],
+        idempotent: bool = False,
+    ) -> Dict[str, BulkOutcome]:
+        if bulk is None:
+            bulk = BulkOperation(idempotent=idempotent)
+        return await bulk.run(call, items, key)
+
+    @staticmethod
+    def _get_outcome_result(
+        outcome: Optional[BulkOutcome],
+    ) -> Union[Any, BaseException]:
+        """Returns the result of a bulk item, or the exception it failed with."""
+        if outcome is None:
+            return RequestFailedException("Not run, the bulk operation was cancelled")
+        return outcome.result if outcome.ok else outcome.error
+
+    @staticmethod
+    def _check_payload(
+        payload: Union[Dict[str, Any], BaseException, None],
+        success_key: Optional[str] = None,
+    ) -> Union[Dict[str, Any], BaseException]:
+        """
+        Returns a RequestFailedException for a mutation payload that reports errors
+        (or a false `success_key`), and the payload unchanged otherwise.
+        """
+        if isinstance(payload, BaseException):
+            return payload
+        if payload is None:
+            return RequestFailedException("No result returned")
+        if payload.get("errors") or (success_key and not payload.get(success_key)):
+            return RequestFailedException(payload.get("errors"))
+        return payload
+
+    @classmethod
+    def _raise_for_payload(
+        cls,
+        payload: Optional[Dict[str, Any]],
+        success_key: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Same as _check_payload, but raises the RequestFailedException."""
+        payload = cls._check_payload(payload, success_key)
+        if isinstance(payload, BaseException):
+            raise payload
+        return payload
 
     def save_session(self, filename: Optional[str] = None) -> None:
         """
@@ -2816,22 +5170,22 @@ class MonarchMoney(object):
         }
 
         if mfa_secret_key:
-            data["totp"] = oathtool.generate_otp(mfa_secret_key)
+            import oathtool
 
-        async with ClientSession(headers=self._headers) as session:
-            async with session.post(
-                MonarchMoneyEndpoints.getLoginEndpoint(), data=data
-            ) as resp:
-                if resp.status == 403:
-                    raise RequireMFAException("Multi-Factor Auth Required")
-                elif resp.status != 200:
-                    raise LoginFailedException(
-                        f"HTTP Code {resp.status}: {resp.reason}"
-                    )
+            data["totp"] = oathtool.generate_otp(mfa_secret_key)
 
-                response = await resp.json()
-                self.set_token(response["token"])
-                self._headers["Authorization"] = f"Token {self._token}"
+        async with self._post(
+            MonarchMoneyEndpoints.getLoginEndpoint(),
+            data=data,
+        ) as resp:
+            if resp.status == 403:
+                raise RequireMFAException("Multi-Factor Auth Required")
+            elif resp.status != 200:
+                raise LoginFailedException(f"HTTP Code {resp.status}: {resp.reason}")
+
+            response = await resp.json()
+            self.set_token(response["token"])
+            self._headers["Authorization"] = f"Token {self._token}"
 
     async def _multi_factor_authenticate(
         self, email: str, password: str, code: str
@@ -2847,22 +5201,51 @@ class MonarchMoney(object):
             "username": email,
         }
 
-        async with ClientSession(headers=self._headers) as session:
-            async with session.post(
-                MonarchMoneyEndpoints.getLoginEndpoint(), data=data
-            ) as resp:
-                if resp.status != 200:
-                    response = await resp.json()
-                    error_message = (
-                        response["error_code"]
-                        if response is not None
-                        else "Unknown error"
-                    )
-                    raise LoginFailedException(error_message)
-
+        async with self._post(
+            MonarchMoneyEndpoints.getLoginEndpoint(),
+            data=data,
+        ) as resp:
+            if resp.status != 200:
                 response = await resp.json()
-                self.set_token(response["token"])
-                self._headers["Authorization"] = f"Token {self._token}"
+                error_message = (
+                    response["error_code"] if response is not None else "Unknown error"
+                )
+                raise LoginFailedException(error_message)
+
+            response = await resp.json()
+            self.set_token(response["token"])
+            self._headers["Authorization"] = f"Token {self._token}"
+
+    @asynccontextmanager
+    async def _post(self, url: str, **kwargs: Any) -> AsyncIterator[ClientResponse]:
+        """
+        Posts to one of Monarch Money's REST endpoints on the pooled session,
+        and reports the call to the instrumentation hooks.
+        """
+        timer = CallTimer(urlparse(url).path, None)
+        error: Optional[BaseException] = None
+        try:
+            async with self._get_http_session().post(
+                url, headers=self._headers, **kwargs
+            ) as resp:
+                timer.metrics["ttfb"] = timer.elapsed()
+                timer.metrics["status"] = resp.status
+                timer.metrics["response_bytes"] = resp.content_length
+                yield resp
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if self._hooks:
+                self._call_hooks(timer.get_record(error=error))
+
+    def _call_hooks(self, record: CallRecord) -> None:
+        for hook in list(self._hooks):
+            try:
+                hook(record)
+            except Exception as e:
+                # A broken hook must not fail the API call it reports
+                warnings.warn(f"Instrumentation hook {hook!r} failed: {e!r}")
 
     def _get_graphql_client(self) -> Client:
         """
@@ -2872,13 +5255,44 @@ class MonarchMoney(object):
             raise LoginFailedException(
                 "Make sure you call login() first or provide a session token!"
             )
-        transport = AIOHTTPTransport(
-            url=MonarchMoneyEndpoints.getGraphQL(),
-            headers=self._headers,
-            timeout=self._timeout,
-        )
-        return Client(
-            transport=transport,
-            fetch_schema_from_transport=False,
-            execute_timeout=self._timeout,
-        )
+        if self._graphql_client is None:
+            from gql import Client
+
+            from .transport import PooledAIOHTTPTransport
+
+            transport = PooledAIOHTTPTransport(
+                session_factory=self._get_http_session,
+                url=MonarchMoneyEndpoints.getGraphQL(),
+                headers=self._headers,
+                timeout=self._timeout,
+            )
+            self._graphql_client = Client(
+                transport=transport,
+                fetch_schema_from_transport=False,
+                execute_timeout=self._timeout,
+            )
+        return self._graphql_client
+
+    def _get_http_session(self) -> ClientSession:
+        """
+        Returns the pooled HTTP session shared by all calls to Monarch Money,
+        creating it on first use (or if the previous one belongs to another event loop).
+        """
+        loop = asyncio.get_running_loop()
+        if (
+            self._http_session is None
+            or self._http_session.closed
+            or self._http_session_loop is not loop
+        ):
+            from aiohttp import ClientSession, DummyCookieJar, TCPConnector
+
+            connector = TCPConnector(
+                limit=self._pool_size,
+                keepalive_timeout=self._keepalive_timeout,
+            )
+            # Cookies are not kept between calls; authentication is by token header only.
+            self._http_session = ClientSession(
+                connector=connector, cookie_jar=DummyCookieJar()
+            )
+            self._http_session_loop = loop
+        return self._http_session
@@ -0,0 +1,214 @@
+import asyncio
+from collections import defaultdict, deque
+from typing import Deque, Dict, Optional
+
+# The number of recent latencies per operation whose median is its usual latency
+LATENCY_WINDOW = 50
+# The number of latencies needed before an operation's latency is judged
+LATENCY_MIN_SAMPLES = 10
+# The weight of each new latency in an operation's smoothed latency
+LATENCY_SMOOTHING = 0.2
+
+
+def is_overload_error(error: Optional[BaseException]) -> bool:
+    """Returns True if `error` indicates the server is overloaded or throttling us."""
+    from gql.transport.exceptions import TransportServerError
+
+    if isinstance(error, TransportServerError):
+        return error.code == 429 or (error.code or 0) >= 500
+    return isinstance(error, asyncio.TimeoutError)
+
+
+class TokenBucket(object):
+    """
+    Limits the rate of requests to `rate` per second, allowing bursts of up to `burst`.
+
+    A rate of None does not limit the rate, but the bucket can still be paused,
+    e.g. for the duration of a Retry-After header.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate or 1.0)
+        self._tokens = self.burst
+        self._updated_at: Optional[float] = None
+        self._paused_until = 0.0
+
+    def pause(self, seconds: float) -> None:
+        """Holds back all requests for the next `seconds` seconds."""
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + seconds)
+
+    async def acquire(self) -> None:
+        """Waits until a request may be sent."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        wait = max(0.0, self._paused_until - now)
+        if self.rate is not None:
+            if self._updated_at is not None:
+                elapsed = now - self._updated_at
+                self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+            # Tokens are reserved up front, so concurrent callers queue behind each other
+            self._tokens -= 1
+            if self._tokens < 0:
+                wait = max(wait, -self._tokens / self.rate)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter(object):
+    """
+    Limits the number of requests in flight with an additive-increase /
+    multiplicative-decrease (AIMD) window.
+
+    The window grows by one request for every window's worth of healthy
+    responses, and shrinks by `backoff_factor` when a request is throttled or
+    fails with a server error, or when the smoothed (exponentially weighted)
+    latency of its operation exceeds `latency_tolerance` times the median of its
+    recent latencies. Smoothing against the median, rather than comparing each
+    call with the fastest, keeps the ordinary variance between calls of one
+    operation (e.g. page sizes) from shrinking the window. Requests that started
+    before the last decrease do not decrease it again.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 32,
+        backoff_factor: float = 0.5,
+        latency_tolerance: float = 2.0,
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_factor = backoff_factor
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(max(min_limit, min(initial_limit, max_limit)))
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._latencies: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=LATENCY_WINDOW)
+        )
+        self._smoothed_latencies: Dict[str, float] = {}
+        self._last_decrease = float("-inf")
+
+    @property
+    def limit(self) -> int:
+        """The number of requests currently allowed in flight."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """The number of requests currently in flight."""
+        return self._in_flight
+
+    async def acquire(self) -> float:
+        """Waits for a free slot, and returns the request's start time for release()."""
+        loop = asyncio.get_running_loop()
+        while self._in_flight >= self.limit:
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Pass on a wake-up we will not use
+                    self._wake_waiters()
+                raise
+        self._in_flight += 1
+        return loop.time()
+
+    def release(
+        self,
+        started_at: float,
+        operation: str = "",
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """
+        Frees the slot taken by acquire() and adjusts the window to the outcome.
+        Errors that say nothing about load (e.g. a cancelled request) leave it unchanged.
+        """
+        self._in_flight -= 1
+        now = asyncio.get_running_loop().time()
+        latency = now - started_at
+        latencies = self._latencies[operation]
+        slow = False
+        if error is None:
+            smoothed = self._smoothed_latencies.get(operation, latency)
+            smoothed += LATENCY_SMOOTHING * (latency - smoothed)
+            self._smoothed_latencies[operation] = smoothed
+            if len(latencies) >= LATENCY_MIN_SAMPLES:
+                baseline = sorted(latencies)[len(latencies) // 2]
+                slow = baseline > 0 and smoothed > self.latency_tolerance * baseline
+            latencies.append(latency)
+
+        if is_overload_error(error) or slow:
+            if started_at >= self._last_decrease:
+                self._limit = max(self.min_limit, self._limit * self.backoff_factor)
+                self._last_decrease = now
+        elif error is None:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+        self._wake_waiters()
+
+    def _wake_waiters(self) -> None:
+        free = self.limit - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+
+class RateLimiter(object):
+    """
+    Shared limiter for calls to Monarch Money: a token bucket for the request
+    rate, and an adaptive (AIMD) window for the number of requests in flight.
+
+    :param rate: the maximum number of requests per second, or None for no fixed limit.
+    :param burst: the number of requests that may be sent at once when the bucket is full.
+    :param initial_concurrency: the starting number of requests allowed in flight.
+    :param min_concurrency: the smallest the in-flight window may shrink to.
+    :param max_concurrency: the largest the in-flight window may grow to.
+    """
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[float] = None,
+        initial_concurrency: int = 4,
+        min_concurrency: int = 1,
+        max_concurrency: int = 32,
+    ) -> None:
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial_limit=initial_concurrency,
+            min_limit=min_concurrency,
+            max_limit=max_concurrency,
+        )
+
+    async def acquire(self) -> float:
+        """
+        Waits until a request may be sent, and returns its start time for release().
+        """
+        started_at = await self.concurrency.acquire()
+        try:
+            await self.bucket.acquire()
+        except BaseException as e:
+            self.concurrency.release(started_at, error=e)
+            raise
+        return asyncio.get_running_loop().time()
+
+    def release(
+        self,
+        started_at: float,
+        operation: str = "",
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Records the outcome of a request started with acquire()."""
+        self.concurrency.release(started_at, operation, error)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after:
+            self.bucket.pause(retry_after)
@@ -0,0 +1,90 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterable, Optional
+
+# Rate limiting, gateway errors and Cloudflare's 52x origin errors
+DEFAULT_RETRY_STATUSES = (429, 502, 503, 504, 520, 521, 522, 523, 524, 525)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a Retry-After header, given either in seconds or as an HTTP date,
+    into a number of seconds to wait.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy(object):
+    """
+    Decides whether a failed API call is retried, and how long to wait first.
+
+    Waits grow exponentially from `backoff_base` up to `backoff_max` seconds, with
+    full jitter, unless the server sent a Retry-After header. Only queries are
+    retried unless `retry_mutations` is set, since a mutation that failed with a
+    gateway error may still have been applied.
+
+    :param max_retries: the number of retries after the first attempt; 0 disables retries.
+    :param backoff_base: the wait, in seconds, before the first retry.
+    :param backoff_max: the longest wait, in seconds, between two attempts.
+    :param jitter: randomize waits to avoid synchronized retries.
+    :param retry_statuses: the HTTP status codes that are retried.
+    :param retry_mutations: also retry mutations.
+    :param deadline: the total number of seconds a call may take across all
+      attempts, or None for no limit.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        jitter: bool = True,
+        retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+        retry_mutations: bool = False,
+        deadline: Optional[float] = None,
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_mutations = retry_mutations
+        self.deadline = deadline
+
+    def is_retryable(self, error: BaseException, is_mutation: bool = False) -> bool:
+        """Returns True if `error` is transient and the call may be retried."""
+        if is_mutation and not self.retry_mutations:
+            return False
+        from aiohttp import ClientConnectionError
+        from gql.transport.exceptions import TransportServerError
+
+        if isinstance(error, TransportServerError):
+            return error.code in self.retry_statuses
+        return isinstance(error, (ClientConnectionError, asyncio.TimeoutError))
+
+    def get_delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """
+        Returns the number of seconds to wait before retry number `attempt` (from 0),
+        honouring the Retry-After header of `error` if there was one.
+        """
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.backoff_max, self.backoff_base * (2**attempt))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
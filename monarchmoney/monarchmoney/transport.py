@@ -0,0 +1,127 @@
+import json
+import time
+from typing import Any, Dict, Optional
+
+from aiohttp import ClientResponseError, ClientTimeout
+from gql.transport.aiohttp import AIOHTTPTransport
+from gql.transport.exceptions import (
+    TransportClosed,
+    TransportProtocolError,
+    TransportServerError,
+)
+from graphql import DocumentNode, ExecutionResult
+
+from .instrumentation import CALL_METRICS
+from .monarchmoney import get_query_string
+from .retry import parse_retry_after
+
+
+class HTTPResponseError(TransportServerError):
+    """
+    A TransportServerError raised for an HTTP error response, with the number of
+    seconds the server asked to wait before retrying (from Retry-After), if any.
+    """
+
+    def __init__(
+        self, message: str, code: int, retry_after: Optional[float] = None
+    ) -> None:
+        super().__init__(message, code)
+        self.retry_after = retry_after
+
+
+class PooledAIOHTTPTransport(AIOHTTPTransport):
+    """
+    An AIOHTTPTransport that runs on a ClientSession owned by MonarchMoney.
+
+    gql connects and closes the transport around every execute_async() call;
+    here connecting just attaches the shared session and closing leaves it
+    open, so the keep-alive connections in its pool survive between calls.
+    """
+
+    def __init__(self, session_factory, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self._session_factory = session_factory
+
+    async def connect(self) -> None:
+        self.session = self._session_factory()
+
+    async def close(self) -> None:
+        self.session = None
+
+    async def execute(
+        self,
+        document: DocumentNode,
+        variable_values: Optional[Dict[str, Any]] = None,
+        operation_name: Optional[str] = None,
+        extra_args: Optional[Dict[str, Any]] = None,
+        upload_files: bool = False,
+    ) -> ExecutionResult:
+        if upload_files:
+            return await super().execute(
+                document,
+                variable_values=variable_values,
+                operation_name=operation_name,
+                extra_args=self._post_args(extra_args),
+                upload_files=upload_files,
+            )
+
+        payload: Dict[str, Any] = {"query": get_query_string(document)}
+        if operation_name:
+            payload["operationName"] = operation_name
+        if variable_values:
+            payload["variables"] = variable_values
+
+        if self.session is None:
+            raise TransportClosed("Transport is not connected")
+
+        metrics = CALL_METRICS.get()
+        sent_at = time.perf_counter()
+        async with self.session.post(
+            self.url, ssl=self.ssl, json=payload, **self._post_args(extra_args)
+        ) as resp:
+            self.response_headers = resp.headers
+            if metrics is not None:
+                metrics["ttfb"] = time.perf_counter() - sent_at
+                metrics["status"] = resp.status
+            try:
+                body = await resp.read()
+                if metrics is not None:
+                    metrics["response_bytes"] = len(body)
+                result = json.loads(body)
+            except Exception:
+                result = None
+            if result is None or ("errors" not in result and "data" not in result):
+                await self._raise_response_error(resp)
+
+            return ExecutionResult(
+                errors=result.get("errors"),
+                data=result.get("data"),
+                extensions=result.get("extensions"),
+            )
+
+    def _post_args(self, extra_args: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # Headers and timeout are sent per request, as the session is shared
+        # and the Authorization header changes on login.
+        post_args: Dict[str, Any] = {"headers": self.headers}
+        if self.timeout is not None:
+            post_args["timeout"] = ClientTimeout(total=self.timeout)
+        if extra_args:
+            post_args.update(extra_args)
+        return post_args
+
+    @staticmethod
+    async def _raise_response_error(resp) -> None:
+        """
+        Raises a TransportServerError for HTTP errors, or a TransportProtocolError
+        if a successful response is not a GraphQL result.
+        """
+        try:
+            resp.raise_for_status()
+        except ClientResponseError as e:
+            raise HTTPResponseError(
+                str(e), e.status, parse_retry_after(resp.headers.get("Retry-After"))
+            ) from e
+        result_text = await resp.text()
+        raise TransportProtocolError(
+            f"Server did not return a GraphQL result: {result_text}"
+        )
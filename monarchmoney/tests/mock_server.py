@@ -0,0 +1,553 @@
+"""
+A local stand-in for Monarch Money's API, for tests and benchmarks that should
+exercise the real transport, connection pooling and pagination without network
+access.
+
+It serves synthetic GetTransactionsList, GetAccounts and GetJointPlanningData
+responses (ignoring the selection set, so every field is always returned), plus
+the login endpoint, with configurable latency, page sizes, dataset size and
+injected errors.
+
+Usage:
+    async with MockMonarchServer(transaction_count=10000, latency=0.05) as server:
+        MonarchMoneyEndpoints.BASE_URL = server.base_url
+        mm = MonarchMoney(token="mock")
+        ...
+
+or, from the command line, to run it in its own process:
+    python tests/mock_server.py --port 8080 --transactions 10000
+"""
+
+import argparse
+import asyncio
+import random
+from collections import Counter
+from datetime import date, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from aiohttp import web
+
+MOCK_END_DATE = date(2024, 12, 31)
+MOCK_HISTORY_DAYS = 10 * 365
+MOCK_TOKEN = "mock_token"
+
+# The category groups, and their categories, of the synthetic budget
+MOCK_CATEGORY_GROUPS = {
+    "Income": ("Paychecks", "Interest"),
+    "Bills & Utilities": ("Rent", "Electric", "Internet", "Phone"),
+    "Food & Dining": ("Groceries", "Restaurants", "Coffee Shops"),
+    "Shopping": ("Clothing", "Electronics", "Household"),
+    "Travel": ("Flights", "Hotels", "Car Rental"),
+}
+MOCK_MERCHANTS = (
+    "Amazon",
+    "Costco",
+    "Whole Foods",
+    "Starbucks",
+    "Shell",
+    "Delta",
+    "Target",
+    "Comcast",
+)
+
+
+def make_accounts(count: int) -> List[Dict[str, Any]]:
+    """Returns `count` synthetic accounts."""
+    accounts = []
+    for i in range(count):
+        is_asset = i % 4 != 3
+        accounts.append(
+            {
+                "id": str(900000000 + i),
+                "displayName": f"Account {i}",
+                "syncDisabled": False,
+                "deactivatedAt": None,
+                "isHidden": False,
+                "isAsset": is_asset,
+                "mask": f"{i:04d}",
+                "createdAt": "2021-10-15T01:32:33.809450+00:00",
+                "updatedAt": "2024-12-31T00:56:41.322045+00:00",
+                "displayLastUpdatedAt": "2024-12-31T00:56:41.321928+00:00",
+                "currentBalance": 1000.0 * (i + 1) * (1 if is_asset else -1),
+                "displayBalance": 1000.0 * (i + 1),
+                "includeInNetWorth": True,
+                "hideFromList": False,
+                "hideTransactionsFromReports": False,
+                "includeBalanceInNetWorth": True,
+                "includeInGoalBalance": False,
+                "dataProvider": "plaid",
+                "dataProviderAccountId": f"provider{i}",
+                "isManual": False,
+                "transactionsCount": 0,
+                "holdingsCount": 0,
+                "manualInvestmentsTrackingMethod": None,
+                "order": i,
+                "logoUrl": None,
+                "hasSyncInProgress": False,
+                "type": {
+                    "name": "depository" if is_asset else "credit",
+                    "display": "Cash" if is_asset else "Credit Cards",
+                    "__typename": "AccountType",
+                },
+                "subtype": {
+                    "name": "checking" if is_asset else "credit_card",
+                    "display": "Checking" if is_asset else "Credit Card",
+                    "__typename": "AccountSubtype",
+                },
+                "credential": {
+                    "id": str(800000000 + i),
+                    "updateRequired": False,
+                    "disconnectedFromDataProviderAt": None,
+                    "dataProvider": "PLAID",
+                    "institution": {
+                        "id": str(700000000 + i),
+                        "plaidInstitutionId": f"ins_{i}",
+                        "name": f"Bank {i}",
+                        "status": "OK",
+                        "__typename": "Institution",
+                    },
+                    "__typename": "Credential",
+                },
+                "institution": {
+                    "id": str(700000000 + i),
+                    "name": f"Bank {i}",
+                    "primaryColor": "#0075a3",
+                    "url": f"https://bank{i}.example.com/",
+                    "__typename": "Institution",
+                },
+                "__typename": "Account",
+            }
+        )
+    return accounts
+
+
+def make_categories() -> List[Dict[str, Any]]:
+    """Returns the synthetic category groups, with their categories."""
+    groups = []
+    category_id = 100
+    for group_index, (group_name, category_names) in enumerate(
+        MOCK_CATEGORY_GROUPS.items()
+    ):
+        categories = []
+        for order, name in enumerate(category_names):
+            category_id += 1
+            categories.append(
+                {
+                    "id": str(category_id),
+                    "name": name,
+                    "order": order,
+                    "budgetVariability": "fixed" if order == 0 else "flexible",
+                    "rolloverPeriod": None,
+                    "__typename": "Category",
+                }
+            )
+        groups.append(
+            {
+                "id": str(10 + group_index),
+                "name": group_name,
+                "order": group_index,
+                "groupLevelBudgetingEnabled": False,
+                "budgetVariability": None,
+                "rolloverPeriod": None,
+                "categories": categories,
+                "type": "income" if group_index == 0 else "expense",
+                "__typename": "CategoryGroup",
+            }
+        )
+    return groups
+
+
+def make_transactions(
+    count: int, accounts: List[Dict[str, Any]], seed: int = 0
+) -> List[Dict[str, Any]]:
+    """
+    Returns `count` synthetic transactions spread over MOCK_HISTORY_DAYS, newest first.
+    """
+    rng = random.Random(seed)
+    categories = [c for g in make_categories() for c in g["categories"]]
+    transactions = []
+    for i in range(count):
+        day = MOCK_END_DATE - timedelta(days=i * MOCK_HISTORY_DAYS // max(1, count))
+        account = accounts[i % len(accounts)]
+        category = rng.choice(categories)
+        merchant_index = rng.randrange(len(MOCK_MERCHANTS))
+        timestamp = f"{day.isoformat()}T12:00:00+00:00"
+        transactions.append(
+            {
+                "id": str(100000000000 + i),
+                "amount": round(rng.uniform(-500, 100), 2),
+                "pending": False,
+                "date": day.isoformat(),
+                "hideFromReports": False,
+                "plaidName": f"{MOCK_MERCHANTS[merchant_index].upper()} #{i}",
+                "notes": None,
+                "isRecurring": False,
+                "reviewStatus": None,
+                "needsReview": False,
+                "attachments": [],
+                "isSplitTransaction": False,
+                "createdAt": timestamp,
+                "updatedAt": timestamp,
+                "category": {
+                    "id": category["id"],
+                    "name": category["name"],
+                    "__typename": "Category",
+                },
+                "merchant": {
+                    "name": MOCK_MERCHANTS[merchant_index],
+                    "id": str(500 + merchant_index),
+                    "transactionsCount": count // len(MOCK_MERCHANTS),
+                    "__typename": "Merchant",
+                },
+                "account": {
+                    "id": account["id"],
+                    "displayName": account["displayName"],
+                    "__typename": "Account",
+                },
+                "tags": [],
+                "__typename": "Transaction",
+            }
+        )
+    return transactions
+
+
+def _iter_months(start: date, end: date) -> Iterable[str]:
+    month = date(start.year, start.month, 1)
+    while month <= end:
+        yield month.isoformat()
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+class MockMonarchServer(object):
+    """
+    An aiohttp server answering like Monarch Money's API.
+
+    :param transaction_count: the number of synthetic transactions.
+    :param account_count: the number of synthetic accounts.
+    :param latency: the seconds each request takes before it is answered.
+    :param latency_per_row: additional seconds per transaction returned.
+    :param jitter: the maximum random seconds added to each request's latency.
+    :param max_page_size: the most transactions returned per page, whatever the limit asked for.
+    :param error_rate: the fraction of GraphQL requests answered with an error
+      status from `error_statuses`.
+    :param error_statuses: the HTTP statuses injected at random.
+    :param retry_after: the Retry-After header sent with injected 429s, if any.
+    :param seed: the seed of the synthetic data and injected errors.
+    :param host: the interface to listen on.
+    :param port: the port to listen on; 0 picks a free one.
+    """
+
+    def __init__(
+        self,
+        transaction_count: int = 1000,
+        account_count: int = 8,
+        latency: float = 0.0,
+        latency_per_row: float = 0.0,
+        jitter: float = 0.0,
+        max_page_size: Optional[int] = None,
+        error_rate: float = 0.0,
+        error_statuses: Iterable[int] = (429, 525),
+        retry_after: Optional[float] = None,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.latency = latency
+        self.latency_per_row = latency_per_row
+        self.jitter = jitter
+        self.max_page_size = max_page_size
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.host = host
+        self.port = port
+        self.accounts = make_accounts(account_count)
+        self.category_groups = make_categories()
+        self.transactions = make_transactions(transaction_count, self.accounts, seed)
+
+        # What the server saw, for assertions and benchmark reports
+        self.requests: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.peers: set = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+        self._rng = random.Random(seed)
+        self._scheduled_errors: List[int] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    @property
+    def base_url(self) -> str:
+        """The URL to use as MonarchMoneyEndpoints.BASE_URL."""
+        return f"http://{self.host}:{self.port}"
+
+    def fail_next(self, *statuses: int) -> None:
+        """Answers the next GraphQL requests with these HTTP statuses, in order."""
+        self._scheduled_errors.extend(statuses)
+
+    def reset_stats(self) -> None:
+        self.requests.clear()
+        self.errors.clear()
+        self.peers.clear()
+        self.max_in_flight = self.in_flight
+
+    async def start(self) -> str:
+        """Starts serving, and returns the base URL."""
+        app = web.Application()
+        app.router.add_post("/graphql", self._handle_graphql)
+        app.router.add_post("/auth/login/", self._handle_login)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self.base_url
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MockMonarchServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def _handle_login(self, request: web.Request) -> web.Response:
+        return web.json_response({"token": MOCK_TOKEN})
+
+    async def _handle_graphql(self, request: web.Request) -> web.Response:
+        self.peers.add(request.transport.get_extra_info("peername"))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            payload = await request.json()
+            operation = payload.get("operationName")
+            variables = payload.get("variables") or {}
+            self.requests[operation] += 1
+
+            status = self._get_injected_status()
+            if status is not None:
+                self.errors[status] += 1
+                await asyncio.sleep(self.latency)
+                headers = {}
+                if status == 429 and self.retry_after is not None:
+                    headers["Retry-After"] = str(self.retry_after)
+                return web.Response(status=status, headers=headers, text="error")
+
+            handler = getattr(self, f"_resolve_{operation}", None)
+            if handler is None:
+                data = None
+                errors = [{"message": f"Unknown operation {operation}"}]
+                rows = 0
+            else:
+                data, rows = handler(variables)
+                errors = None
+            await asyncio.sleep(
+                self.latency
+                + rows * self.latency_per_row
+                + self._rng.uniform(0, self.jitter)
+            )
+            body: Dict[str, Any] = {"data": data}
+            if errors:
+                body["errors"] = errors
+            return web.json_response(body)
+        finally:
+            self.in_flight -= 1
+
+    def _get_injected_status(self) -> Optional[int]:
+        if self._scheduled_errors:
+            return self._scheduled_errors.pop(0)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return self._rng.choice(self.error_statuses)
+        return None
+
+    def _resolve_GetTransactionsList(self, variables: Dict[str, Any]):
+        filters = variables.get("filters") or {}
+        transactions = self.transactions
+        start_date = filters.get("startDate")
+        end_date = filters.get("endDate")
+        if start_date and end_date:
+            transactions = [
+                t for t in transactions if start_date <= t["date"] <= end_date
+            ]
+        if filters.get("accounts"):
+            account_ids = set(filters["accounts"])
+            transactions = [
+                t for t in transactions if t["account"]["id"] in account_ids
+            ]
+
+        offset = variables.get("offset") or 0
+        limit = variables.get("limit") or len(transactions)
+        if self.max_page_size is not None:
+            limit = min(limit, self.max_page_size)
+        results = transactions[offset : offset + limit]
+
+        all_transactions: Dict[str, Any] = {
+            "results": results,
+            "__typename": "TransactionList",
+        }
+        if variables.get("includeTotalCount", True):
+            all_transactions["totalCount"] = len(transactions)
+        data: Dict[str, Any] = {"allTransactions": all_transactions}
+        if variables.get("includeRules", True):
+            data["transactionRules"] = []
+        return data, len(results)
+
+    def _resolve_GetAccounts(self, variables: Dict[str, Any]):
+        data = {
+            "accounts": self.accounts,
+            "householdPreferences": {
+                "id": "1",
+                "accountGroupOrder": [],
+                "__typename": "HouseholdPreferences",
+            },
+        }
+        return data, len(self.accounts)
+
+    def _resolve_ForceRefreshAccountsQuery(self, variables: Dict[str, Any]):
+        data = {
+            "accounts": [
+                {
+                    "id": a["id"],
+                    "hasSyncInProgress": False,
+                    "__typename": "Account",
+                }
+                for a in self.accounts
+            ]
+        }
+        return data, len(self.accounts)
+
+    def _resolve_GetJointPlanningData(self, variables: Dict[str, Any]):
+        months = list(
+            _iter_months(
+                date.fromisoformat(variables["startDate"]),
+                date.fromisoformat(variables["endDate"]),
+            )
+        )
+
+        def monthly_amounts(planned: float) -> List[Dict[str, Any]]:
+            return [
+                {
+                    "month": month,
+                    "plannedCashFlowAmount": planned,
+                    "plannedSetAsideAmount": 0.0,
+                    "actualAmount": planned * 0.9,
+                    "remainingAmount": planned * 0.1,
+                    "previousMonthRolloverAmount": 0.0,
+                    "rolloverType": None,
+                    "__typename": "BudgetMonthlyAmounts",
+                }
+                for month in months
+            ]
+
+        def totals(planned: float) -> Dict[str, Any]:
+            return {
+                "plannedAmount": planned,
+                "actualAmount": planned * 0.9,
+                "remainingAmount": planned * 0.1,
+                "previousMonthRolloverAmount": 0.0,
+                "__typename": "BudgetTotals",
+            }
+
+        categories = [c for g in self.category_groups for c in g["categories"]]
+        data: Dict[str, Any] = {
+            "budgetData": {
+                "monthlyAmountsByCategory": [
+                    {
+                        "category": {"id": c["id"], "__typename": "Category"},
+                        "monthlyAmounts": monthly_amounts(100.0),
+                        "__typename": "BudgetCategoryMonthlyAmounts",
+                    }
+                    for c in categories
+                ],
+                "monthlyAmountsByCategoryGroup": [
+                    {
+                        "categoryGroup": {"id": g["id"], "__typename": "CategoryGroup"},
+                        "monthlyAmounts": monthly_amounts(100.0 * len(g["categories"])),
+                        "__typename": "BudgetCategoryGroupMonthlyAmounts",
+                    }
+                    for g in self.category_groups
+                ],
+                "monthlyAmountsForFlexExpense": {
+                    "budgetVariability": "flexible",
+                    "monthlyAmounts": monthly_amounts(500.0),
+                    "__typename": "BudgetFlexMonthlyAmounts",
+                },
+                "totalsByMonth": [
+                    {
+                        "month": month,
+                        "totalIncome": totals(5000.0),
+                        "totalExpenses": totals(4000.0),
+                        "totalFixedExpenses": totals(2000.0),
+                        "totalNonMonthlyExpenses": totals(500.0),
+                        "totalFlexibleExpenses": totals(1500.0),
+                        "__typename": "BudgetMonthTotals",
+                    }
+                    for month in months
+                ],
+                "__typename": "BudgetData",
+            },
+            "categoryGroups": self.category_groups,
+            "budgetSystem": "groups_and_categories",
+        }
+        if variables.get("useLegacyGoals"):
+            data["goals"] = []
+            data["goalMonthlyContributions"] = []
+            data["goalPlannedContributions"] = []
+        if variables.get("useV2Goals"):
+            data["goalsV2"] = []
+        return data, len(categories) * len(months)
+
+
+async def serve(server: MockMonarchServer) -> None:
+    """Serves until cancelled, printing the base URL once listening."""
+    async with server:
+        print(server.base_url, flush=True)
+        await asyncio.Event().wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local mock of Monarch Money's API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--transactions", type=int, default=1000)
+    parser.add_argument("--accounts", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-per-row", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--max-page-size", type=int, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--error-statuses",
+        type=lambda value: [int(status) for status in value.split(",")],
+        default=[429, 525],
+    )
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockMonarchServer(
+        transaction_count=args.transactions,
+        account_count=args.accounts,
+        latency=args.latency,
+        latency_per_row=args.latency_per_row,
+        jitter=args.jitter,
+        max_page_size=args.max_page_size,
+        error_rate=args.error_rate,
+        error_statuses=args.error_statuses,
+        retry_after=args.retry_after,
+        seed=args.seed,
+        host=args.host,
+        port=args.port,
+    )
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
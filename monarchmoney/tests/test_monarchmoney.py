@@ -1,12 +1,47 @@
+import asyncio
+import io
 import os
 import pickle
+import random
+import subprocess
+import sys
+import tempfile
 import unittest
 from unittest.mock import patch
 
 import json
+from aiohttp import web
+from aiohttp.test_utils import TestServer
 from gql import Client
-from monarchmoney import MonarchMoney
-from monarchmoney.monarchmoney import LoginFailedException
+from gql.transport.exceptions import TransportQueryError, TransportServerError
+from graphql import print_ast
+from monarchmoney import (
+    BulkOperation,
+    Cassette,
+    CassetteMissError,
+    HedgePolicy,
+    MonarchMoney,
+    MonarchMoneyEndpoints,
+    RateLimiter,
+    ResponseCache,
+    RetryPolicy,
+    Transaction,
+)
+from monarchmoney.monarchmoney import (
+    HTTPResponseError,
+    LoginFailedException,
+    RequestFailedException,
+    get_month_ranges,
+    get_query_string,
+    parse_query,
+)
+from monarchmoney.instrumentation import JSONLSink, LatencyHistogram, RingBuffer
+from monarchmoney.ratelimit import AdaptiveConcurrencyLimiter
+from monarchmoney.retry import parse_retry_after
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_server import MockMonarchServer  # noqa: E402
 
 
 class TestMonarchMoney(unittest.IsolatedAsyncioTestCase):
@@ -220,6 +255,1446 @@ class TestMonarchMoney(unittest.IsolatedAsyncioTestCase):
         with self.assertRaises(LoginFailedException):
             await self.monarch_money.interactive_login(use_saved_session=False)
 
+    @patch.object(Client, "execute_async")
+    async def test_fetch_all_transactions(self, mock_execute_async):
+        """
+        Test that fetch_all_transactions fetches every page and stitches them in order.
+        """
+        ids = [str(i) for i in range(250)]
+
+        async def get_page(**kwargs):
+            offset = kwargs["variable_values"]["offset"]
+            limit = kwargs["variable_values"]["limit"]
+            # Later pages shift back by one, as if a transaction had been added
+            if offset:
+                offset -= 1
+            page_ids = ids[offset : offset + limit]
+            return {
+                "allTransactions": {
+                    "totalCount": len(ids),
+                    "results": [{"id": i} for i in page_ids],
+                },
+                "transactionRules": [],
+            }
+
+        mock_execute_async.side_effect = get_page
+        result = await self.monarch_money.fetch_all_transactions(
+            limit=100, start_date="2024-01-01", end_date="2024-12-31"
+        )
+
+        self.assertEqual(mock_execute_async.call_count, 3)
+        offsets = sorted(
+            c.kwargs["variable_values"]["offset"]
+            for c in mock_execute_async.call_args_list
+        )
+        self.assertEqual(offsets, [0, 100, 200])
+        filters = mock_execute_async.call_args.kwargs["variable_values"]["filters"]
+        self.assertEqual(filters["startDate"], "2024-01-01")
+        self.assertEqual([t["id"] for t in result["allTransactions"]["results"]], ids)
+        self.assertEqual(result["allTransactions"]["totalCount"], 250)
+
+        # Only the first page asks for totalCount and the transaction rules
+        variables = {
+            c.kwargs["variable_values"]["offset"]: c.kwargs["variable_values"]
+            for c in mock_execute_async.call_args_list
+        }
+        self.assertNotIn("includeTotalCount", variables[0])
+        self.assertNotIn("includeRules", variables[0])
+        self.assertFalse(variables[100]["includeTotalCount"])
+        self.assertFalse(variables[200]["includeRules"])
+
+    @patch.object(Client, "execute_async")
+    async def test_iter_transactions(self, mock_execute_async):
+        """
+        Test that iter_transactions streams every page, by row or by page.
+        """
+        ids = [str(i) for i in range(250)]
+
+        async def get_page(**kwargs):
+            offset = kwargs["variable_values"]["offset"]
+            limit = kwargs["variable_values"]["limit"]
+            return {
+                "allTransactions": {
+                    "totalCount": len(ids),
+                    "results": [{"id": i} for i in ids[offset : offset + limit]],
+                },
+            }
+
+        mock_execute_async.side_effect = get_page
+
+        rows = [t["id"] async for t in self.monarch_money.iter_transactions(limit=100)]
+        self.assertEqual(rows, ids)
+        self.assertEqual(mock_execute_async.call_count, 3)
+
+        pages = [
+            len(page)
+            async for page in self.monarch_money.iter_transactions(
+                limit=100, by_page=True, prefetch=False
+            )
+        ]
+        self.assertEqual(pages, [100, 100, 50])
+
+        # Stopping early does not fetch beyond the prefetched page
+        mock_execute_async.reset_mock()
+        transactions = self.monarch_money.iter_transactions(limit=100)
+        async for transaction in transactions:
+            break
+        await transactions.aclose()
+        self.assertLessEqual(mock_execute_async.call_count, 2)
+
+    @patch.object(Client, "execute_async")
+    async def test_field_profiles(self, mock_execute_async):
+        """
+        Test that the fields profiles request leaner selections.
+        """
+        mock_execute_async.return_value = {}
+        await self.monarch_money.get_transactions(fields="ids")
+        query = print_ast(mock_execute_async.call_args.kwargs["document"])
+        self.assertIn("updatedAt", query)
+        self.assertNotIn("attachments", query)
+
+        await self.monarch_money.get_accounts(fields="sync")
+        query = print_ast(mock_execute_async.call_args.kwargs["document"])
+        self.assertIn("institution", query)
+        self.assertNotIn("credential", query)
+
+        await self.monarch_money.get_budgets(fields="sync")
+        variables = mock_execute_async.call_args.kwargs["variable_values"]
+        self.assertFalse(variables["useV2Goals"])
+
+        with self.assertRaises(Exception):
+            await self.monarch_money.get_accounts(fields="everything")
+
+    @patch("monarchmoney.monarchmoney.asyncio.sleep")
+    @patch.object(Client, "execute_async")
+    async def test_iter_accounts_refresh(self, mock_execute_async, mock_sleep):
+        """
+        Test that refreshed accounts are yielded as they complete, with backoff.
+        """
+
+        def status(*syncing):
+            return {
+                "accounts": [
+                    {"id": i, "hasSyncInProgress": i in syncing} for i in "abc"
+                ]
+            }
+
+        mock_execute_async.side_effect = [
+            status(),
+            {"forceRefreshAccounts": {"success": True, "errors": None}},
+            status("a", "b", "c"),
+            status("b", "c"),
+            status("c"),
+            status(),
+        ]
+        refreshed = [
+            account_id
+            async for account_id in self.monarch_money.iter_accounts_refresh(
+                max_delay=3
+            )
+        ]
+        self.assertEqual(refreshed, ["a", "b", "c"])
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list], [1, 2, 3, 3])
+        operations = [c.kwargs["operation_name"] for c in mock_execute_async.mock_calls]
+        self.assertNotIn("GetAccounts", operations)
+
+        # An empty list is sent as is, and waits for every account
+        mock_execute_async.reset_mock()
+        mock_execute_async.side_effect = [
+            {"forceRefreshAccounts": {"success": True, "errors": None}},
+            status("b"),
+            status(),
+        ]
+        self.assertTrue(
+            await self.monarch_money.request_accounts_refresh_and_wait([], delay=1)
+        )
+        refresh = mock_execute_async.mock_calls[0].kwargs
+        self.assertEqual(refresh["variable_values"]["input"]["accountIds"], [])
+        self.assertEqual(mock_execute_async.call_count, 3)
+
+    @patch.object(Client, "execute_async")
+    async def test_query_coalescing(self, mock_execute_async):
+        """
+        Test that concurrent identical queries share one request.
+        """
+
+        async def get_categories(**kwargs):
+            await asyncio.sleep(0.01)
+            return {"categories": [{"id": "1"}]}
+
+        mock_execute_async.side_effect = get_categories
+        results = await asyncio.gather(
+            *[self.monarch_money.get_transaction_categories() for _ in range(3)]
+        )
+        self.assertEqual(mock_execute_async.call_count, 1)
+        self.assertEqual(results[0], results[2])
+        self.assertIsNot(results[0], results[2])
+        self.assertEqual(self.monarch_money.coalesced_counts, {"GetCategories": 2})
+
+        # A caller that changes its result does not change the others'
+        async def get_transactions(**kwargs):
+            await asyncio.sleep(0.01)
+            return {
+                "allTransactions": {
+                    "totalCount": 1,
+                    "results": [{"id": "1", "date": "2024-01-01"}],
+                },
+                "transactionRules": [],
+            }
+
+        mock_execute_async.side_effect = get_transactions
+        for as_models in (True, False):
+            mock_execute_async.reset_mock()
+            calls = [
+                self.monarch_money.get_transactions(as_models=as_models),
+                self.monarch_money.get_transactions(as_models=not as_models),
+            ]
+            first, second = await asyncio.gather(*calls)
+            self.assertEqual(mock_execute_async.call_count, 1)
+            dicts = second if as_models else first
+            self.assertEqual(
+                dicts["allTransactions"]["results"], [{"id": "1", "date": "2024-01-01"}]
+            )
+        mock_execute_async.side_effect = get_categories
+
+        # Different variables, or a different selection, need their own request
+        mock_execute_async.reset_mock()
+        await asyncio.gather(
+            self.monarch_money.get_transactions(limit=10),
+            self.monarch_money.get_transactions(limit=20),
+            self.monarch_money.get_transactions(limit=10, fields="ids"),
+        )
+        self.assertEqual(mock_execute_async.call_count, 3)
+
+        # A caller that gives up does not cancel the request for the others
+        mock_execute_async.reset_mock()
+        first = asyncio.ensure_future(self.monarch_money.get_transaction_categories())
+        second = asyncio.ensure_future(self.monarch_money.get_transaction_categories())
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual((await second)["categories"], [{"id": "1"}])
+        self.assertEqual(mock_execute_async.call_count, 1)
+
+    @patch.object(Client, "execute_async")
+    async def test_cassette(self, mock_execute_async):
+        """
+        Test that calls recorded to a cassette are replayed offline.
+        """
+        mock_execute_async.side_effect = [
+            {"categories": [{"id": "1"}]},
+            {"allTransactions": {"totalCount": 1, "results": [{"id": "1"}]}},
+            TransportQueryError("Not found", errors=[{"message": "Not found"}]),
+        ]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cassette.jsonl.gz")
+            async with MonarchMoney(
+                token="test_token", cassette=Cassette(path, mode="record")
+            ) as mm:
+                categories = await mm.get_transaction_categories()
+                transactions = await mm.get_transactions(limit=1)
+                with self.assertRaises(TransportQueryError):
+                    await mm.get_transaction_details("missing")
+
+            mock_execute_async.reset_mock()
+            async with MonarchMoney(cassette=Cassette(path)) as mm:
+                self.assertEqual(await mm.get_transaction_categories(), categories)
+                self.assertEqual(await mm.get_transactions(limit=1), transactions)
+                with self.assertRaises(TransportQueryError):
+                    await mm.get_transaction_details("missing")
+                with self.assertRaises(CassetteMissError):
+                    await mm.get_transactions(limit=2)
+            mock_execute_async.assert_not_called()
+
+            # Without matching variables, calls are replayed by operation
+            async with MonarchMoney(
+                cassette=Cassette(path, match_variables=False)
+            ) as mm:
+                self.assertEqual(await mm.get_transactions(limit=2), transactions)
+
+        # Concurrent calls are replayed in the order they were made, not finished
+        async def get_transactions(**kwargs):
+            limit = kwargs["variable_values"]["limit"]
+            await asyncio.sleep(0.02 if limit == 1 else 0)
+            return {"allTransactions": {"totalCount": limit, "results": []}}
+
+        mock_execute_async.side_effect = get_transactions
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cassette.jsonl.gz")
+            async with MonarchMoney(
+                token="test_token", cassette=Cassette(path, mode="record")
+            ) as mm:
+                await asyncio.gather(
+                    mm.get_transactions(limit=1), mm.get_transactions(limit=2)
+                )
+            async with MonarchMoney(
+                cassette=Cassette(path, match_variables=False)
+            ) as mm:
+                first = await mm.get_transactions(limit=1)
+                second = await mm.get_transactions(limit=2)
+        self.assertEqual(first["allTransactions"]["totalCount"], 1)
+        self.assertEqual(second["allTransactions"]["totalCount"], 2)
+
+    @patch.object(Client, "execute_async")
+    async def test_hedged_requests(self, mock_execute_async):
+        """
+        Test that a query slower than usual is duplicated, and the first answer used.
+        """
+        delays = [5, 0]
+        cancelled = []
+
+        async def get_categories(**kwargs):
+            delay = delays.pop(0)
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(delay)
+                raise
+            return {"categories": [{"id": str(delay)}]}
+
+        mock_execute_async.side_effect = get_categories
+        policy = HedgePolicy(min_samples=3)
+        for _ in range(3):
+            policy.observe("GetCategories", 0.02)
+        self.monarch_money = MonarchMoney(token="test_token", hedge_policy=policy)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        result = await self.monarch_money.get_transaction_categories()
+        self.assertLess(loop.time() - start, 1)
+        self.assertEqual(result["categories"], [{"id": "0"}])
+        self.assertEqual(self.monarch_money.hedged_counts, {"GetCategories": 1})
+        await asyncio.sleep(0)
+        self.assertEqual(cancelled, [5])
+
+        # Operations are not hedged until enough latencies have been seen
+        self.assertIsNone(policy.get_delay("GetAccounts"))
+
+    @patch.object(Client, "execute_async")
+    async def test_hedging_waits_for_rate_limiter(self, mock_execute_async):
+        """
+        Test that time queued in the rate limiter does not count towards hedging.
+        """
+
+        async def get_transaction(**kwargs):
+            await asyncio.sleep(0.02)
+            return {"getTransaction": {"id": kwargs["variable_values"]["id"]}}
+
+        mock_execute_async.side_effect = get_transaction
+        policy = HedgePolicy(min_samples=3)
+        for _ in range(20):
+            policy.observe("GetTransactionDrawer", 0.1)
+        self.monarch_money = MonarchMoney(
+            token="test_token",
+            hedge_policy=policy,
+            rate_limiter=RateLimiter(initial_concurrency=2, max_concurrency=2),
+        )
+
+        # 20 calls through a window of 2 queue for longer than the hedge delay
+        await asyncio.gather(
+            *[self.monarch_money.get_transaction_details(str(i)) for i in range(20)]
+        )
+        self.assertEqual(self.monarch_money.hedged_counts, {})
+        self.assertEqual(mock_execute_async.call_count, 20)
+
+    @patch("monarchmoney.monarchmoney.asyncio.sleep")
+    @patch.object(Client, "execute_async")
+    async def test_gql_call_retries(self, mock_execute_async, mock_sleep):
+        """
+        Test that transient errors on queries are retried, honouring Retry-After.
+        """
+        subscription = {"subscription": {"id": "1"}}
+        mock_execute_async.side_effect = [
+            TransportServerError("Bad Gateway", 502),
+            HTTPResponseError("Too Many Requests", 429, retry_after=7),
+            subscription,
+        ]
+        self.monarch_money.set_retry_policy(RetryPolicy(max_retries=2, jitter=False))
+
+        result = await self.monarch_money.get_subscription_details()
+
+        self.assertEqual(result, subscription)
+        self.assertEqual(mock_execute_async.call_count, 3)
+        # The Retry-After pause of the rate limiter also sleeps, as time is mocked
+        self.assertEqual([c.args[0] for c in mock_sleep.call_args_list][:2], [1.0, 7])
+        self.assertEqual(self.monarch_money.retry_counts, {"GetSubscriptionDetails": 2})
+
+        # Errors that are not transient, and mutations, are raised immediately
+        for error, method, args in [
+            (TransportServerError("Unauthorized", 401), "get_accounts", ()),
+            (TransportServerError("Bad Gateway", 502), "delete_account", ("1",)),
+        ]:
+            mock_execute_async.reset_mock()
+            mock_execute_async.side_effect = error
+            with self.assertRaises(TransportServerError):
+                await getattr(self.monarch_money, method)(*args)
+            mock_execute_async.assert_called_once()
+
+    @patch.object(Client, "execute_async")
+    async def test_gql_call_deadline(self, mock_execute_async):
+        """
+        Test that a call is abandoned once the retry policy deadline has passed.
+        """
+
+        async def hang(**kwargs):
+            await asyncio.sleep(10)
+
+        mock_execute_async.side_effect = hang
+        self.monarch_money.set_retry_policy(RetryPolicy(deadline=0.05))
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.monarch_money.get_accounts()
+        mock_execute_async.assert_called_once()
+
+    def test_parse_retry_after(self):
+        """
+        Test parsing Retry-After headers given in seconds or as an HTTP date.
+        """
+        self.assertEqual(parse_retry_after("12"), 12.0)
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+
+    async def test_adaptive_concurrency(self):
+        """
+        Test that the AIMD window grows on healthy responses and halves on throttling.
+        """
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_limit=4)
+        for _ in range(6):
+            limiter.release(await limiter.acquire(), "GetAccounts")
+        self.assertEqual(limiter.limit, 4)
+
+        started = [await limiter.acquire() for _ in range(4)]
+        throttled = TransportServerError("Too Many Requests", 429)
+        limiter.release(started[0], "GetAccounts", throttled)
+        self.assertEqual(limiter.limit, 2)
+        # Requests sent before the decrease do not shrink the window again
+        limiter.release(started[1], "GetAccounts", throttled)
+        self.assertEqual(limiter.limit, 2)
+
+        # The window is full until two more requests complete
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        limiter.release(started[2], "GetAccounts")
+        limiter.release(started[3], "GetAccounts")
+        limiter.release(await waiter, "GetAccounts")
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_adaptive_concurrency_latency(self):
+        """
+        Test that latencies varying within a normal range do not shrink the window,
+        while a sustained slowdown does.
+        """
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_limit=16)
+        rng = random.Random(0)
+        with patch.object(asyncio.get_running_loop(), "time", return_value=100.0):
+            for _ in range(200):
+                started_at = await limiter.acquire()
+                limiter.release(started_at - rng.uniform(0.05, 0.25), "GetTransactions")
+        self.assertEqual(limiter.limit, 16)
+
+        with patch.object(asyncio.get_running_loop(), "time", return_value=200.0):
+            for _ in range(10):
+                started_at = await limiter.acquire()
+                limiter.release(started_at - 2.0, "GetTransactions")
+        self.assertLess(limiter.limit, 16)
+
+    async def test_token_bucket(self):
+        """
+        Test that the token bucket spaces out requests beyond the burst size.
+        """
+        loop = asyncio.get_running_loop()
+        limiter = RateLimiter(rate=50, burst=1, initial_concurrency=10)
+        start = loop.time()
+        await asyncio.gather(*[limiter.acquire() for _ in range(6)])
+        self.assertGreaterEqual(loop.time() - start, 0.09)
+
+    @patch.object(Client, "execute_async")
+    async def test_response_cache(self, mock_execute_async):
+        """
+        Test that reference data is cached on disk and invalidated by mutations.
+        """
+        tags = {"householdTransactionTags": [{"id": "1", "name": "Trip"}]}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.json")
+            self.monarch_money = MonarchMoney(cache=ResponseCache(path=path))
+            mock_execute_async.return_value = tags
+            await self.monarch_money.get_transaction_tags()
+            result = await self.monarch_money.get_transaction_tags()
+            self.assertEqual(result, tags)
+            self.assertEqual(mock_execute_async.call_count, 1)
+
+            # A new client (e.g. the next run) reads the cache from disk
+            self.monarch_money = MonarchMoney(cache=ResponseCache(path=path))
+            await self.monarch_money.get_transaction_tags()
+            self.assertEqual(mock_execute_async.call_count, 1)
+
+            mock_execute_async.return_value = {"createTransactionTag": {}}
+            await self.monarch_money.create_transaction_tag("Work", "#19D2A5")
+            mock_execute_async.return_value = tags
+            await self.monarch_money.get_transaction_tags()
+            self.assertEqual(mock_execute_async.call_count, 3)
+
+            # Tagging a transaction changes the cached tags' transactionCount
+            mock_execute_async.return_value = {"setTransactionTags": {}}
+            await self.monarch_money.set_transaction_tags("1", ["1"])
+            mock_execute_async.return_value = tags
+            await self.monarch_money.get_transaction_tags()
+            self.assertEqual(mock_execute_async.call_count, 5)
+
+            # Expired entries are refetched, and the least recently used are evicted
+            cache = ResponseCache(path=path, ttls={"GetCategories": 0}, max_entries=1)
+            cache.set("GetCategories", {}, {"categories": []})
+            self.assertIsNone(cache.get("GetCategories", {}))
+            cache.ttls["GetCategories"] = 60
+            cache.set("GetCategories", {}, {"categories": []})
+            cache.set("GetCategories", {"search": "x"}, {"categories": []})
+            self.assertIsNone(cache.get("GetCategories", {}))
+            self.assertIsNotNone(cache.get("GetCategories", {"search": "x"}))
+
+    @patch.object(Client, "execute_async")
+    async def test_get_transaction_splits_many(self, mock_execute_async):
+        """
+        Test that transactions are fetched in aliased batches and mapped back by id.
+        """
+
+        async def get_batch(**kwargs):
+            variables = kwargs["variable_values"]
+            data = {
+                f"t{name[2:]}": {"id": value, "splitTransactions": []}
+                for name, value in variables.items()
+            }
+            if "missing" in variables.values():
+                alias = next(
+                    f"t{n[2:]}" for n, v in variables.items() if v == "missing"
+                )
+                data[alias] = None
+                raise TransportQueryError(
+                    "Not found",
+                    errors=[{"message": "Not found", "path": [alias]}],
+                    data=data,
+                )
+            return data
+
+        mock_execute_async.side_effect = get_batch
+        ids = ["1", "2", "missing", "4", "5", "2"]
+        result = await self.monarch_money.get_transaction_splits_many(ids, batch_size=2)
+
+        self.assertEqual(mock_execute_async.call_count, 3)
+        first_call = mock_execute_async.call_args_list[0].kwargs
+        self.assertEqual(first_call["variable_values"], {"id0": "1", "id1": "2"})
+        self.assertIn(
+            "t1: getTransaction(id: $id1)", get_query_string(first_call["document"])
+        )
+        self.assertEqual(list(result), ["1", "2", "missing", "4", "5"])
+        self.assertEqual(result["4"]["id"], "4")
+        self.assertIsInstance(result["missing"], RequestFailedException)
+
+    @patch.object(Client, "execute_async")
+    async def test_account_histories_and_holdings_many(self, mock_execute_async):
+        """
+        Test multi-account fetchers batch, split failed batches and trim by date.
+        """
+
+        async def get_batch(**kwargs):
+            operation = kwargs["operation_name"]
+            variables = kwargs["variable_values"]
+            if operation == "Web_GetHoldingsBatch":
+                return {
+                    f"t{name[5:]}": {"aggregateHoldings": {"edges": []}}
+                    for name in variables
+                }
+            if operation == "AccountDetails_getAccountBatch":
+                return {
+                    f"t{name[2:]}": {"id": value, "displayName": f"Account {value}"}
+                    for name, value in variables.items()
+                }
+            if "bad" in variables.values():
+                if len(variables) > 1:
+                    raise TransportQueryError(
+                        "Query too complex", errors=[{"message": "Query too complex"}]
+                    )
+                raise TransportQueryError(
+                    "Not found",
+                    errors=[{"message": "Not found", "path": ["t0"]}],
+                    data={"t0": None},
+                )
+            snapshots = [
+                {"date": "2024-01-01", "signedBalance": 1.0},
+                {"date": "2024-02-01", "signedBalance": 2.0},
+            ]
+            return {f"t{name[9:]}": snapshots for name in variables}
+
+        mock_execute_async.side_effect = get_batch
+        histories = await self.monarch_money.get_account_histories(
+            ["1", "bad", "3"], since="2024-01-15"
+        )
+
+        operations = [
+            call.kwargs["operation_name"] for call in mock_execute_async.call_args_list
+        ]
+        self.assertEqual(operations.count("AccountDetails_getSnapshotsBatch"), 4)
+        self.assertEqual(operations.count("AccountDetails_getAccountBatch"), 1)
+        self.assertEqual(
+            histories["1"],
+            [
+                {
+                    "date": "2024-02-01",
+                    "signedBalance": 2.0,
+                    "accountId": "1",
+                    "accountName": "Account 1",
+                }
+            ],
+        )
+        self.assertEqual(len(histories["3"]), 1)
+        self.assertIsInstance(histories["bad"], RequestFailedException)
+
+        mock_execute_async.reset_mock()
+        holdings = await self.monarch_money.get_account_holdings_many(
+            [1, 2, 3], batch_size=2
+        )
+        self.assertEqual(mock_execute_async.call_count, 2)
+        first_call = mock_execute_async.call_args_list[0].kwargs
+        self.assertEqual(first_call["variable_values"]["input1"]["accountIds"], ["2"])
+        self.assertEqual(list(holdings), ["1", "2", "3"])
+        self.assertEqual(
+            holdings["3"], {"portfolio": {"aggregateHoldings": {"edges": []}}}
+        )
+
+    @patch.object(Client, "execute_async")
+    async def test_bulk_mutations(self, mock_execute_async):
+        """
+        Test that bulk mutations are aliased and report per-item payload errors.
+        """
+        error = {"message": "Invalid category", "code": "invalid", "fieldErrors": []}
+        mock_execute_async.side_effect = [
+            {
+                "t0": {"transaction": {"id": "1"}, "errors": None},
+                "t1": {"transaction": None, "errors": error},
+            },
+            {"t0": {"transaction": {"id": "3"}, "errors": None}},
+        ]
+        results = await self.monarch_money.update_transactions_bulk(
+            [
+                {"transaction_id": "1", "notes": "a"},
+                {"transaction_id": "2", "category_id": "bad"},
+                {"transaction_id": "3", "needs_review": 1},
+            ],
+            batch_size=2,
+        )
+        self.assertEqual(mock_execute_async.call_count, 2)
+        kwargs = mock_execute_async.call_args_list[0].kwargs
+        self.assertEqual(
+            kwargs["operation_name"], "Web_TransactionDrawerUpdateTransactionBatch"
+        )
+        self.assertEqual(
+            kwargs["variable_values"]["input0"],
+            {"id": "1", "category": None, "name": None, "notes": "a"},
+        )
+        self.assertEqual(
+            mock_execute_async.call_args.kwargs["variable_values"]["input0"][
+                "needsReview"
+            ],
+            True,
+        )
+        self.assertEqual(results[0]["transaction"]["id"], "1")
+        self.assertIsInstance(results[1], RequestFailedException)
+        self.assertEqual(results[2]["transaction"]["id"], "3")
+
+        mock_execute_async.reset_mock()
+        mock_execute_async.side_effect = [
+            {
+                "t0": {"deleted": True, "errors": None},
+                "t1": {"deleted": False, "errors": error},
+            }
+        ]
+        deleted = await self.monarch_money.delete_transactions_bulk(["1", "2"])
+        self.assertIs(deleted["1"], True)
+        self.assertIsInstance(deleted["2"], RequestFailedException)
+        self.assertIn(
+            "t1: deleteTransaction(input: $input1)",
+            get_query_string(mock_execute_async.call_args.kwargs["document"]),
+        )
+
+    @patch.object(Client, "execute_async")
+    async def test_bulk_operation(self, mock_execute_async):
+        """
+        Test the bulk engine retries, records, resumes and cancels per item.
+        """
+        calls = []
+
+        async def call(**kwargs):
+            if kwargs["operation_name"] == "Web_DeleteCategory":
+                calls.append(kwargs["variable_values"]["id"])
+                return {"deleteCategory": {"deleted": True, "errors": None}}
+            category_id = kwargs["variable_values"]["input"]["categoryId"]
+            calls.append(category_id)
+            if category_id == "flaky" and calls.count("flaky") == 1:
+                raise TransportServerError("Service Unavailable", 503)
+            if category_id == "broken":
+                return {"updateOrCreateBudgetItem": None}
+            return {"updateOrCreateBudgetItem": {"budgetItem": {"id": category_id}}}
+
+        mock_execute_async.side_effect = call
+        budget_amounts = [
+            {"amount": 100, "category_id": category_id, "start_date": "2024-01-01"}
+            for category_id in ("1", "flaky", "broken", "4")
+        ]
+        progress = []
+        with tempfile.TemporaryDirectory() as directory:
+            results_path = os.path.join(directory, "results.jsonl")
+            bulk = BulkOperation(
+                max_concurrency=2,
+                retry_policy=RetryPolicy(backoff_base=0),
+                progress=progress.append,
+                results_path=results_path,
+                idempotent=True,
+            )
+            outcomes = await self.monarch_money.set_budget_amounts(
+                budget_amounts, bulk=bulk
+            )
+
+            self.assertEqual(
+                list(outcomes),
+                [
+                    "1:2024-01-01",
+                    "flaky:2024-01-01",
+                    "broken:2024-01-01",
+                    "4:2024-01-01",
+                ],
+            )
+            self.assertTrue(outcomes["flaky:2024-01-01"].ok)
+            self.assertEqual(outcomes["flaky:2024-01-01"].attempts, 2)
+            self.assertIsInstance(
+                outcomes["broken:2024-01-01"].error, RequestFailedException
+            )
+            self.assertEqual(progress[-1].done, 4)
+            self.assertEqual(progress[-1].failed, 1)
+
+            # Resuming only runs the failed item again
+            calls.clear()
+            outcomes = await self.monarch_money.set_budget_amounts(
+                budget_amounts, bulk=bulk
+            )
+            self.assertEqual(calls, ["broken"])
+            self.assertEqual(
+                outcomes["1:2024-01-01"].result, {"budgetItem": {"id": "1"}}
+            )
+
+        # Cancelling stops new items from starting
+        calls.clear()
+        bulk = BulkOperation(max_concurrency=1, progress=lambda _: bulk.cancel())
+        results = await self.monarch_money.delete_transaction_categories(
+            ["a", "b", "c"], bulk=bulk
+        )
+        self.assertEqual(calls, ["a"])
+        self.assertTrue(results[0])
+        self.assertIsInstance(results[2], RequestFailedException)
+
+        # Calls that are not idempotent are not retried, as they may have been applied
+        async def create_tag(**kwargs):
+            calls.append(kwargs["variable_values"]["input"]["name"])
+            raise TransportServerError("Service Unavailable", 503)
+
+        calls.clear()
+        mock_execute_async.side_effect = create_tag
+        outcomes = await self.monarch_money.create_transaction_tags(
+            [{"name": "Trip", "color": "#19D2A5"}],
+            bulk=BulkOperation(retry_policy=RetryPolicy(backoff_base=0)),
+        )
+        self.assertEqual(calls, ["Trip"])
+        self.assertFalse(outcomes["Trip"].ok)
+        self.assertEqual(outcomes["Trip"].attempts, 1)
+
+    @patch.object(Client, "execute_async")
+    async def test_import_transactions(self, mock_execute_async):
+        """
+        Test a bulk import skips existing rows and resumes from its checkpoint.
+        """
+        created = []
+        server = [
+            {
+                "id": "1",
+                "date": "2024-01-02",
+                "amount": -4.5,
+                "merchant": {"name": "Coffee Shop"},
+                "account": {"id": "cash"},
+            }
+        ]
+
+        async def call(**kwargs):
+            variables = kwargs["variable_values"]
+            if kwargs["operation_name"] == "GetTransactionsList":
+                self.assertEqual(variables["filters"]["accounts"], ["cash"])
+                self.assertEqual(variables["filters"]["startDate"], "2024-01-01")
+                return {"allTransactions": {"results": list(server)}}
+            transaction = variables["input"]
+            created.append(transaction["merchantName"])
+            if transaction["merchantName"] == "Bad":
+                errors = {"message": "Invalid category"}
+                return {"createTransaction": {"errors": errors, "transaction": None}}
+            server.append(
+                {
+                    "id": str(len(server) + 1),
+                    "date": transaction["date"],
+                    "amount": transaction["amount"],
+                    "merchant": {"name": transaction["merchantName"]},
+                    "account": {"id": transaction["accountId"]},
+                }
+            )
+            transaction = {"id": server[-1]["id"]}
+            return {"createTransaction": {"errors": None, "transaction": transaction}}
+
+        mock_execute_async.side_effect = call
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ledger.csv")
+            with open(path, "w") as fh:
+                fh.write(
+                    "date,amount,merchant_name,notes\n"
+                    "2024-01-01,-12.00,Grocer,\n"
+                    "2024-01-02,-4.50,coffee shop ,\n"
+                    "2024-01-02,-4.5,Coffee Shop,second cup\n"
+                    "2024-01-03,-1.00,Bad,\n"
+                )
+            checkpoint_path = os.path.join(directory, "checkpoint.jsonl")
+            result = await self.monarch_money.import_transactions(
+                path,
+                account_id="cash",
+                category_id="food",
+                checkpoint_path=checkpoint_path,
+            )
+
+            self.assertEqual(result.duplicates, 1)
+            self.assertEqual(created, ["Grocer", "Coffee Shop", "Bad"])
+            self.assertEqual(
+                [outcome.ok for outcome in result.outcomes.values()],
+                [True, True, False],
+            )
+
+            # Re-running only retries the row that failed
+            created.clear()
+            result = await self.monarch_money.import_transactions(
+                path,
+                account_id="cash",
+                category_id="food",
+                checkpoint_path=checkpoint_path,
+            )
+            self.assertEqual(created, ["Bad"])
+            self.assertEqual(len(result.outcomes), 3)
+            self.assertEqual(result.duplicates, 1)
+
+    @patch.object(Client, "execute_async")
+    async def test_import_transactions_resume(self, mock_execute_async):
+        """
+        Test that resuming an import does not count a row created by the previous
+        run as a duplicate of another identical row.
+        """
+        server = []
+
+        async def call(**kwargs):
+            variables = kwargs["variable_values"]
+            if kwargs["operation_name"] == "GetTransactionsList":
+                return {"allTransactions": {"results": list(server)}}
+            transaction = variables["input"]
+            if transaction["notes"] == "first" and not server:
+                # The run stops before the first row is created
+                raise RuntimeError("Interrupted")
+            server.append(
+                {
+                    "id": str(len(server) + 1),
+                    "date": transaction["date"],
+                    "amount": transaction["amount"],
+                    "merchant": {"name": transaction["merchantName"]},
+                    "account": {"id": transaction["accountId"]},
+                }
+            )
+            transaction = {"id": server[-1]["id"]}
+            return {"createTransaction": {"errors": None, "transaction": transaction}}
+
+        mock_execute_async.side_effect = call
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ledger.csv")
+            with open(path, "w") as fh:
+                fh.write(
+                    "date,amount,merchant_name,notes\n"
+                    "2024-01-01,-3.00,Coffee,first\n"
+                    "2024-01-01,-3.00,Coffee,second\n"
+                )
+            checkpoint_path = os.path.join(directory, "checkpoint.jsonl")
+            result = await self.monarch_money.import_transactions(
+                path,
+                account_id="cash",
+                category_id="food",
+                checkpoint_path=checkpoint_path,
+                bulk=BulkOperation(max_concurrency=1),
+            )
+            self.assertEqual(
+                [outcome.ok for outcome in result.outcomes.values()], [False, True]
+            )
+            self.assertEqual(len(server), 1)
+
+            result = await self.monarch_money.import_transactions(
+                path,
+                account_id="cash",
+                category_id="food",
+                checkpoint_path=checkpoint_path,
+            )
+
+        self.assertEqual(result.duplicates, 0)
+        self.assertEqual(len(server), 2)
+        self.assertTrue(all(outcome.ok for outcome in result.outcomes.values()))
+
+    @patch.object(Client, "execute_async")
+    async def test_import_transactions_retry(self, mock_execute_async):
+        """
+        Test a create that failed after it was applied is not created again.
+        """
+        server = []
+
+        async def call(**kwargs):
+            variables = kwargs["variable_values"]
+            if kwargs["operation_name"] == "GetTransactionsList":
+                filters = variables["filters"]
+                results = [
+                    t
+                    for t in server
+                    if filters["startDate"] <= t["date"] <= filters["endDate"]
+                ]
+                return {"allTransactions": {"results": results}}
+            transaction = variables["input"]
+            server.append(
+                {
+                    "id": str(len(server) + 1),
+                    "date": transaction["date"],
+                    "amount": transaction["amount"],
+                    "merchant": {"name": transaction["merchantName"]},
+                    "account": {"id": transaction["accountId"]},
+                }
+            )
+            if transaction["merchantName"] == "Timeout" and len(server) == 1:
+                # Applied, but the response never arrived
+                raise TransportServerError("Gateway Timeout", 504)
+            transaction = {"id": server[-1]["id"]}
+            return {"createTransaction": {"errors": None, "transaction": transaction}}
+
+        mock_execute_async.side_effect = call
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ledger.csv")
+            with open(path, "w") as fh:
+                fh.write(
+                    "date,amount,merchant_name\n"
+                    "2024-01-01,-3.00,Timeout\n"
+                    "2024-01-01,-3.00,Timeout\n"
+                )
+            result = await self.monarch_money.import_transactions(
+                path,
+                account_id="cash",
+                category_id="food",
+                checkpoint_path=os.path.join(directory, "checkpoint.jsonl"),
+                bulk=BulkOperation(
+                    max_concurrency=1,
+                    retry_policy=RetryPolicy(backoff_base=0),
+                    idempotent=True,
+                ),
+            )
+
+        self.assertEqual(len(server), 2)
+        self.assertTrue(all(outcome.ok for outcome in result.outcomes.values()))
+        self.assertEqual(
+            [outcome.attempts for outcome in result.outcomes.values()], [2, 1]
+        )
+
+    @patch.object(Client, "execute_async")
+    async def test_graphql_client_is_reused(self, mock_execute_async):
+        """
+        Test that GraphQL calls share one client and one pooled HTTP session.
+        """
+        mock_execute_async.return_value = TestMonarchMoney.loadTestData(
+            filename="get_accounts.json",
+        )
+        client = self.monarch_money._get_graphql_client()
+        session = self.monarch_money._get_http_session()
+        await self.monarch_money.get_accounts()
+        await self.monarch_money.get_accounts()
+        self.assertEqual(mock_execute_async.call_count, 2)
+        self.assertIs(self.monarch_money._get_graphql_client(), client)
+        self.assertIs(self.monarch_money._get_http_session(), session)
+
+        await self.monarch_money.close()
+        self.assertTrue(session.closed)
+        self.assertIsNot(self.monarch_money._get_http_session(), session)
+        await self.monarch_money.close()
+
+    @patch.object(Client, "execute_async")
+    async def test_queries_are_parsed_once(self, mock_execute_async):
+        """
+        Test that API methods reuse the same parsed document on every call.
+        """
+        mock_execute_async.return_value = TestMonarchMoney.loadTestData(
+            filename="get_account_type_options.json",
+        )
+        await self.monarch_money.get_account_type_options()
+        await self.monarch_money.get_account_type_options()
+        first, second = [
+            c.kwargs["document"] for c in mock_execute_async.call_args_list
+        ]
+        self.assertIs(first, second)
+
+        source = "query GetSubscriptionDetails { subscription { id } }"
+        document = parse_query(source)
+        self.assertIs(parse_query(source), document)
+        self.assertEqual(
+            get_query_string(document),
+            "query GetSubscriptionDetails {\n  subscription {\n    id\n  }\n}",
+        )
+
+    async def test_pooled_connection_reuse(self):
+        """
+        Test that consecutive GraphQL calls reuse a single keep-alive connection.
+        """
+        peers = set()
+        auth_headers = []
+        payloads = []
+
+        async def graphql(request):
+            peers.add(request.transport.get_extra_info("peername"))
+            auth_headers.append(request.headers.get("Authorization"))
+            payloads.append(await request.json())
+            return web.json_response({"data": {"subscription": {"id": "1"}}})
+
+        app = web.Application()
+        app.router.add_post("/graphql", graphql)
+        async with TestServer(app) as server:
+            base_url = str(server.make_url("")).rstrip("/")
+            with patch.object(MonarchMoneyEndpoints, "BASE_URL", base_url):
+                async with MonarchMoney(token="test_token") as mm:
+                    for _ in range(3):
+                        result = await mm.get_subscription_details()
+                        self.assertEqual(result["subscription"]["id"], "1")
+                    session = mm._get_http_session()
+                self.assertTrue(session.closed)
+
+        self.assertEqual(len(peers), 1, "Expected a single reused connection")
+        self.assertEqual(auth_headers, ["Token test_token"] * 3)
+        self.assertEqual(payloads[0]["operationName"], "GetSubscriptionDetails")
+        self.assertTrue(
+            payloads[0]["query"].startswith("query GetSubscriptionDetails {")
+        )
+
+    async def test_instrumentation_hooks(self):
+        """
+        Test that hooks receive a record of every GraphQL and REST call.
+        """
+        statuses = [503, 200]
+
+        async def graphql(request):
+            status = statuses.pop(0)
+            if status != 200:
+                return web.Response(status=status)
+            return web.json_response({"data": {"subscription": {"id": "1"}}})
+
+        async def login(request):
+            return web.json_response({"token": "new_token"})
+
+        app = web.Application()
+        app.router.add_post("/graphql", graphql)
+        app.router.add_post("/auth/login/", login)
+        histogram = LatencyHistogram()
+        ring_buffer = RingBuffer(size=2)
+        async with TestServer(app) as server:
+            base_url = str(server.make_url("")).rstrip("/")
+            with patch.object(MonarchMoneyEndpoints, "BASE_URL", base_url):
+                async with MonarchMoney(
+                    token="test_token",
+                    retry_policy=RetryPolicy(backoff_base=0.01),
+                    hooks=[histogram, ring_buffer],
+                ) as mm:
+                    await mm.get_subscription_details()
+                    await mm.login("user@example.com", "password", False, False)
+
+        graphql_call, login_call = ring_buffer.records
+        self.assertEqual(graphql_call.operation, "GetSubscriptionDetails")
+        self.assertEqual(graphql_call.status, 200)
+        self.assertEqual(graphql_call.retries, 1)
+        self.assertEqual(
+            graphql_call.response_bytes,
+            len(json.dumps({"data": {"subscription": {"id": "1"}}})),
+        )
+        self.assertGreater(graphql_call.duration, graphql_call.ttfb)
+        self.assertIsNone(graphql_call.error)
+        self.assertEqual(login_call.operation, "/auth/login/")
+        self.assertEqual(login_call.status, 200)
+
+        summary = histogram.summary()
+        self.assertEqual(summary["GetSubscriptionDetails"]["count"], 1)
+        self.assertEqual(summary["GetSubscriptionDetails"]["retries"], 1)
+        self.assertLessEqual(
+            summary["GetSubscriptionDetails"]["p50"],
+            summary["GetSubscriptionDetails"]["max"],
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            sink = JSONLSink(os.path.join(directory, "calls.jsonl"))
+            sink(graphql_call)
+            sink(login_call)
+            with open(sink.path) as fh:
+                lines = [json.loads(line) for line in fh]
+            self.assertEqual(lines[1]["operation"], "/auth/login/")
+
+    async def test_upload_account_balance_histories(self):
+        """
+        Test balance histories are uploaded in chunks, and only new rows next time.
+        """
+        uploads = []
+        failed = []
+        in_flight = []
+
+        async def upload(request):
+            in_flight.append(mm.rate_limiter.concurrency.in_flight)
+            form = await request.post()
+            account_id = json.loads(form["account_files_mapping"])["upload.csv"]
+            rows = form["files"].file.read().decode().splitlines()
+            if "2024-01-01,10" in rows and not failed:
+                failed.append(rows)
+                return web.Response(status=503)
+            uploads.append((account_id, rows))
+            return web.Response(status=200)
+
+        app = web.Application()
+        app.router.add_post("/account-balance-history/upload/", upload)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "savings.csv")
+            with open(path, "w") as fh:
+                fh.write("Date,Balance\n")
+                fh.writelines(f"2024-01-{day:02d},{day * 10}\n" for day in range(1, 6))
+            state_path = os.path.join(directory, "state.json")
+            bulk = BulkOperation(
+                retry_policy=RetryPolicy(backoff_base=0),
+                results_path=os.path.join(directory, "results.jsonl"),
+                idempotent=True,
+            )
+            async with TestServer(app) as server:
+                base_url = str(server.make_url("")).rstrip("/")
+                with patch.object(MonarchMoneyEndpoints, "BASE_URL", base_url):
+                    async with MonarchMoney(token="test_token") as mm:
+                        outcomes = await mm.upload_account_balance_histories(
+                            {
+                                "1": path,
+                                "2": io.StringIO("date,balance\n01/31/2024,5\n"),
+                            },
+                            chunk_size=2,
+                            state_path=state_path,
+                            bulk=bulk,
+                        )
+                        first_uploads = sorted(uploads)
+                        uploads.clear()
+                        # The 503 shrank the shared window
+                        limit = mm.rate_limiter.concurrency.limit
+
+                        # Resuming from the results file still sends the new rows
+                        with open(path, "a") as fh:
+                            fh.write("2024-01-06,60\n")
+                        await mm.upload_account_balance_histories(
+                            {"1": path},
+                            chunk_size=2,
+                            state_path=state_path,
+                            bulk=bulk,
+                        )
+
+        self.assertEqual(
+            list(outcomes),
+            [
+                "1:2024-01-01:2024-01-02",
+                "1:2024-01-03:2024-01-04",
+                "1:2024-01-05:2024-01-05",
+                "2:2024-01-31:2024-01-31",
+            ],
+        )
+        self.assertEqual(
+            [outcome.result for outcome in outcomes.values()], [2, 2, 1, 1]
+        )
+        self.assertEqual(outcomes["1:2024-01-01:2024-01-02"].attempts, 2)
+        self.assertLess(limit, 4)
+        self.assertTrue(all(count >= 1 for count in in_flight))
+        self.assertEqual(
+            first_uploads[0],
+            ("1", ["Date,Balance", "2024-01-01,10", "2024-01-02,20"]),
+        )
+        self.assertEqual(uploads, [("1", ["Date,Balance", "2024-01-06,60"])])
+
+    async def test_mock_server_full_history(self):
+        """
+        Test a full-history pull through the real transport, with injected errors.
+        """
+        async with MockMonarchServer(
+            transaction_count=1050, max_page_size=100
+        ) as server:
+            server.fail_next(429, 525)
+            with patch.object(MonarchMoneyEndpoints, "BASE_URL", server.base_url):
+                async with MonarchMoney(
+                    token="test_token",
+                    retry_policy=RetryPolicy(backoff_base=0.01),
+                ) as mm:
+                    result = await mm.fetch_all_transactions(
+                        limit=100, max_concurrency=4
+                    )
+                    accounts = await mm.get_accounts()
+                    budgets = await mm.get_budgets(
+                        start_date="2024-01-01", end_date="2024-03-31"
+                    )
+
+        ids = [t["id"] for t in result["allTransactions"]["results"]]
+        self.assertEqual(ids, [t["id"] for t in server.transactions])
+        self.assertEqual(server.errors, {429: 1, 525: 1})
+        self.assertEqual(server.requests["GetTransactionsList"], 13)
+        self.assertLessEqual(server.max_in_flight, 4)
+        self.assertEqual(len(accounts["accounts"]), 8)
+        self.assertEqual(len(budgets["budgetData"]["totalsByMonth"]), 3)
+
+    async def test_sharded_budgets(self):
+        """
+        Test month-sharded budgets merge into the same response as one request.
+        """
+        self.assertEqual(
+            get_month_ranges("2024-01-15", "2024-05-10", months=2),
+            [
+                ("2024-01-15", "2024-02-29"),
+                ("2024-03-01", "2024-04-30"),
+                ("2024-05-01", "2024-05-10"),
+            ],
+        )
+        async with MockMonarchServer() as server:
+            with patch.object(MonarchMoneyEndpoints, "BASE_URL", server.base_url):
+                async with MonarchMoney(
+                    token="test_token",
+                    retry_policy=RetryPolicy(backoff_base=0.01),
+                ) as mm:
+                    expected = await mm.get_budgets(
+                        start_date="2024-01-01", end_date="2024-12-31"
+                    )
+                    server.fail_next(525)
+                    budgets = await mm.get_budgets_sharded(
+                        start_date="2024-01-01",
+                        end_date="2024-12-31",
+                        months_per_shard=5,
+                        max_concurrency=2,
+                    )
+
+        self.assertEqual(budgets, expected)
+        self.assertEqual(server.requests["GetJointPlanningData"], 1 + 3 + 1)
+        self.assertLessEqual(server.max_in_flight, 2)
+
+    @patch.object(Client, "execute_async")
+    async def test_sharded_cashflow(self, mock_execute_async):
+        """
+        Test month-sharded cashflow adds up the aggregates of each shard.
+        """
+
+        async def get_cashflow(**kwargs):
+            month = int(kwargs["variable_values"]["filters"]["startDate"][5:7])
+            return {
+                "byCategory": [
+                    {"groupBy": {"category": {"id": "c1"}}, "summary": {"sum": 1.0}},
+                    {
+                        "groupBy": {"category": {"id": f"m{month}"}},
+                        "summary": {"sum": 2.0},
+                    },
+                ],
+                "byCategoryGroup": [],
+                "byMerchant": [
+                    {
+                        "groupBy": {"merchant": None},
+                        "summary": {"sumIncome": 0.0, "sumExpense": -5.0},
+                    }
+                ],
+                "summary": {
+                    "summary": {
+                        "sumIncome": 100.0 * month,
+                        "sumExpense": -50.0,
+                        "savings": 100.0 * month - 50.0,
+                        "savingsRate": 0.5,
+                    }
+                },
+            }
+
+        mock_execute_async.side_effect = get_cashflow
+        cashflow = await self.monarch_money.get_cashflow_sharded(
+            start_date="2024-01-01", end_date="2024-03-31"
+        )
+
+        self.assertEqual(mock_execute_async.call_count, 3)
+        self.assertEqual(
+            [row["summary"]["sum"] for row in cashflow["byCategory"]],
+            [3.0, 2.0, 2.0, 2.0],
+        )
+        self.assertEqual(cashflow["byMerchant"][0]["summary"]["sumExpense"], -15.0)
+        summary = cashflow["summary"]["summary"]
+        self.assertEqual(summary["sumIncome"], 600.0)
+        self.assertEqual(summary["savings"], 450.0)
+        self.assertEqual(summary["savingsRate"], 0.75)
+
+    async def test_keyset_pagination(self):
+        """
+        Test keyset pagination walks date windows while transactions are synced.
+        """
+        async with MockMonarchServer(transaction_count=500) as server:
+            # 50 transactions a day, so pages also have to be walked within a day
+            for i, transaction in enumerate(server.transactions):
+                transaction["date"] = f"2024-01-{28 - i // 50:02d}"
+            expected_ids = [t["id"] for t in server.transactions]
+            seen_offsets = []
+            resolve = server._resolve_GetTransactionsList
+
+            def resolve_and_record(variables):
+                seen_offsets.append(variables["offset"])
+                return resolve(variables)
+
+            server._resolve_GetTransactionsList = resolve_and_record
+            with patch.object(MonarchMoneyEndpoints, "BASE_URL", server.base_url):
+                async with MonarchMoney(token="test_token") as mm:
+                    ids = []
+                    async for page in mm.iter_transactions(
+                        limit=30, by_page=True, prefetch=False, pagination="keyset"
+                    ):
+                        if not ids:
+                            # A transaction synced while paging
+                            server.transactions.insert(
+                                0, {**server.transactions[0], "id": "synced"}
+                            )
+                        ids.extend(t["id"] for t in page)
+
+                    result = await mm.fetch_all_transactions(
+                        limit=30,
+                        pagination="keyset",
+                        start_date="2024-01-20",
+                        end_date="2024-01-25",
+                    )
+
+                    with self.assertRaises(Exception):
+                        await mm.fetch_all_transactions(pagination="cursor")
+
+        self.assertEqual(ids, expected_ids)
+        # Offsets never go deeper than one day of transactions
+        self.assertLessEqual(max(seen_offsets), 50)
+        self.assertEqual(
+            [t["id"] for t in result["allTransactions"]["results"]],
+            [t["id"] for t in server.transactions if t["date"] <= "2024-01-25"][:300],
+        )
+        self.assertEqual(result["allTransactions"]["totalCount"], 300)
+
+    async def test_models(self):
+        """
+        Test that as_models returns compact models equivalent to the dicts.
+        """
+        async with MockMonarchServer(transaction_count=250) as server:
+            with patch.object(MonarchMoneyEndpoints, "BASE_URL", server.base_url):
+                async with MonarchMoney(token="test_token") as mm:
+                    expected = await mm.fetch_all_transactions(limit=100)
+                    result = await mm.fetch_all_transactions(limit=100, as_models=True)
+                    accounts = await mm.get_accounts()
+                    account_models = await mm.get_accounts(as_models=True)
+
+        transactions = result["allTransactions"]["results"]
+        self.assertEqual(len(transactions), 250)
+        self.assertIsInstance(transactions[0], Transaction)
+        self.assertFalse(hasattr(transactions[0], "__dict__"))
+        self.assertEqual(
+            [t.to_dict() for t in transactions],
+            expected["allTransactions"]["results"],
+        )
+
+        first = transactions[0]
+        self.assertEqual(first.plaid_name, first["plaidName"])
+        self.assertIs(first.date, sys.intern(first.date))
+        # Nested members are shared between the transactions of a page
+        same_category = [
+            t for t in transactions[1:100] if t["category"]["id"] == first.category.id
+        ]
+        self.assertTrue(same_category)
+        self.assertIs(same_category[0].category, first.category)
+        self.assertEqual(first.tags, ())
+        self.assertIsNone(first.get("missing"))
+
+        self.assertEqual(
+            [a.to_dict() for a in account_models["accounts"]], accounts["accounts"]
+        )
+
+        # __typename is returned as it was, or left out if it was missing
+        for data in (
+            {"id": "1", "date": "2024-01-01", "category": {"id": "2", "name": "Food"}},
+            {"id": "1", "__typename": "RecurringTransaction", "tags": []},
+            {"id": "1", "__typename": None, "notes": "a", "extra": {"a": 1}},
+        ):
+            model = Transaction.from_dict(data)
+            if "category" in data:
+                # Decoded members round-trip too
+                self.assertEqual(model.category.name, "Food")
+            self.assertEqual(model.to_dict(), data)
+        self.assertNotIn("__typename", Transaction.from_dict({"id": "1"}).to_dict())
+        self.assertEqual(
+            account_models["accounts"][0].display_name,
+            accounts["accounts"][0]["displayName"],
+        )
+
+    async def test_iter_transactions_until(self):
+        """
+        Test incremental iteration stops at the first page of known transactions.
+        """
+        async with MockMonarchServer(transaction_count=200) as server:
+            known = {t["id"]: t["updatedAt"] for t in server.transactions[5:]}
+            # A known transaction that has since been updated
+            known[server.transactions[7]["id"]] = "2000-01-01T00:00:00Z"
+            order_by = []
+            resolve = server._resolve_GetTransactionsList
+
+            def resolve_and_record(variables):
+                order_by.append(variables["orderBy"])
+                return resolve(variables)
+
+            server._resolve_GetTransactionsList = resolve_and_record
+            with patch.object(MonarchMoneyEndpoints, "BASE_URL", server.base_url):
+                async with MonarchMoney(token="test_token") as mm:
+                    ids = [
+                        t["id"]
+                        async for t in mm.iter_transactions_until(
+                            lambda t: known.get(t["id"]) == t["updatedAt"], limit=10
+                        )
+                    ]
+                    await mm.get_transactions(order_by="amount")
+
+                    with self.assertRaises(Exception):
+                        async for _ in mm.iter_transactions_until(
+                            lambda t: True, order_by="amount"
+                        ):
+                            pass
+
+        expected = [t["id"] for t in server.transactions[:5]]
+        self.assertEqual(ids, expected + [server.transactions[7]["id"]])
+        self.assertEqual(server.requests["GetTransactionsList"], 3)
+        self.assertEqual(order_by, ["date", "date", "amount"])
+
+    def test_lazy_imports(self):
+        """
+        Test that importing the package and using a session, in a fresh interpreter,
+        does not import the network stack.
+        """
+        code = (
+            "import sys\n"
+            "import monarchmoney\n"
+            "from monarchmoney import MonarchMoney, RequireMFAException\n"
+            "mm = MonarchMoney()\n"
+            f"mm.load_session({os.path.abspath('temp_session.pickle')!r})\n"
+            "print(','.join(m for m in ('aiohttp', 'gql', 'graphql', 'oathtool')"
+            " if m in sys.modules))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+        )
+        self.assertEqual(result.stdout.strip(), "")
+
     @classmethod
     def loadTestData(cls, filename) -> dict:
         filename = f"{os.path.dirname(os.path.realpath(__file__))}/{filename}"